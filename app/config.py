@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     """
@@ -15,4 +16,132 @@ class Config:
 
     # Last.fm API for recommendations (free alternative to deprecated Spotify recommendations)
     LASTFM_API_KEY = os.getenv("LASTFM_API_KEY")
-    
\ No newline at end of file
+
+    # API base URLs (overridable to point at a local stub server for benchmarks)
+    LASTFM_API_URL = os.getenv("LASTFM_API_URL", "http://ws.audioscrobbler.com/2.0/")
+    SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+
+    SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+
+    # Market used for Spotify searches
+    SPOTIFY_MARKET = os.getenv("SPOTIFY_MARKET", "DE")
+
+    # Shared HTTP client: host pools, keep-alive connections per host, timeout in seconds
+    HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+    # Playlist profiling: how many tracks to tag and how to pick them from
+    # large playlists ("head", "uniform" or "reservoir")
+    PLAYLIST_SAMPLE_SIZE = int(os.getenv("PLAYLIST_SAMPLE_SIZE", "30"))
+    PLAYLIST_SAMPLE_STRATEGY = os.getenv("PLAYLIST_SAMPLE_STRATEGY", "uniform")
+    PLAYLIST_SAMPLE_MAX = int(os.getenv("PLAYLIST_SAMPLE_MAX", "200"))
+
+    # Outbound request scheduler, limits are requests per second for the
+    # whole container: each of the RATE_LIMIT_WORKERS worker processes gets
+    # an equal share, so together they stay within the provider's limit.
+    # Last.fm allows about 5/s per API key averaged over 5 minutes, so bursts are fine;
+    # Spotify uses a rolling 30 second window.
+    RATE_LIMIT_WORKERS = int(os.getenv("RATE_LIMIT_WORKERS", os.getenv("GUNICORN_WORKERS", "2")))
+    SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "20"))
+    SPOTIFY_RATE_BURST = int(os.getenv("SPOTIFY_RATE_BURST", "40"))
+    LASTFM_RATE_LIMIT = float(os.getenv("LASTFM_RATE_LIMIT", "5"))
+    LASTFM_RATE_BURST = int(os.getenv("LASTFM_RATE_BURST", "60"))
+    # Per Spotify access token, so one user can't use up the whole app budget
+    TOKEN_RATE_LIMIT = float(os.getenv("TOKEN_RATE_LIMIT", "10"))
+    TOKEN_RATE_BURST = int(os.getenv("TOKEN_RATE_BURST", "20"))
+    # Retries for rate limited (429) and gateway error responses
+    API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+    API_RETRY_MAX_DELAY = float(os.getenv("API_RETRY_MAX_DELAY", "30"))
+    # Total seconds one outbound call may take, rate limit waits and retries included
+    API_CALL_DEADLINE = float(os.getenv("API_CALL_DEADLINE", "20"))
+
+    # Max number of concurrent Last.fm lookups per request
+    LASTFM_MAX_IN_FLIGHT = int(os.getenv("LASTFM_MAX_IN_FLIGHT", "8"))
+    # Max number of concurrent Spotify searches per request
+    SPOTIFY_MAX_IN_FLIGHT = int(os.getenv("SPOTIFY_MAX_IN_FLIGHT", "8"))
+    # Max number of concurrent API calls of one playlist generation pipeline
+    GENERATION_MAX_IN_FLIGHT = int(os.getenv("GENERATION_MAX_IN_FLIGHT", "12"))
+    # Threads per worker process shared by all concurrent lookups
+    WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "64"))
+
+    # Local directory for caches and stores shared by all gunicorn workers
+    DATA_DIR = os.getenv("DATA_DIR", os.path.join(tempfile.gettempdir(), "marcify"))
+
+    # Last.fm response cache (SQLite, shared across workers)
+    LASTFM_CACHE_ENABLED = os.getenv("LASTFM_CACHE_ENABLED", "true").lower() == "true"
+    LASTFM_CACHE_PATH = os.getenv("LASTFM_CACHE_PATH", os.path.join(DATA_DIR, "lastfm_cache.sqlite"))
+    LASTFM_CACHE_MAX_ENTRIES = int(os.getenv("LASTFM_CACHE_MAX_ENTRIES", "50000"))
+    # TTL in seconds per Last.fm method; tag and similarity data rarely changes
+    LASTFM_CACHE_TTLS = {
+        "artist.getsimilar": 7 * 24 * 3600,
+        "artist.gettoptracks": 24 * 3600,
+        "track.gettoptags": 7 * 24 * 3600,
+        "artist.gettoptags": 7 * 24 * 3600,
+        "tag.gettopartists": 24 * 3600,
+    }
+
+    # Spotify search response cache (in-process, size-bounded)
+    SPOTIFY_SEARCH_CACHE_ENABLED = os.getenv("SPOTIFY_SEARCH_CACHE_ENABLED", "true").lower() == "true"
+    SPOTIFY_SEARCH_CACHE_TTL = int(os.getenv("SPOTIFY_SEARCH_CACHE_TTL", "3600"))
+    SPOTIFY_SEARCH_CACHE_MAX_MB = int(os.getenv("SPOTIFY_SEARCH_CACHE_MAX_MB", "32"))
+    # Compact track records shared by all requests of a worker
+    TRACK_STORE_MAX_ENTRIES = int(os.getenv("TRACK_STORE_MAX_ENTRIES", "50000"))
+    # Persistent (track, artist) -> Spotify id map used to resolve Last.fm tracks
+    TRACK_ID_MAP_ENABLED = os.getenv("TRACK_ID_MAP_ENABLED", "true").lower() == "true"
+    TRACK_ID_MAP_PATH = os.getenv("TRACK_ID_MAP_PATH", os.path.join(DATA_DIR, "track_ids.sqlite"))
+    TRACK_ID_MAP_TTL = int(os.getenv("TRACK_ID_MAP_TTL", str(30 * 24 * 3600)))
+
+    # Server-side store for taste/playlist profiles ("sqlite" or "memory");
+    # the session only keeps a reference
+    PROFILE_STORE = os.getenv("PROFILE_STORE", "sqlite")
+    PROFILE_STORE_PATH = os.getenv("PROFILE_STORE_PATH", os.path.join(DATA_DIR, "profiles.sqlite"))
+    PROFILE_STORE_MAX_ENTRIES = int(os.getenv("PROFILE_STORE_MAX_ENTRIES", "10000"))
+    PROFILE_TTL = int(os.getenv("PROFILE_TTL", str(24 * 3600)))
+
+    # Local artist similarity graph filled from artist.getsimilar lookups;
+    # high variety settings walk several hops through it
+    ARTIST_GRAPH_ENABLED = os.getenv("ARTIST_GRAPH_ENABLED", "true").lower() == "true"
+    ARTIST_GRAPH_PATH = os.getenv("ARTIST_GRAPH_PATH", os.path.join(DATA_DIR, "artist_graph.sqlite"))
+    ARTIST_GRAPH_TTL = int(os.getenv("ARTIST_GRAPH_TTL", str(30 * 24 * 3600)))
+    # Similar artists stored per lookup, and unknown artists looked up per request
+    ARTIST_GRAPH_FETCH_LIMIT = int(os.getenv("ARTIST_GRAPH_FETCH_LIMIT", "30"))
+    ARTIST_GRAPH_EXPAND_BUDGET = int(os.getenv("ARTIST_GRAPH_EXPAND_BUDGET", "5"))
+
+    # Local tag <-> artist index filled from tag.gettopartists and
+    # artist.gettoptags lookups, used to pick artists for taste profiles
+    TAG_INDEX_ENABLED = os.getenv("TAG_INDEX_ENABLED", "true").lower() == "true"
+    TAG_INDEX_PATH = os.getenv("TAG_INDEX_PATH", os.path.join(DATA_DIR, "tag_index.sqlite"))
+    TAG_INDEX_TTL = int(os.getenv("TAG_INDEX_TTL", str(7 * 24 * 3600)))
+    TAG_INDEX_FETCH_LIMIT = int(os.getenv("TAG_INDEX_FETCH_LIMIT", "50"))
+
+    # Background jobs for generation and analysis (worker pool per process,
+    # job records in SQLite so any worker can answer status polls)
+    JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(DATA_DIR, "jobs.sqlite"))
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_PER_USER_LIMIT = int(os.getenv("JOB_PER_USER_LIMIT", "2"))
+    JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "600"))
+
+    # Cache warm-up for popular seeds, genres and tags (`flask warm-cache`,
+    # or in every worker at start with WARMUP_ON_START)
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() == "true"
+    WARMUP_INTERVAL = int(os.getenv("WARMUP_INTERVAL", "0"))
+    WARMUP_SEEDS = [s.strip() for s in os.getenv("WARMUP_SEEDS", "Rage Against The Machine").split(",") if s.strip()]
+    WARMUP_GENRES = [s.strip() for s in os.getenv("WARMUP_GENRES", "rock").split(",") if s.strip()]
+    # Empty: all genre keywords and mood/energy keywords
+    WARMUP_TAGS = [s.strip() for s in os.getenv("WARMUP_TAGS", "").split(",") if s.strip()]
+    WARMUP_RATE = float(os.getenv("WARMUP_RATE", "2"))
+
+    # Every response carries a Server-Timing header with its outbound call
+    # breakdown; with TRACE_DEBUG, ?debug=trace also adds the full call list
+    # to JSON responses as "_trace"
+    TRACE_DEBUG = os.getenv("TRACE_DEBUG", "false").lower() == "true"
+
+    # Prometheus metrics at /metrics, added up across workers in a local
+    # SQLite file that each worker writes every METRICS_FLUSH_INTERVAL seconds
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(DATA_DIR, "metrics.sqlite"))
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+    # Workers that exited or have not written for this long are folded into
+    # one row per series, so the file does not grow with every restart
+    METRICS_PROCESS_TTL = float(os.getenv("METRICS_PROCESS_TTL", "3600"))
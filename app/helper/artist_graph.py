@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from app.helper.cache import thread_connection
+from app.helper.concurrency import app_extension, bounded_map
+
+
+def artist_key(name):
+    # Last.fm artist names are case-insensitive
+    return name.strip().lower()
+
+
+class ArtistGraph:
+    """
+    Artist similarity graph stored as an adjacency list in a local SQLite
+    file shared by all workers. Edges carry the Last.fm match weight. An
+    artist's neighbours are known once it has been expanded (i.e. its
+    similar artists were looked up) and stay valid for ttl seconds.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS artists ("
+            " key TEXT PRIMARY KEY, name TEXT NOT NULL, expanded_at REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS edges ("
+            " source TEXT NOT NULL, target TEXT NOT NULL, weight REAL NOT NULL,"
+            " PRIMARY KEY (source, target))"
+        )
+
+    def _connect(self):
+        return thread_connection(self._local, self.path)
+
+    def neighbors_many(self, names):
+        """
+        Return {name: [(neighbour name, weight), ...]} (best match first) for
+        every given artist whose neighbours are known. Unknown or expired
+        artists are left out.
+        """
+        keys = {artist_key(name): name for name in names}
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        try:
+            conn = self._connect()
+            expanded = {key for key, in conn.execute(
+                f"SELECT key FROM artists WHERE key IN ({placeholders}) AND expanded_at > ?",
+                (*keys, time.time() - self.ttl)
+            )}
+            result = {keys[key]: [] for key in expanded}
+            if expanded:
+                rows = conn.execute(
+                    f"SELECT e.source, a.name, e.weight FROM edges e JOIN artists a ON a.key = e.target "
+                    f"WHERE e.source IN ({','.join('?' * len(expanded))}) ORDER BY e.source, e.weight DESC",
+                    tuple(expanded)
+                )
+                for source, name, weight in rows:
+                    result[keys[source]].append((name, weight))
+            return result
+        except sqlite3.Error:
+            return {}
+
+    def neighbors(self, name):
+        """
+        Return [(neighbour name, weight), ...] or None if name is not known.
+        """
+        return self.neighbors_many([name]).get(name)
+
+    def set_neighbors(self, name, neighbors):
+        """
+        Store the (name, weight) neighbours of an artist, replacing old edges.
+        """
+        source = artist_key(name)
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO artists (key, name, expanded_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET expanded_at = excluded.expanded_at",
+                    (source, name, time.time())
+                )
+                conn.execute("DELETE FROM edges WHERE source = ?", (source,))
+                for target, weight in neighbors:
+                    conn.execute("INSERT OR IGNORE INTO artists (key, name) VALUES (?, ?)",
+                                 (artist_key(target), target))
+                    conn.execute("INSERT OR REPLACE INTO edges (source, target, weight) VALUES (?, ?, ?)",
+                                 (source, artist_key(target), weight))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        try:
+            conn = self._connect()
+            return {
+                'artists': conn.execute("SELECT COUNT(*) FROM artists").fetchone()[0],
+                'expanded': conn.execute("SELECT COUNT(*) FROM artists WHERE expanded_at IS NOT NULL").fetchone()[0],
+                'edges': conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+            }
+        except sqlite3.Error:
+            return {}
+
+
+def get_artist_graph():
+    """
+    Return the app's artist similarity graph, or None if disabled.
+    """
+    if not current_app.config.get('ARTIST_GRAPH_ENABLED'):
+        return None
+    return app_extension('artist_graph', lambda: ArtistGraph(
+        current_app.config['ARTIST_GRAPH_PATH'],
+        ttl=current_app.config.get('ARTIST_GRAPH_TTL', 30 * 24 * 3600)
+    ))
+
+
+def expand_neighborhood(seed, hops, fetch, expand_budget=5, max_in_flight=8):
+    """
+    Collect the adjacency lists of all artists up to hops steps from seed.
+
+    Artists already in the graph cost nothing. Beyond the seed, unknown
+    artists are only looked up (with fetch(name), which must return their
+    (name, weight) neighbours) if they are among the expand_budget best
+    connected artists of their hop; the others stay leaves. Repeated walks
+    from the same seed therefore soon need no API calls at all.
+    Returns {name: [(neighbour name, weight), ...]}.
+    """
+    graph = get_artist_graph()
+    adjacency = {}
+    frontier = [seed]
+    seen = {artist_key(seed)}
+
+    for hop in range(hops):
+        known = graph.neighbors_many(frontier) if graph is not None else {}
+        # The seed is always looked up, deeper artists only within the budget
+        fetch_now = [name for name in (frontier if hop == 0 else frontier[:expand_budget]) if name not in known]
+        known.update(zip(fetch_now, bounded_map(fetch, fetch_now, max_in_flight)))
+        adjacency.update(known)
+
+        # Next frontier, ordered by the weight of the edge that reached it
+        candidates = sorted(
+            ((weight, name) for neighbors in known.values() for name, weight in neighbors),
+            key=lambda item: -item[0]
+        )
+        frontier = []
+        for weight, name in candidates:
+            if artist_key(name) not in seen:
+                seen.add(artist_key(name))
+                frontier.append(name)
+        if not frontier:
+            break
+
+    return adjacency
+
+
+def personalized_pagerank(adjacency, seed, alpha=0.15, iterations=30):
+    """
+    Rank artists by personalized PageRank from seed over a weighted
+    adjacency list: a walker follows edges in proportion to their weight and
+    jumps back to the seed with probability alpha (and from leaves).
+    Returns [(name, score), ...] best first, without the seed.
+    """
+    names = {artist_key(seed): seed}
+    edges = {}
+    for source, neighbors in adjacency.items():
+        names.setdefault(artist_key(source), source)
+        total = sum(weight for _, weight in neighbors)
+        if total > 0:
+            edges[artist_key(source)] = [(artist_key(name), weight / total) for name, weight in neighbors if weight > 0]
+        for name, _ in neighbors:
+            names.setdefault(artist_key(name), name)
+
+    seed_key = artist_key(seed)
+    rank = {seed_key: 1.0}
+    for _ in range(iterations):
+        following = {}
+        leaked = alpha
+        for node, score in rank.items():
+            out = edges.get(node)
+            if not out:
+                leaked += (1 - alpha) * score
+                continue
+            for target, share in out:
+                following[target] = following.get(target, 0.0) + (1 - alpha) * score * share
+        following[seed_key] = following.get(seed_key, 0.0) + leaked
+        rank = following
+
+    ranked = sorted(((score, key) for key, score in rank.items() if key != seed_key), key=lambda item: -item[0])
+    return [(names[key], score) for score, key in ranked]
@@ -1,12 +1,14 @@
-import requests
 import json
-import pandas as pd
+
+from app.helper import http_client
 
 def get_playlist_audio_features(username, token, sp):
-    
+    # pandas is an optional analytics dependency (requirements-analytics.txt)
+    import pandas as pd
+
     query = f'https://api.spotify.com/v1/me/top/tracks?time_range=long_term&limit=50'
     
-    response = requests.get(query, 
+    response = http_client.get(query, 
                             headers={"Content-Type":"application/json", 
                                     "Authorization": "Bearer " + f"{token}"})
 
@@ -0,0 +1,120 @@
+from collections import Counter
+
+from flask import current_app
+
+from app.helper.concurrency import bounded_map
+from app.helper.lastfm_profile import (
+    TAG_CATEGORIES, classify_tag, get_artist_tags_lastfm, get_playlist_tracks,
+    get_track_tags_lastfm, is_genre_tag
+)
+
+
+CATEGORIES = list(TAG_CATEGORIES)
+
+
+def _track_key(track):
+    artists = track.get('artists', [])
+    artist_name = artists[0]['name'] if artists else ''
+    return track.get('name', ''), artist_name
+
+
+def fetch_tags_deduplicated(track_keys):
+    """
+    Fetch Last.fm tags for unique (track_name, artist_name) pairs.
+    Artist tags are fetched once per artist for all tracks without track tags.
+    Returns {track_key: tags}.
+    """
+    max_in_flight = current_app.config.get('LASTFM_MAX_IN_FLIGHT', 8)
+
+    track_tags = dict(zip(
+        track_keys,
+        bounded_map(lambda key: get_track_tags_lastfm(*key), track_keys, max_in_flight)
+    ))
+
+    # Fallback to artist tags, once per artist
+    artists = sorted({artist for (name, artist), tags in track_tags.items() if not tags and artist})
+    artist_tags = dict(zip(artists, bounded_map(get_artist_tags_lastfm, artists, max_in_flight)))
+
+    for (name, artist), tags in track_tags.items():
+        if not tags and artist:
+            track_tags[(name, artist)] = artist_tags.get(artist, [])
+    return track_tags
+
+
+def score_matrix(tag_lists):
+    """
+    Build the tracks x categories score matrix for a list of tag lists.
+    Scores match calculate_tag_scores: high / (high + low), 0.5 without matches.
+    """
+    # numpy is only loaded once a batch is analyzed, not at worker start
+    import numpy as np
+
+    high = np.zeros((len(tag_lists), len(CATEGORIES)))
+    low = np.zeros((len(tag_lists), len(CATEGORIES)))
+    column = {category: i for i, category in enumerate(CATEGORIES)}
+
+    for row, tags in enumerate(tag_lists):
+        for tag in tags:
+            for category, is_high, is_low in classify_tag(tag):
+                high[row, column[category]] += is_high
+                low[row, column[category]] += is_low
+
+    total = high + low
+    return np.divide(high, total, out=np.full_like(high, 0.5), where=total > 0)
+
+
+def analyze_playlists_batch(token, playlist_ids, tracks_per_playlist=30, sample='head'):
+    """
+    Analyze many playlists in one go and return their profiles.
+
+    Tracks and artists shared between playlists are only tagged once.
+    Category scores for all playlists are computed as one matrix product:
+    (playlists x tracks membership) @ (tracks x categories scores).
+    Returns {'profiles': [...], 'similarity': playlists x playlists matrix}.
+    """
+    import numpy as np
+
+    max_in_flight = current_app.config.get('SPOTIFY_MAX_IN_FLIGHT', 8)
+    playlist_tracks = list(bounded_map(
+        lambda playlist_id: get_playlist_tracks(token, playlist_id, limit=tracks_per_playlist, sample=sample),
+        playlist_ids,
+        max_in_flight
+    ))
+
+    # Deduplicate tracks across all playlists
+    keys_per_playlist = [[_track_key(track) for track in tracks] for tracks in playlist_tracks]
+    unique_keys = list(dict.fromkeys(key for keys in keys_per_playlist for key in keys))
+    column = {key: i for i, key in enumerate(unique_keys)}
+    track_tags = fetch_tags_deduplicated(unique_keys)
+
+    # Membership counts, so duplicate tracks in a playlist weigh like before
+    membership = np.zeros((len(playlist_ids), len(unique_keys)))
+    for row, keys in enumerate(keys_per_playlist):
+        for key in keys:
+            membership[row, column[key]] += 1
+
+    scores = score_matrix([track_tags[key] for key in unique_keys])
+    track_counts = membership.sum(axis=1, keepdims=True)
+    playlist_scores = np.divide(
+        membership @ scores, track_counts,
+        out=np.full((len(playlist_ids), len(CATEGORIES)), 0.5),
+        where=track_counts > 0
+    )
+
+    # Pairwise similarity of the category score vectors (1.0 = identical mood)
+    diff = playlist_scores[:, None, :] - playlist_scores[None, :, :]
+    similarity = 1 - np.sqrt((diff ** 2).sum(axis=2) / len(CATEGORIES))
+
+    profiles = []
+    for row, playlist_id in enumerate(playlist_ids):
+        tag_counts = Counter(tag for key in keys_per_playlist[row] for tag in track_tags[key])
+        top_tags = tag_counts.most_common(20)
+        profiles.append({
+            'playlist_id': playlist_id,
+            'scores': dict(zip(CATEGORIES, playlist_scores[row].tolist())),
+            'top_tags': top_tags,
+            'genres': [tag for tag, count in top_tags if is_genre_tag(tag)][:5],
+            'track_count': len(keys_per_playlist[row])
+        })
+
+    return {'profiles': profiles, 'similarity': similarity.round(4).tolist()}
@@ -0,0 +1,337 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def thread_connection(local, path):
+    """
+    Return the SQLite connection to path for the calling thread, stored on
+    the threading.local() object local. Connections are opened per thread
+    and process (they must not cross a fork) in WAL mode, so readers in
+    other workers are not blocked by writers.
+    """
+    conn = getattr(local, 'conn', None)
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
+
+
+def pid_alive(pid):
+    """
+    Check whether a process with this pid exists on this host.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists, but belongs to someone else
+        return True
+    return True
+
+
+class SQLiteCache:
+    """
+    JSON key/value cache stored in a local SQLite file.
+
+    The file is shared by all worker processes. Entries expire after their
+    TTL and the least recently used entries are evicted once max_entries is
+    exceeded. Lookups are read-only most of the time: an entry's last access
+    is only rewritten once it is touch_interval seconds old, hit/miss
+    counters are added up in memory and written every stats_interval
+    seconds, and the entry count is only checked every evict_every sets or
+    once this process's estimate passes max_entries.
+    """
+
+    def __init__(self, path, max_entries=10000, touch_interval=60, stats_interval=10, evict_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.stats_interval = stats_interval
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._pending = {}  # namespace -> [hits, misses] not yet written
+        self._flushed_at = time.monotonic()
+        self._estimate = None
+        self._sets = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, last_access REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                " namespace TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0,"
+                " misses INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def _connect(self):
+        return thread_connection(self._local, self.path)
+
+    def _own_pending(self):
+        # Called with the lock held. Counts from before a fork belong to the
+        # parent, which writes them itself.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._pending
+
+    def _count(self, namespace, hit):
+        with self._lock:
+            counts = self._own_pending().setdefault(namespace, [0, 0])
+            counts[0 if hit else 1] += 1
+            due = time.monotonic() - self._flushed_at >= self.stats_interval
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Write the hit/miss counts gathered in this process to the file."""
+        with self._lock:
+            pending, self._pending = self._own_pending(), {}
+            self._flushed_at = time.monotonic()
+        rows = [(namespace, hits, misses) for namespace, (hits, misses) in pending.items()]
+        if not rows:
+            return
+        try:
+            self._connect().executemany(
+                "INSERT INTO stats (namespace, hits, misses) VALUES (?, ?, ?) "
+                "ON CONFLICT(namespace) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                rows
+            )
+        except sqlite3.Error:
+            # Keep the counts for the next flush
+            with self._lock:
+                for namespace, hits, misses in rows:
+                    counts = self._pending.setdefault(namespace, [0, 0])
+                    counts[0] += hits
+                    counts[1] += misses
+
+    def get(self, namespace, key):
+        """
+        Return the cached value or None if missing or expired.
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, last_access FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now)
+            ).fetchone()
+            if row is None:
+                self._count(namespace, hit=False)
+                return None
+            if now - row[1] >= self.touch_interval:
+                conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key)
+                )
+            self._count(namespace, hit=True)
+            return json.loads(row[0])
+        except sqlite3.Error:
+            return None
+
+    def set(self, namespace, key, value, ttl):
+        """
+        Store a JSON-serializable value for ttl seconds.
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl, now)
+            )
+            with self._lock:
+                self._sets += 1
+                if self._estimate is not None:
+                    self._estimate += 1
+                check = (self._estimate is None or self._estimate > self.max_entries
+                         or self._sets >= self.evict_every)
+                if check:
+                    self._sets = 0
+            if check:
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn, now):
+        # Other workers add entries too, so the estimate is refreshed here.
+        # Evicting down to 90% leaves room for the next sets.
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.max_entries:
+            count -= conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+            target = int(self.max_entries * 0.9)
+            if count > target:
+                conn.execute(
+                    "DELETE FROM entries WHERE rowid IN "
+                    "(SELECT rowid FROM entries ORDER BY last_access LIMIT ?)",
+                    (count - target,)
+                )
+                count = target
+        with self._lock:
+            self._estimate = count
+
+    def stats(self):
+        """
+        Return {namespace: {'hits': n, 'misses': n}} for all namespaces:
+        the shared totals plus this process's counts not written yet.
+        """
+        try:
+            rows = self._connect().execute("SELECT namespace, hits, misses FROM stats").fetchall()
+        except sqlite3.Error:
+            rows = []
+        stats = {ns: {'hits': hits, 'misses': misses} for ns, hits, misses in rows}
+        with self._lock:
+            pending = [(ns, hits, misses) for ns, (hits, misses) in self._own_pending().items()]
+        for ns, hits, misses in pending:
+            counts = stats.setdefault(ns, {'hits': 0, 'misses': 0})
+            counts['hits'] += hits
+            counts['misses'] += misses
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+            self._estimate = 0
+        conn = self._connect()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM stats")
+
+
+class MemoryCache:
+    """
+    In-process LRU cache bounded by the approximate JSON size of its values.
+
+    get_or_load() protects against stampedes: concurrent callers asking for
+    the same missing key share a single in-flight load.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, default_ttl=3600):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._pid = os.getpid()
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._size = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value or None if missing or expired.
+        """
+        with self._lock:
+            self._own_counts()
+            value = self._get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def _own_counts(self):
+        # Called with the lock held. Counts from before a fork are the
+        # parent's, the metrics add up the counts of every process.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.hits = self.misses = self.coalesced = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, size = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + (ttl or self.default_ttl)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Return the cached value for key, calling loader() on a miss.
+        A loader result of None is returned but not cached.
+        """
+        with self._lock:
+            self._own_counts()
+            value = self._get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            if value is not None:
+                self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            self._own_counts()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'entries': len(self._entries),
+                'bytes': self._size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
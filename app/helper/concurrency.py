@@ -0,0 +1,215 @@
+import contextvars
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from flask import current_app, has_app_context
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+# Reentrant, since creating one extension may need another
+_extensions_lock = threading.RLock()
+
+
+def app_extension(name, create):
+    """
+    Return current_app.extensions[name], made by create() on first use.
+    Concurrent first requests of a threaded worker get the same object
+    instead of each building their own.
+    """
+    extensions = current_app.extensions
+    value = extensions.get(name)
+    if value is None:
+        with _extensions_lock:
+            value = extensions.get(name)
+            if value is None:
+                value = extensions[name] = create()
+    return value
+
+
+def shared_executor():
+    """
+    Return this process's long-lived thread pool (WORKER_POOL_SIZE threads).
+    Its threads, and their per-thread SQLite connections, are reused by all
+    requests instead of being created per call.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # Threads don't survive a fork; the child starts its own pool
+            size = current_app.config.get('WORKER_POOL_SIZE', 64) if has_app_context() else 64
+            _executor = ThreadPoolExecutor(max_workers=max(1, int(size)), thread_name_prefix='marcify-worker')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _in_app_context(app, func, *args):
+    if app is None:
+        return func(*args)
+    with app.app_context():
+        return func(*args)
+
+
+def bounded_map(func, items, max_in_flight=8):
+    """
+    Apply func to every item on the shared thread pool.
+
+    Results are yielded in input order, so output stays deterministic.
+    At most max_in_flight calls run at the same time and items are pulled
+    lazily from the input. Closing the generator early cancels calls that
+    have not started yet. Workers run inside the caller's Flask app context.
+
+    A call that has not started by the time its result is needed runs in
+    the calling thread, so nested calls from pool threads can't deadlock
+    when the pool is busy.
+    """
+    max_in_flight = max(1, int(max_in_flight))
+    app = current_app._get_current_object() if has_app_context() else None
+    executor = shared_executor()
+
+    pending = deque()
+    try:
+        for item in items:
+            # Copy context vars (e.g. request priority) into the worker
+            context = contextvars.copy_context()
+            pending.append((executor.submit(context.run, _in_app_context, app, func, item), context, item))
+            if len(pending) >= max_in_flight:
+                yield _result(app, func, *pending.popleft())
+        while pending:
+            yield _result(app, func, *pending.popleft())
+    finally:
+        for future, _, _ in pending:
+            future.cancel()
+
+
+def _result(app, func, future, context, item):
+    if future.cancel():
+        return context.run(_in_app_context, app, func, item)
+    return future.result()
+
+
+def run_in_background(func, *args):
+    """
+    Run func(*args) on the shared thread pool without waiting for it, in
+    the caller's app context. Returns its Future.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+    return shared_executor().submit(contextvars.copy_context().run, _in_app_context, app, func, *args)
+
+
+def run_concurrently(*calls):
+    """
+    Run independent zero-argument callables concurrently.
+    Returns their results in argument order.
+    """
+    return list(bounded_map(lambda call: call(), calls, len(calls) or 1))
+
+
+class TaskPool:
+    """
+    Concurrency budget for a multi-stage pipeline on the shared thread pool.
+
+    Work is submitted through task groups (see group()). Tasks may submit
+    follow-up tasks into their group, so stages overlap: a later stage starts
+    as soon as its input is ready, not when the whole earlier stage is done.
+    At most max_workers tasks of the pool run at the same time; the rest
+    wait per group in order of submission, and free slots go to the groups
+    in turn, so one group's many tasks can't hold back another's.
+    """
+
+    def __init__(self, max_workers):
+        self.app = current_app._get_current_object() if has_app_context() else None
+        self.max_workers = max(1, int(max_workers))
+        self._executor = shared_executor()
+        self._queues = {}  # group -> deque of (future, call)
+        self._turns = deque()  # groups with queued tasks, next one first
+        self._running = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def group(self):
+        return TaskGroup(self)
+
+    def _submit(self, group, future, call):
+        with self._lock:
+            if self._closed:
+                future.cancel()
+                return
+            if self._running >= self.max_workers:
+                queue = self._queues.setdefault(group, deque())
+                if not queue:
+                    self._turns.append(group)
+                queue.append((future, call))
+                return
+            self._running += 1
+        self._executor.submit(self._work, future, call)
+
+    def _next(self):
+        # Called with the lock held
+        group = self._turns.popleft()
+        queue = self._queues[group]
+        task = queue.popleft()
+        if queue:
+            self._turns.append(group)
+        return task
+
+    def _work(self, future, call):
+        # One of the pool's max_workers lanes: runs tasks until none are queued
+        while True:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = call()
+                except BaseException as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+            with self._lock:
+                if not self._turns:
+                    self._running -= 1
+                    return
+                future, call = self._next()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._closed = True
+            queued = [task for queue in self._queues.values() for task in queue]
+            self._queues = {}
+            self._turns.clear()
+        for future, _ in queued:
+            future.cancel()
+
+
+class TaskGroup:
+    """
+    Tasks of one pipeline stage chain. cancel() drops every task of the group
+    that has not started yet and turns later submissions into no-ops.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.cancelled = False
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        future = Future()
+        with self._lock:
+            if self.cancelled:
+                future.cancel()
+                return future
+            self._futures.append(future)
+        self.pool._submit(self, future, partial(contextvars.copy_context().run, _in_app_context, self.pool.app, func, *args))
+        return future
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            for future in self._futures:
+                future.cancel()
@@ -1,7 +1,60 @@
 import json
+
 import requests
+from flask import current_app
+
+from app.helper import http_client
+
+# Spotify accepts at most 100 URIs per add-items request
+MAX_ITEMS_PER_REQUEST = 100
+
+
+def post_json(url, token, body):
+    """
+    POST a JSON body to the Spotify API.
+    Rate limits and retries are handled by the request scheduler.
+    Returns the response, or None if the request failed.
+    """
+    try:
+        return http_client.post(
+            url=url,
+            data=json.dumps(body),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    except requests.RequestException:
+        return None
+
+
+def add_tracks_to_playlist(token, playlist_id, uris, progress=None):
+    """
+    Add tracks to a playlist in chunks of MAX_ITEMS_PER_REQUEST.
 
-def create_playlist(username, token, data):
+    Chunks are sent one after another: Spotify only accepts an insert
+    position up to the playlist's current length, so ordered chunks cannot
+    be written concurrently. Stops at the first chunk that fails.
+    progress(added, total) is called after every chunk.
+    Returns the number of tracks added.
+    """
+    # Note: POST /playlists/{id}/tracks was renamed to /items in Feb 2026 Dev Mode changes
+    endpoint_url = f"{current_app.config['SPOTIFY_API_URL']}/playlists/{playlist_id}/items"
+
+    added = 0
+    for start in range(0, len(uris), MAX_ITEMS_PER_REQUEST):
+        chunk = uris[start:start + MAX_ITEMS_PER_REQUEST]
+        response = post_json(endpoint_url, token, {"uris": chunk, "position": start})
+        if response is None or not 200 <= response.status_code <= 299:
+            break
+        added += len(chunk)
+        if progress:
+            progress(added, len(uris))
+
+    return added
+
+
+def create_playlist(username, token, data, progress=None):
     """
     Create a new Spotify playlist and add tracks to it.
 
@@ -9,6 +62,9 @@ def create_playlist(username, token, data):
         username: Spotify user ID
         token: Access token
         data: Dict containing 'uris' (list of track URIs) and optionally 'name'
+        progress: Optional callback(added, total) reporting how many tracks were saved
+
+    Returns True only if every track was added.
     """
     # Extract URIs and name from data
     uris = data.get('uris', [])
@@ -26,40 +82,18 @@ def create_playlist(username, token, data):
 
     # Create new playlist via /me/playlists
     # Note: POST /users/{user_id}/playlists was removed in Feb 2026 Dev Mode changes
-    endpoint_url = "https://api.spotify.com/v1/me/playlists"
-    request_body = json.dumps({
+    endpoint_url = f"{current_app.config['SPOTIFY_API_URL']}/me/playlists"
+    response = post_json(endpoint_url, token, {
         "name": playlist_name,
         "description": "Created by Magic Music Generator",
         "public": False
     })
-    response = requests.post(
-        url=endpoint_url,
-        data=request_body,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}"
-        }
-    )
-
-    if response.status_code < 200 or response.status_code >= 300:
+
+    if response is None or response.status_code < 200 or response.status_code >= 300:
         return False
 
     playlist_id = response.json().get('id')
     if not playlist_id:
         return False
 
-    # Add tracks to playlist via /items
-    # Note: POST /playlists/{id}/tracks was renamed to /items in Feb 2026 Dev Mode changes
-    endpoint_url = f"https://api.spotify.com/v1/playlists/{playlist_id}/items"
-    request_body = json.dumps({"uris": uris})
-
-    response = requests.post(
-        url=endpoint_url,
-        data=request_body,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {token}"
-        }
-    )
-
-    return 200 <= response.status_code <= 299
\ No newline at end of file
+    return add_tracks_to_playlist(token, playlist_id, uris, progress) == len(uris)
\ No newline at end of file
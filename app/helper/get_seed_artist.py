@@ -1,12 +1,13 @@
-import requests
 import json
 
+from app.helper import http_client
+
 def get_seed_artist(data, token):
     
     if data["seed-artist"] != "":
         query = f'https://api.spotify.com/v1/search?query={data["seed-artist"]}&type=artist&offset=0&limit=1'
     
-        response = requests.get(query, 
+        response = http_client.get(query, 
                                 headers={"Content-Type":"application/json", 
                                         "Authorization": "Bearer " + f"{token}"})
 
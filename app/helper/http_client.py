@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+
+import requests
+from flask import current_app, has_app_context
+from requests.adapters import HTTPAdapter
+
+from app.helper import tracing
+from app.helper.concurrency import app_extension
+from app.helper.scheduler import RequestScheduler, api_name
+
+
+_local_state = {'pid': None, 'session': None}
+_lock = threading.Lock()
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def get_session():
+    """
+    Return the process-wide requests.Session.
+
+    The session keeps one keep-alive connection pool per host, so repeated
+    calls to Spotify and Last.fm reuse TCP+TLS connections. A new session is
+    created after a fork, since pooled sockets must not be shared between
+    worker processes.
+    """
+    pid = os.getpid()
+    if _local_state['pid'] == pid:
+        return _local_state['session']
+
+    with _lock:
+        if _local_state['pid'] != pid:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=_setting('HTTP_POOL_CONNECTIONS', 4),
+                pool_maxsize=_setting('HTTP_POOL_MAXSIZE', 16)
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _local_state['session'] = session
+            _local_state['pid'] = pid
+    return _local_state['session']
+
+
+def per_worker_limit(rate, burst):
+    """
+    This worker's share of a container-wide (rate, burst) limit: the
+    limits are split evenly between RATE_LIMIT_WORKERS processes.
+    """
+    workers = max(1, int(_setting('RATE_LIMIT_WORKERS', 1)))
+    return rate / workers, max(1, burst // workers)
+
+
+def get_scheduler():
+    """
+    Return the app's request scheduler (rate limits are per worker process,
+    see per_worker_limit).
+    """
+    def create():
+        config = current_app.config
+        return RequestScheduler(
+            api_limits={
+                "spotify": per_worker_limit(config.get('SPOTIFY_RATE_LIMIT', 20), config.get('SPOTIFY_RATE_BURST', 40)),
+                "lastfm": per_worker_limit(config.get('LASTFM_RATE_LIMIT', 5), config.get('LASTFM_RATE_BURST', 60)),
+            },
+            token_limit=per_worker_limit(config.get('TOKEN_RATE_LIMIT', 10), config.get('TOKEN_RATE_BURST', 20)),
+            max_retries=config.get('API_MAX_RETRIES', 3),
+            max_delay=config.get('API_RETRY_MAX_DELAY', 30),
+            deadline=config.get('API_CALL_DEADLINE', 20)
+        )
+    return app_extension('request_scheduler', create)
+
+
+def request(method, url, **kwargs):
+    """
+    Send an HTTP request over the shared session.
+    Uses HTTP_TIMEOUT unless a timeout is given. Inside the app, the call
+    goes through the request scheduler (rate limits, priorities, retries,
+    all within API_CALL_DEADLINE seconds)
+    and is recorded in the current request's trace, including the time
+    spent waiting for the scheduler.
+    """
+    kwargs.setdefault('timeout', _setting('HTTP_TIMEOUT', 10))
+    session = get_session()
+
+    def send(timeout=kwargs['timeout']):
+        return session.request(method, url, **dict(kwargs, timeout=timeout))
+
+    if not has_app_context():
+        return send()
+
+    authorization = (kwargs.get('headers') or {}).get("Authorization", "")
+    token = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else None
+    api = api_name(url, current_app.config)
+    start = time.perf_counter()
+    response = None
+    error = None
+    try:
+        response = get_scheduler().send(api, method, token, send, timeout=kwargs['timeout'])
+        return response
+    except Exception as exc:
+        error = type(exc).__name__
+        raise
+    finally:
+        tracing.record_call(
+            api,
+            tracing.endpoint_name(api, method, url, kwargs.get('params')),
+            time.perf_counter() - start,
+            status=response.status_code if response is not None else None,
+            size=len(response.content) if response is not None else 0,
+            cache='network',
+            error=error
+        )
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
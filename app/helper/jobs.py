@@ -0,0 +1,300 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import current_app
+
+from app.helper.cache import pid_alive, thread_connection
+from app.helper.concurrency import app_extension
+from app.helper.scheduler import PRIORITY_BACKGROUND, priority
+
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+JOB_FIELDS = ('id', 'user_id', 'kind', 'status', 'created', 'finished', 'result', 'error')
+
+
+class JobLimitError(Exception):
+    """Raised when a user already has the maximum number of active jobs."""
+
+
+def job_key(user_id, kind, params):
+    """
+    Deduplication key: the same user asking for the same kind of job with
+    identical parameters gets the same job.
+    """
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"{user_id}:{kind}:{digest}"
+
+
+class JobQueue:
+    """
+    Runs expensive work (generation, analysis) on a local worker pool,
+    outside the request cycle.
+
+    Job records live in a SQLite file, so every worker process can answer
+    status polls; the work itself runs in the process that accepted the job.
+    A job is deduplicated against an identical queued or running job of the
+    same user; once it has finished, the same request starts a new job
+    (results can differ, e.g. randomized recommendations). Records are kept
+    for result_ttl seconds after the job finished. per_user_limit caps the
+    active jobs of one user across all worker processes.
+
+    Each record names its owner process, which refreshes a heartbeat on its
+    active jobs every heartbeat_interval seconds. An active job whose owner
+    has exited, or stopped beating for stale_after seconds, is marked failed.
+    Jobs run at background priority, so live requests go first.
+    """
+
+    def __init__(self, app, path, max_workers=4, per_user_limit=2, result_ttl=600,
+                 heartbeat_interval=5, stale_after=30):
+        self.app = app
+        self.path = path
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self.result_ttl = result_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._done = {}  # job id -> threading.Event, for jobs of this process
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, key TEXT NOT NULL, user_id TEXT NOT NULL, kind TEXT NOT NULL,"
+            " status TEXT NOT NULL, owner TEXT NOT NULL, heartbeat REAL NOT NULL,"
+            " created REAL NOT NULL, finished REAL, expires_at REAL,"
+            " result TEXT, error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, status)")
+
+    def _connect(self):
+        return thread_connection(self._local, self.path)
+
+    @contextmanager
+    def _transaction(self):
+        # Takes the write lock up front, so checks and inserts of concurrent
+        # submits from other workers can't interleave
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @property
+    def owner(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _get_executor(self):
+        # Worker threads do not survive a fork, start a fresh pool per process
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._done = {}
+            self._pid = os.getpid()
+            threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True).start()
+        return self._executor
+
+    def _heartbeat_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                if not self._done:
+                    continue
+            try:
+                self._connect().execute(
+                    f"UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN ({','.join('?' * len(ACTIVE_STATUSES))})",
+                    (time.time(), self.owner, *ACTIVE_STATUSES)
+                )
+            except sqlite3.Error as exc:
+                logger.warning("Job heartbeat failed: %s", exc)
+
+    def _owner_gone(self, owner, heartbeat, now):
+        if now - heartbeat > self.stale_after:
+            return True
+        host, _, pid = owner.rpartition(":")
+        return host == socket.gethostname() and not pid_alive(int(pid))
+
+    def _reap(self, conn, rows, now):
+        """
+        Mark active jobs among rows (id, owner, heartbeat) whose owner is gone
+        as failed. Returns the ids marked.
+        """
+        dead = [job_id for job_id, owner, heartbeat in rows if self._owner_gone(owner, heartbeat, now)]
+        for job_id in dead:
+            logger.warning("Job %s lost its worker process, marking it failed", job_id)
+            conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, finished = ?, expires_at = ? "
+                f"WHERE id = ? AND status IN ({','.join('?' * len(ACTIVE_STATUSES))})",
+                (JOB_FAILED, "Worker process exited", now, now + self.result_ttl, job_id, *ACTIVE_STATUSES)
+            )
+        return dead
+
+    def submit(self, user_id, kind, params, func, *args):
+        """
+        Queue func(*args) as a job of kind for user_id and return its record.
+        params identify the job for deduplication (they are not passed to
+        func). Raises JobLimitError if the user has too many active jobs.
+        """
+        key = job_key(user_id, kind, params)
+        now = time.time()
+        active = ','.join('?' * len(ACTIVE_STATUSES))
+        with self._lock:
+            executor = self._get_executor()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+            self._reap(conn, conn.execute(
+                f"SELECT id, owner, heartbeat FROM jobs WHERE user_id = ? AND status IN ({active})",
+                (user_id, *ACTIVE_STATUSES)
+            ).fetchall(), now)
+
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE key = ? AND status IN ({active}) "
+                f"ORDER BY created DESC",
+                (key, *ACTIVE_STATUSES)
+            ).fetchone()
+            if row is not None:
+                return self._record(row)
+
+            count = conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ({active})",
+                (user_id, *ACTIVE_STATUSES)
+            ).fetchone()[0]
+            if count >= self.per_user_limit:
+                raise JobLimitError(f"At most {self.per_user_limit} active jobs per user")
+
+            job = {
+                'id': uuid.uuid4().hex,
+                'user_id': user_id,
+                'kind': kind,
+                'status': JOB_QUEUED,
+                'created': now,
+                'finished': None,
+                'result': None,
+                'error': None
+            }
+            conn.execute(
+                "INSERT INTO jobs (id, key, user_id, kind, status, owner, heartbeat, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job['id'], key, user_id, kind, JOB_QUEUED, self.owner, now, now)
+            )
+
+        with self._lock:
+            self._done[job['id']] = threading.Event()
+        executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        try:
+            with self.app.app_context(), priority(PRIORITY_BACKGROUND):
+                self._update(job['id'], status=JOB_RUNNING)
+                try:
+                    result = func(*args)
+                except Exception as exc:
+                    logger.exception("Job %s (%s) failed", job['id'], job['kind'])
+                    self._finish(job['id'], JOB_FAILED, error=str(exc))
+                else:
+                    self._finish(job['id'], JOB_DONE, result=json.dumps(result))
+        finally:
+            with self._lock:
+                done = self._done.pop(job['id'], None)
+            if done is not None:
+                done.set()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = time.time()
+        self._update(job_id, status=status, result=result, error=error, finished=now,
+                     expires_at=now + self.result_ttl)
+
+    def _update(self, job_id, **fields):
+        try:
+            self._connect().execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)}, heartbeat = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id)
+            )
+        except sqlite3.Error as exc:
+            logger.warning("Could not update job %s: %s", job_id, exc)
+
+    @staticmethod
+    def _record(row):
+        job = dict(zip(JOB_FIELDS, row))
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def get(self, job_id):
+        """
+        Return the job record or None if unknown or expired. Reading does
+        not write, unless the job has to be marked failed.
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)}, owner, heartbeat FROM jobs "
+                f"WHERE id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (job_id, now)
+            ).fetchone()
+            if row is None:
+                return None
+            job = self._record(row[:len(JOB_FIELDS)])
+            if job['status'] in ACTIVE_STATUSES and self._reap(conn, [(job_id, *row[len(JOB_FIELDS):])], now):
+                job.update(status=JOB_FAILED, error="Worker process exited", finished=now)
+            return job
+        except sqlite3.Error:
+            return None
+
+    def wait(self, job_id, timeout, interval=0.25):
+        """
+        Return the job record once it has finished or timeout seconds have
+        passed, whichever comes first. Jobs of this process are waited for
+        directly; others are polled every interval seconds.
+        """
+        with self._lock:
+            done = self._done.get(job_id) if self._pid == os.getpid() else None
+        if done is not None:
+            done.wait(timeout)
+            return self.get(job_id)
+
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and job['status'] in ACTIVE_STATUSES and time.monotonic() < deadline:
+            time.sleep(min(interval, max(0, deadline - time.monotonic())))
+            job = self.get(job_id)
+        return job
+
+
+def get_job_queue():
+    """
+    Return the app's background job queue.
+    """
+    return app_extension('job_queue', lambda: JobQueue(
+        current_app._get_current_object(),
+        current_app.config['JOB_STORE_PATH'],
+        max_workers=current_app.config.get('JOB_WORKERS', 4),
+        per_user_limit=current_app.config.get('JOB_PER_USER_LIMIT', 2),
+        result_ttl=current_app.config.get('JOB_RESULT_TTL', 600)
+    ))
@@ -0,0 +1,72 @@
+import json
+import logging
+import time
+
+from flask import current_app
+
+from app.helper import http_client, tracing
+from app.helper.cache import SQLiteCache
+from app.helper.concurrency import app_extension
+
+logger = logging.getLogger(__name__)
+
+
+def get_lastfm_cache():
+    """
+    Return the app's shared Last.fm response cache, or None if disabled.
+    """
+    if not current_app.config.get('LASTFM_CACHE_ENABLED'):
+        return None
+    return app_extension('lastfm_cache', lambda: SQLiteCache(
+        current_app.config['LASTFM_CACHE_PATH'],
+        max_entries=current_app.config.get('LASTFM_CACHE_MAX_ENTRIES', 10000)
+    ))
+
+
+def _cache_key(params):
+    # Last.fm names are case-insensitive, so normalize string params
+    normalized = {k: v.strip().lower() if isinstance(v, str) else v for k, v in params.items()}
+    return json.dumps(normalized, sort_keys=True)
+
+
+def lastfm_get(method, **params):
+    """
+    Call a Last.fm API method and return the parsed JSON response.
+    Returns None if no API key is configured or the request failed.
+
+    Successful responses are cached per method for the TTL configured in
+    LASTFM_CACHE_TTLS; methods without a TTL are not cached.
+    """
+    api_key = current_app.config.get('LASTFM_API_KEY')
+    if not api_key:
+        return None
+
+    ttl = current_app.config.get('LASTFM_CACHE_TTLS', {}).get(method)
+    cache = get_lastfm_cache() if ttl else None
+    key = _cache_key(params)
+
+    if cache is not None:
+        start = time.perf_counter()
+        data = cache.get(method, key)
+        if data is not None:
+            tracing.record_call('lastfm', method, time.perf_counter() - start, cache='hit')
+            return data
+
+    query = dict(params, method=method, api_key=api_key, format="json")
+    try:
+        response = http_client.get(current_app.config['LASTFM_API_URL'], params=query)
+        if response.status_code != 200:
+            logger.warning("Last.fm %s returned HTTP %s", method, response.status_code)
+            return None
+        data = response.json()
+    except Exception as exc:
+        logger.warning("Last.fm %s failed: %s", method, exc)
+        return None
+
+    # Last.fm reports errors (e.g. unknown artist) with status 200
+    if isinstance(data, dict) and "error" in data:
+        tracing.count(f"lastfm.error.{method}")
+    elif cache is not None and isinstance(data, dict):
+        cache.set(method, key, data, ttl)
+
+    return data
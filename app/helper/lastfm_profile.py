@@ -1,6 +1,16 @@
-import requests
+import random
+import re
+import threading
 from flask import current_app
 from collections import Counter
+from functools import lru_cache
+from itertools import islice
+
+from app.helper import http_client, tracing
+from app.helper.concurrency import TaskPool, bounded_map, run_in_background
+from app.helper.lastfm_api import lastfm_get
+from app.helper.scheduler import PRIORITY_BACKGROUND, priority
+from app.helper.tag_index import SOURCE_TAG, get_tag_index
 
 
 # Tag categories for mood/energy profiling
@@ -23,35 +33,38 @@ TAG_CATEGORIES = {
     }
 }
 
+# Common music genres, used to pick genre tags out of a profile's top tags
+GENRE_KEYWORDS = ['rock', 'pop', 'hip hop', 'rap', 'electronic', 'jazz', 'classical',
+                  'metal', 'punk', 'indie', 'alternative', 'r&b', 'soul', 'country',
+                  'folk', 'blues', 'reggae', 'latin', 'dance', 'house', 'techno']
+
+
+def _keyword_pattern(keywords):
+    # A single alternation regex matches if any keyword is a substring of the tag
+    return re.compile("|".join(re.escape(kw) for kw in keywords))
+
+
+# Compiled once at import time: one pattern per category polarity
+_CATEGORY_PATTERNS = {
+    category: (_keyword_pattern(keywords['high']), _keyword_pattern(keywords['low']))
+    for category, keywords in TAG_CATEGORIES.items()
+}
+_GENRE_PATTERN = _keyword_pattern(GENRE_KEYWORDS)
+
 
 def get_track_tags_lastfm(track_name, artist_name, limit=10):
     """
     Get tags for a track from Last.fm API.
     Returns list of tag names.
     """
-    api_key = current_app.config.get('LASTFM_API_KEY')
-    if not api_key:
-        return []
-
-    url = "http://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "track.gettoptags",
-        "track": track_name,
-        "artist": artist_name,
-        "api_key": api_key,
-        "format": "json"
-    }
-
     try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "toptags" in data and "tag" in data["toptags"]:
-                tags = data["toptags"]["tag"]
-                if isinstance(tags, list):
-                    return [tag["name"].lower() for tag in tags[:limit]]
-                elif isinstance(tags, dict):
-                    return [tags["name"].lower()]
+        data = lastfm_get("track.gettoptags", track=track_name, artist=artist_name)
+        if data and "toptags" in data and "tag" in data["toptags"]:
+            tags = data["toptags"]["tag"]
+            if isinstance(tags, list):
+                return [tag["name"].lower() for tag in tags[:limit]]
+            elif isinstance(tags, dict):
+                return [tags["name"].lower()]
     except Exception:
         pass
 
@@ -60,45 +73,98 @@ def get_track_tags_lastfm(track_name, artist_name, limit=10):
 
 def get_artist_tags_lastfm(artist_name, limit=10):
     """
-    Get tags for an artist from Last.fm API.
+    Get tags for an artist from the tag index, or from the Last.fm API if the
+    artist is not indexed yet (the result is then added to the index).
     Fallback when track tags are not available.
     """
-    api_key = current_app.config.get('LASTFM_API_KEY')
-    if not api_key:
-        return []
-
-    url = "http://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "artist.gettoptags",
-        "artist": artist_name,
-        "api_key": api_key,
-        "format": "json"
-    }
+    index = get_tag_index()
+    if index is not None:
+        tags = index.artist_tags(artist_name, limit)
+        if tags is not None:
+            return tags
 
     try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "toptags" in data and "tag" in data["toptags"]:
-                tags = data["toptags"]["tag"]
-                if isinstance(tags, list):
-                    return [tag["name"].lower() for tag in tags[:limit]]
+        data = lastfm_get("artist.gettoptags", artist=artist_name)
+        if data and "toptags" in data and "tag" in data["toptags"]:
+            tags = data["toptags"]["tag"]
+            if isinstance(tags, list):
+                if index is not None:
+                    # Last.fm tag counts are relative, 100 for the top tag
+                    index.set_artist_tags(artist_name, [
+                        (tag["name"].lower(), int(tag.get("count") or 0) / 100) for tag in tags
+                    ])
+                return [tag["name"].lower() for tag in tags[:limit]]
     except Exception:
         pass
 
     return []
 
 
+def _first_artist(track):
+    artists = track.get('artists', [])
+    return artists[0]['name'] if artists else ''
+
+
+def fetch_track_tags(track):
+    """
+    Get tags for a Spotify track object, falling back to artist tags.
+    Returns (track_name, artist_name, tags).
+    """
+    track_name = track.get('name', '')
+    artist_name = _first_artist(track)
+
+    # Get tags for this track
+    tags = get_track_tags_lastfm(track_name, artist_name)
+
+    # Fallback to artist tags if track has no tags
+    if not tags and artist_name:
+        tracing.count('profile.artist_tags_fallback')
+        tags = get_artist_tags_lastfm(artist_name)
+
+    return track_name, artist_name, tags
+
+
+@lru_cache(maxsize=65536)
+def classify_tag(tag):
+    """
+    Match a tag against the TAG_CATEGORIES keywords.
+    Returns a tuple of (category, is_high, is_low) for every category it matches.
+    Each distinct tag is only classified once.
+    """
+    matches = []
+    for category, (high, low) in _CATEGORY_PATTERNS.items():
+        is_high = high.search(tag) is not None
+        is_low = low.search(tag) is not None
+        if is_high or is_low:
+            matches.append((category, is_high, is_low))
+    return tuple(matches)
+
+
+@lru_cache(maxsize=65536)
+def is_genre_tag(tag):
+    """
+    Check whether a tag names one of the GENRE_KEYWORDS.
+    """
+    return _GENRE_PATTERN.search(tag) is not None
+
+
 def calculate_tag_scores(tags):
     """
     Calculate scores for each category based on tags.
     Returns dict with scores from 0.0 to 1.0 for each category.
     """
     scores = {}
+    high_counts = dict.fromkeys(TAG_CATEGORIES, 0)
+    low_counts = dict.fromkeys(TAG_CATEGORIES, 0)
 
-    for category, keywords in TAG_CATEGORIES.items():
-        high_count = sum(1 for tag in tags if any(kw in tag for kw in keywords['high']))
-        low_count = sum(1 for tag in tags if any(kw in tag for kw in keywords['low']))
+    for tag in tags:
+        for category, is_high, is_low in classify_tag(tag):
+            high_counts[category] += is_high
+            low_counts[category] += is_low
+
+    for category in TAG_CATEGORIES:
+        high_count = high_counts[category]
+        low_count = low_counts[category]
 
         total = high_count + low_count
         if total > 0:
@@ -115,7 +181,7 @@ def get_user_top_tracks(token, limit=50, time_range='medium_term'):
     Get user's top tracks from Spotify.
     time_range: short_term (4 weeks), medium_term (6 months), long_term (years)
     """
-    url = f"https://api.spotify.com/v1/me/top/tracks"
+    url = f"{current_app.config['SPOTIFY_API_URL']}/me/top/tracks"
     params = {
         "limit": limit,
         "time_range": time_range
@@ -123,7 +189,7 @@ def get_user_top_tracks(token, limit=50, time_range='medium_term'):
     headers = {"Authorization": f"Bearer {token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = http_client.get(url, params=params, headers=headers)
         if response.status_code == 200:
             data = response.json()
             return data.get("items", [])
@@ -133,58 +199,106 @@ def get_user_top_tracks(token, limit=50, time_range='medium_term'):
     return []
 
 
-def analyze_tracks_profile(tracks):
+class ProfileAggregator:
     """
-    Analyze a list of tracks and create a taste profile based on Last.fm tags.
-    Returns profile dict with scores and top tags.
+    Builds a taste profile incrementally: tag counts and category score
+    sums are updated as each track's tags arrive, so a (partial) profile
+    can be read at any time. The state is a plain dict so it can be
+    stored and resumed later.
     """
-    all_tags = []
-    track_analyses = []
 
-    for track in tracks:
-        track_name = track.get('name', '')
-        artists = track.get('artists', [])
-        artist_name = artists[0]['name'] if artists else ''
+    def __init__(self, state=None):
+        state = state or {}
+        self.tag_counts = Counter(state.get('tag_counts', {}))
+        self.score_sums = dict.fromkeys(TAG_CATEGORIES, 0.0)
+        self.score_sums.update(state.get('score_sums', {}))
+        self.track_analyses = list(state.get('track_analyses', []))
+        self.complete = state.get('complete', False)
+
+    @staticmethod
+    def track_key(track_name, artist_name):
+        return f"{artist_name.lower()}\x1f{track_name.lower()}"
+
+    def seen(self):
+        """Keys of all tracks already added."""
+        return {self.track_key(t['name'], t['artist']) for t in self.track_analyses}
+
+    def add(self, track_name, artist_name, tags):
+        """Add one track's tags and return its analysis."""
+        scores = calculate_tag_scores(tags)
+        self.tag_counts.update(tags)
+        for category, score in scores.items():
+            self.score_sums[category] += score
+
+        analysis = {
+            'name': track_name,
+            'artist': artist_name,
+            'tags': tags[:5],
+            'scores': scores
+        }
+        self.track_analyses.append(analysis)
+        return analysis
+
+    def profile(self, top=20):
+        """Return the profile of all tracks added so far."""
+        top_tags = self.tag_counts.most_common(top)
+        count = len(self.track_analyses)
+
+        # Average scores across all tracks
+        avg_scores = {category: total / count if count else 0.5
+                      for category, total in self.score_sums.items()}
+
+        # Extract genre tags (common music genres)
+        genres = [tag for tag, count in top_tags if is_genre_tag(tag)][:5]
+
+        return {
+            'scores': avg_scores,
+            'top_tags': top_tags,
+            'genres': genres,
+            'track_count': count,
+            'track_analyses': self.track_analyses,
+            'complete': self.complete
+        }
+
+    def state(self):
+        return {
+            'tag_counts': dict(self.tag_counts),
+            'score_sums': self.score_sums,
+            'track_analyses': self.track_analyses,
+            'complete': self.complete
+        }
+
+
+def iter_profile_updates(tracks, aggregator=None):
+    """
+    Tag tracks concurrently and add them to the aggregator one by one,
+    yielding (aggregator, analysis) after each track. Tracks the aggregator
+    has already seen are skipped, so an interrupted analysis can be resumed.
+    The aggregator is marked complete once all tracks have been added.
+    """
+    aggregator = aggregator or ProfileAggregator()
+    seen = aggregator.seen()
+    pending = (t for t in tracks
+               if ProfileAggregator.track_key(t.get('name', ''), _first_artist(t)) not in seen)
 
-        # Get tags for this track
-        tags = get_track_tags_lastfm(track_name, artist_name)
+    # Tag lookups run concurrently, results come back in track order
+    max_in_flight = current_app.config.get('LASTFM_MAX_IN_FLIGHT', 8)
+    for track_name, artist_name, tags in bounded_map(fetch_track_tags, pending, max_in_flight):
+        yield aggregator, aggregator.add(track_name, artist_name, tags)
 
-        # Fallback to artist tags if track has no tags
-        if not tags and artist_name:
-            tags = get_artist_tags_lastfm(artist_name)
+    aggregator.complete = True
 
-        all_tags.extend(tags)
 
-        track_analyses.append({
-            'name': track_name,
-            'artist': artist_name,
-            'tags': tags[:5],
-            'scores': calculate_tag_scores(tags)
-        })
-
-    # Calculate overall profile
-    tag_counts = Counter(all_tags)
-    top_tags = tag_counts.most_common(20)
-
-    # Average scores across all tracks
-    avg_scores = {}
-    for category in TAG_CATEGORIES.keys():
-        scores = [t['scores'].get(category, 0.5) for t in track_analyses if t['scores']]
-        avg_scores[category] = sum(scores) / len(scores) if scores else 0.5
-
-    # Extract genre tags (common music genres)
-    genre_keywords = ['rock', 'pop', 'hip hop', 'rap', 'electronic', 'jazz', 'classical',
-                      'metal', 'punk', 'indie', 'alternative', 'r&b', 'soul', 'country',
-                      'folk', 'blues', 'reggae', 'latin', 'dance', 'house', 'techno']
-    genres = [tag for tag, count in top_tags if any(g in tag for g in genre_keywords)][:5]
-
-    return {
-        'scores': avg_scores,
-        'top_tags': top_tags,
-        'genres': genres,
-        'track_count': len(tracks),
-        'track_analyses': track_analyses
-    }
+def analyze_tracks_profile(tracks):
+    """
+    Analyze tracks and create a taste profile based on Last.fm tags.
+    tracks may be any iterable (e.g. iter_playlist_tracks); it is consumed
+    incrementally. Returns profile dict with scores and top tags.
+    """
+    aggregator = ProfileAggregator()
+    for _ in iter_profile_updates(tracks, aggregator):
+        pass
+    return aggregator.profile()
 
 
 def get_similar_tracks_by_profile(profile, token, limit=20):
@@ -192,69 +306,143 @@ def get_similar_tracks_by_profile(profile, token, limit=20):
     Find tracks that match the user's taste profile using Last.fm similar artists
     and filtering by tags.
     """
-    from app.helper.recommendations import get_similar_artists_lastfm, search_artist_top_tracks_spotify
+    return list(islice(iter_similar_tracks_by_profile(profile, token, limit), limit))
+
+
+def iter_similar_tracks_by_profile(profile, token, limit=20):
+    """
+    Yield tracks for get_similar_tracks_by_profile as soon as each one is found.
+    """
+    from app.helper.recommendations import search_artist_top_tracks_spotify
 
     # Use top genres/tags to find seed artists
     collected_tracks = []
     seen_uris = set()
 
-    # Get artists similar to the profile's top tags
-    for tag, count in profile['top_tags'][:5]:
-        # Search for artists by tag
-        similar_artists = get_artists_by_tag(tag, limit=5)
-
-        for artist in similar_artists:
-            if len(collected_tracks) >= limit:
-                break
+    # Get the artists that best match the profile's top tags
+    for artist in get_profile_artists(profile['top_tags'][:5], limit=25):
+        if len(collected_tracks) >= limit:
+            break
 
-            tracks = search_artist_top_tracks_spotify(artist, token, limit=3)
-            for track in tracks:
-                if track and track.get('uri') not in seen_uris:
-                    collected_tracks.append(track)
-                    seen_uris.add(track['uri'])
-
-    return collected_tracks[:limit]
+        tracks = search_artist_top_tracks_spotify(artist, token, limit=3)
+        for track in tracks:
+            if track and track.uri not in seen_uris:
+                collected_tracks.append(track)
+                seen_uris.add(track.uri)
+                yield track
 
 
 def get_artists_by_tag(tag, limit=10):
     """
     Get top artists for a tag from Last.fm.
+    With the tag index enabled, TAG_INDEX_FETCH_LIMIT artists are fetched and
+    added to the index.
     """
-    api_key = current_app.config.get('LASTFM_API_KEY')
-    if not api_key:
-        return []
-
-    url = "http://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "tag.gettopartists",
-        "tag": tag,
-        "api_key": api_key,
-        "format": "json",
-        "limit": limit
-    }
-
+    index = get_tag_index()
+    fetch_limit = max(limit, current_app.config.get('TAG_INDEX_FETCH_LIMIT', 50)) if index is not None else limit
     try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "topartists" in data and "artist" in data["topartists"]:
-                return [artist["name"] for artist in data["topartists"]["artist"]]
+        data = lastfm_get("tag.gettopartists", tag=tag, limit=fetch_limit)
+        if data and "topartists" in data and "artist" in data["topartists"]:
+            artists = [artist["name"] for artist in data["topartists"]["artist"]]
+            if index is not None:
+                # Artists come ranked, weight them by position
+                index.set_tag_artists(tag.lower(), [
+                    (artist, 1 - i / len(artists)) for i, artist in enumerate(artists)
+                ])
+            return artists[:limit]
     except Exception:
         pass
 
     return []
 
 
+def weighted_profile_tags(top_tags):
+    """Turn (tag, count) top tags into (tag, weight) pairs, 1 for the top tag."""
+    top_count = max((count for tag, count in top_tags), default=0) or 1
+    return [(tag.lower(), count / top_count) for tag, count in top_tags]
+
+
+def split_profile_tags(tags):
+    """
+    Return (stale, missing): tags whose indexed artists are due for a
+    refresh, and tags that were never indexed. Without the index every tag
+    counts as missing.
+    """
+    index = get_tag_index()
+    if index is None:
+        return [], list(tags)
+    fresh = index.fresh(SOURCE_TAG, tags)
+    known = index.known(SOURCE_TAG, tags)
+    return [tag for tag in tags if tag in known and tag not in fresh], [tag for tag in tags if tag not in known]
+
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def refresh_tags(tags, submit=run_in_background):
+    """
+    Refresh stale tags in the index without waiting for them, through
+    submit (e.g. a pipeline's TaskGroup.submit). Tags already being
+    refreshed in this process are skipped.
+    """
+    def refresh(tag):
+        # Nobody waits for it, so live requests go first
+        with priority(PRIORITY_BACKGROUND):
+            get_artists_by_tag(tag)
+
+    def done(tag):
+        # Also called if the refresh was cancelled before it started
+        with _refreshing_lock:
+            _refreshing.discard(tag)
+
+    for tag in tags:
+        with _refreshing_lock:
+            if tag in _refreshing:
+                continue
+            _refreshing.add(tag)
+        submit(refresh, tag).add_done_callback(lambda future, tag=tag: done(tag))
+
+
+def get_profile_artists(top_tags, limit=25):
+    """
+    Get candidate artists for a profile's (tag, count) top tags, best first.
+
+    Artists are scored by a weighted union over the tags (tag count times the
+    artist's weight for the tag) in a single tag index query. Tags that were
+    never indexed are fetched first, concurrently; stale ones are ranked as
+    indexed and refreshed in the background. Without the index the same
+    scoring is done over one get_artists_by_tag call per tag.
+    """
+    weighted_tags = weighted_profile_tags(top_tags)
+    tags = [tag for tag, weight in weighted_tags]
+    max_in_flight = current_app.config.get('LASTFM_MAX_IN_FLIGHT', 8)
+
+    index = get_tag_index()
+    if index is not None:
+        stale, missing = split_profile_tags(tags)
+        refresh_tags(stale)
+        for _ in bounded_map(get_artists_by_tag, missing, max_in_flight):
+            pass
+        return [artist for artist, score in index.artists_for_tags(weighted_tags, limit)]
+
+    scores = Counter()
+    for (tag, weight), artists in zip(weighted_tags, bounded_map(get_artists_by_tag, tags, max_in_flight)):
+        for i, artist in enumerate(artists):
+            scores[artist] += weight * (1 - i / len(artists))
+    return [artist for artist, score in scores.most_common(limit)]
+
+
 def get_user_playlists(token, limit=50):
     """
     Get all playlists of the current user from Spotify.
     """
-    url = "https://api.spotify.com/v1/me/playlists"
+    url = f"{current_app.config['SPOTIFY_API_URL']}/me/playlists"
     params = {"limit": limit}
     headers = {"Authorization": f"Bearer {token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = http_client.get(url, params=params, headers=headers)
         if response.status_code == 200:
             data = response.json()
             return data.get("items", [])
@@ -264,102 +452,258 @@ def get_user_playlists(token, limit=50):
     return []
 
 
-def get_playlist_tracks(token, playlist_id, limit=50):
+# Track fields needed for profiling; everything else is left out of playlist pages
+PLAYLIST_TRACK_FIELDS = "name,uri,artists(name)"
+
+SAMPLE_STRATEGIES = ('head', 'uniform', 'reservoir')
+
+
+def get_playlist_page(token, playlist_id, offset=0, limit=50, track_fields=PLAYLIST_TRACK_FIELDS):
     """
-    Get tracks from a specific playlist.
+    Get one page of a playlist's tracks.
+    Returns {'total': n, 'offset': offset, 'tracks': [...]} or None on failure.
     Note: /playlists/{id}/tracks was renamed to /playlists/{id}/items in Feb 2026 Dev Mode changes.
     """
-    url = f"https://api.spotify.com/v1/playlists/{playlist_id}/items"
-    params = {"limit": min(limit, 50), "fields": "items(track(name,artists,uri,album))"}
+    url = f"{current_app.config['SPOTIFY_API_URL']}/playlists/{playlist_id}/items"
+    params = {
+        "offset": offset,
+        "limit": min(limit, 50),
+        "fields": f"total,items(track({track_fields}))"
+    }
     headers = {"Authorization": f"Bearer {token}"}
 
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = http_client.get(url, params=params, headers=headers)
         if response.status_code == 200:
             data = response.json()
             # Extract track objects from the response
-            tracks = []
-            for item in data.get("items", []):
-                if item.get("track"):
-                    tracks.append(item["track"])
-            return tracks
+            tracks = [item["track"] for item in data.get("items", []) if item.get("track")]
+            return {'total': data.get("total", len(tracks)), 'offset': offset, 'tracks': tracks}
     except Exception:
         pass
 
-    return []
+    return None
+
+
+def iter_playlist_pages(token, playlist_id, page_size=50, track_fields=PLAYLIST_TRACK_FIELDS,
+                        prefetch=True, select_offsets=None):
+    """
+    Lazily yield the pages of a playlist (see get_playlist_page).
+
+    With prefetch, the next page is requested while the caller processes the
+    current one. select_offsets(total, page_size) may return the offsets of
+    the pages to fetch after the first one; by default all pages are fetched.
+    Stops at the first failed page.
+    """
+    first = get_playlist_page(token, playlist_id, 0, page_size, track_fields)
+    if first is None:
+        return
+    yield first
+
+    total = first['total']
+    if select_offsets is None:
+        offsets = range(page_size, total, page_size)
+    else:
+        offsets = [offset for offset in select_offsets(total, page_size) if offset > 0]
+
+    pages = bounded_map(
+        lambda offset: get_playlist_page(token, playlist_id, offset, page_size, track_fields),
+        offsets,
+        2 if prefetch else 1
+    )
+    try:
+        for page in pages:
+            if page is None:
+                return
+            yield page
+    finally:
+        pages.close()
+
+
+def iter_playlist_tracks(token, playlist_id, **kwargs):
+    """
+    Lazily yield all tracks of a playlist, page by page.
+    Accepts the same options as iter_playlist_pages.
+    """
+    for page in iter_playlist_pages(token, playlist_id, **kwargs):
+        yield from page['tracks']
+
+
+def _uniform_indices(total, k):
+    # Evenly spaced positions across the whole playlist
+    if total <= k:
+        return list(range(total))
+    return sorted({int(i * total / k) for i in range(k)})
 
 
-def generate_playlist_from_profile_and_artist(profile, seed_artist, token, variety=5, discovery=5, limit=20):
+def sample_playlist_tracks(token, playlist_id, k, strategy='head', seed=None, **kwargs):
+    """
+    Sample up to k tracks from a playlist without holding the whole playlist in memory.
+
+    Strategies:
+    - head: the first k tracks (stops fetching after them)
+    - uniform: k evenly spaced tracks; only pages containing them are fetched
+    - reservoir: a uniform random sample (Algorithm R) over a single pass
+    """
+    if strategy == 'head':
+        return list(islice(iter_playlist_tracks(token, playlist_id, **kwargs), k))
+
+    if strategy == 'uniform':
+        def select_offsets(total, page_size):
+            return sorted({index - index % page_size for index in _uniform_indices(total, k)})
+
+        sample = []
+        indices = None
+        for page in iter_playlist_pages(token, playlist_id, select_offsets=select_offsets, **kwargs):
+            if indices is None:
+                # The first page tells us the playlist size
+                indices = set(_uniform_indices(page['total'], k))
+            for position, track in enumerate(page['tracks'], start=page['offset']):
+                if position in indices:
+                    sample.append(track)
+        return sample
+
+    if strategy == 'reservoir':
+        rng = random.Random(seed)
+        sample = []
+        for position, track in enumerate(iter_playlist_tracks(token, playlist_id, **kwargs)):
+            if position < k:
+                sample.append(track)
+            else:
+                slot = rng.randint(0, position)
+                if slot < k:
+                    sample[slot] = track
+        return sample
+
+    raise ValueError(f"Unknown sampling strategy: {strategy}")
+
+
+def get_playlist_tracks(token, playlist_id, limit=50, sample='head'):
+    """
+    Get up to limit tracks from a specific playlist, chosen by a sampling
+    strategy (see sample_playlist_tracks).
+    """
+    return sample_playlist_tracks(token, playlist_id, limit, strategy=sample)
+
+
+def generate_playlist_from_profile_and_artist(profile, seed_artist, token, variety=5, discovery=5, limit=20,
+                                              random_seed=None):
     """
     Generate a playlist combining:
     - Profile mood/tags from analyzed playlist
     - Seed artist for similar artists
     - Variety (how many different artists)
     - Discovery (balance between profile tags and seed artist)
+
+    Lookups run as a staged pipeline (tag -> artists -> track search, seed artist ->
+    similar artists -> track search) on one pool bounded by GENERATION_MAX_IN_FLIGHT.
+    Stages overlap, and pending work is cancelled once a target is reached.
+    Results are consumed in the order of a sequential walk, so the output is
+    deterministic when random_seed is given.
     """
-    from app.helper.recommendations import get_similar_artists_lastfm, search_artist_top_tracks_spotify, search_by_genre_spotify
+    collected_tracks = list(iter_playlist_from_profile_and_artist(
+        profile, seed_artist, token, variety=variety, discovery=discovery, limit=limit
+    ))
 
-    collected_tracks = []
-    seen_uris = set()
+    # Shuffle to mix profile and seed artist tracks
+    random.Random(random_seed).shuffle(collected_tracks)
 
-    # Calculate how many tracks from profile tags vs seed artist
-    # Discovery: 1 = mostly profile, 10 = mostly seed artist
-    profile_ratio = 1 - (discovery / 10)
-    profile_tracks_target = max(1, int(limit * profile_ratio))
-    seed_tracks_target = limit - profile_tracks_target
+    return collected_tracks[:limit]
 
-    # Part 1: Get tracks based on profile tags
-    if profile and profile.get('top_tags'):
-        tags_to_use = profile['top_tags'][:max(3, variety)]
 
-        for tag, count in tags_to_use:
-            if len(collected_tracks) >= profile_tracks_target:
-                break
+def iter_playlist_from_profile_and_artist(profile, seed_artist, token, variety=5, discovery=5, limit=20):
+    """
+    Yield tracks for generate_playlist_from_profile_and_artist as soon as each
+    one is found and deduplicated, in collection order.
+    """
+    from app.helper.recommendations import get_related_artists, search_artist_top_tracks_spotify, search_by_genre_spotify
 
-            # Get more artists per tag to have better results
-            tag_artists = get_artists_by_tag(tag, limit=5)
+    collected_tracks = []
+    seen_uris = set()
 
-            for artist in tag_artists:
-                if len(collected_tracks) >= profile_tracks_target:
+    def add_tracks(tracks, target):
+        for track in tracks:
+            if track and track.uri not in seen_uris:
+                collected_tracks.append(track)
+                seen_uris.add(track.uri)
+                yield track
+                if len(collected_tracks) >= target:
                     break
 
-                tracks = search_artist_top_tracks_spotify(artist, token, limit=3)
-                for track in tracks:
-                    if track and track.get('uri') and track.get('uri') not in seen_uris:
-                        collected_tracks.append(track)
-                        seen_uris.add(track['uri'])
-                        if len(collected_tracks) >= profile_tracks_target:
-                            break
-
-    # Part 2: Get tracks based on seed artist and similar artists
-    if seed_artist and seed_artist.strip():
-        seed_artist = seed_artist.strip()
-
-        # Get seed artist's top tracks
-        seed_tracks = search_artist_top_tracks_spotify(seed_artist, token, limit=5)
-        for track in seed_tracks:
-            if track and track.get('uri') and track.get('uri') not in seen_uris:
-                collected_tracks.append(track)
-                seen_uris.add(track['uri'])
-                if len(collected_tracks) >= limit:
+    def consume(track_searches, target):
+        # track_searches yields lists of tracks; stop pulling once the target is reached
+        try:
+            for tracks in track_searches:
+                yield from add_tracks(tracks, target)
+                if len(collected_tracks) >= target:
                     break
+        finally:
+            track_searches.close()
 
-        # Get similar artists
-        similar_artists = get_similar_artists_lastfm(seed_artist, limit=max(5, variety))
-        for artist in similar_artists:
-            if len(collected_tracks) >= limit:
-                break
+    def search_artists(group, artists):
+        # Next pipeline stage: one track search per artist, started immediately
+        return [group.submit(search_artist_top_tracks_spotify, artist, token, 3) for artist in artists]
 
-            tracks = search_artist_top_tracks_spotify(artist, token, limit=3)
-            for track in tracks:
-                if track and track.get('uri') and track.get('uri') not in seen_uris:
-                    collected_tracks.append(track)
-                    seen_uris.add(track['uri'])
-                    if len(collected_tracks) >= limit:
-                        break
+    # Calculate how many tracks from profile tags vs seed artist
+    # Discovery: 1 = mostly profile, 10 = mostly seed artist
+    profile_ratio = 1 - (discovery / 10)
+    profile_tracks_target = max(1, int(limit * profile_ratio))
+    seed_tracks_target = limit - profile_tracks_target
+
+    budget = current_app.config.get('GENERATION_MAX_IN_FLIGHT', 12)
+    with TaskPool(budget) as pool:
+        profile_group = pool.group()
+        seed_group = pool.group()
+
+        # Start the profile tag stage. Artists ranked from the tag index are
+        # searched right away; tags that were never indexed run as their own
+        # stage (tag -> artists -> track searches). Stale tags are refreshed
+        # in the background once the ranking has been read, so the index
+        # doesn't change under it and a cancelled pipeline doesn't drop them.
+        tag_stages = []
+        if profile and profile.get('top_tags'):
+            weighted_tags = weighted_profile_tags(profile['top_tags'][:max(3, variety)])
+            stale, missing = split_profile_tags([tag for tag, weight in weighted_tags])
+            indexed = [(tag, weight) for tag, weight in weighted_tags if tag not in missing]
+            index = get_tag_index()
+
+            def rank_indexed():
+                ranked = index.artists_for_tags(indexed, limit=5 * len(weighted_tags))
+                refresh_tags(stale)
+                return search_artists(profile_group, [artist for artist, score in ranked])
+
+            if index is not None and indexed:
+                tag_stages.append(profile_group.submit(rank_indexed))
+            tag_stages.extend(
+                profile_group.submit(lambda tag: search_artists(profile_group, get_artists_by_tag(tag, limit=5)), tag)
+                for tag in missing
+            )
+
+        # Start the seed artist stage so it overlaps with the tag stage
+        seed_search = similar_stage = None
+        if seed_artist and seed_artist.strip():
+            seed_artist = seed_artist.strip()
+            seed_search = seed_group.submit(search_artist_top_tracks_spotify, seed_artist, token, 5)
+            similar_stage = seed_group.submit(
+                lambda: search_artists(seed_group, get_related_artists(seed_artist, limit=max(5, variety), variety=variety))
+            )
+
+        # Part 1: Get tracks based on profile tags
+        if tag_stages:
+            searches = (search for stage in tag_stages for search in stage.result())
+            yield from consume((search.result() for search in searches), profile_tracks_target)
+        profile_group.cancel()
+
+        # Part 2: Get tracks based on seed artist and similar artists
+        if seed_search is not None:
+            yield from add_tracks(seed_search.result(), limit)
+            if len(collected_tracks) < limit:
+                yield from consume((search.result() for search in similar_stage.result()), limit)
+        seed_group.cancel()
 
     # Fallback: If we still don't have enough tracks, use genre search
     if len(collected_tracks) < limit:
+        tracing.count('profile_playlist.genre_fallback')
         # Try to get genres from profile or use defaults
         fallback_genres = []
         if profile and profile.get('genres'):
@@ -367,35 +711,12 @@ def generate_playlist_from_profile_and_artist(profile, seed_artist, token, varie
         if not fallback_genres:
             fallback_genres = ['rock', 'pop', 'indie']
 
-        for genre in fallback_genres:
-            if len(collected_tracks) >= limit:
-                break
-
-            genre_tracks = search_by_genre_spotify(genre, token, limit=10)
-            for track in genre_tracks:
-                if track and track.get('uri') and track.get('uri') not in seen_uris:
-                    collected_tracks.append(track)
-                    seen_uris.add(track['uri'])
-                    if len(collected_tracks) >= limit:
-                        break
+        yield from consume(
+            bounded_map(lambda genre: search_by_genre_spotify(genre, token, limit=10), fallback_genres, budget), limit
+        )
 
     # Final fallback: Search by profile tags as keywords
     if len(collected_tracks) < limit and profile and profile.get('top_tags'):
-        for tag, count in profile['top_tags'][:10]:
-            if len(collected_tracks) >= limit:
-                break
-
-            # Search tracks directly by tag name
-            genre_tracks = search_by_genre_spotify(tag, token, limit=5)
-            for track in genre_tracks:
-                if track and track.get('uri') and track.get('uri') not in seen_uris:
-                    collected_tracks.append(track)
-                    seen_uris.add(track['uri'])
-                    if len(collected_tracks) >= limit:
-                        break
-
-    # Shuffle to mix profile and seed artist tracks
-    import random
-    random.shuffle(collected_tracks)
-
-    return collected_tracks[:limit]
+        tracing.count('profile_playlist.tag_keyword_fallback')
+        tags = [tag for tag, count in profile['top_tags'][:10]]
+        yield from consume(bounded_map(lambda tag: search_by_genre_spotify(tag, token, limit=5), tags, budget), limit)
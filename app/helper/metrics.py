@@ -0,0 +1,391 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask import current_app, has_app_context
+
+from app.helper.cache import pid_alive, thread_connection
+from app.helper.concurrency import app_extension
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name: (type, help) of every exported metric, in output order
+METRICS = {
+    'marcify_http_request_duration_seconds': (
+        'histogram', 'Time to serve a request, by route, method and status.'),
+    'marcify_route_outbound_calls_total': (
+        'counter', 'Outbound API calls (including cache hits) made while serving a route.'),
+    'marcify_route_outbound_seconds_total': (
+        'counter', 'Summed outbound API call time while serving a route.'),
+    'marcify_outbound_requests_total': (
+        'counter', 'Outbound API calls by API, endpoint, calling helper function and result '
+                   '(HTTP status, error or cache_hit).'),
+    'marcify_outbound_request_duration_seconds': (
+        'histogram', 'Outbound API call time (including rate limit waits and retries) by API, endpoint and '
+                     'calling helper function, cache hits excluded.'),
+    'marcify_cache_requests_total': (
+        'counter', 'Cache lookups by cache, namespace and result.'),
+    'marcify_token_refresh_total': (
+        'counter', 'Spotify token refreshes by result (success, invalid_grant, transient).'),
+    'marcify_tracks_requested_total': (
+        'counter', 'Tracks requested from playlist generation, by kind.'),
+    'marcify_tracks_returned_total': (
+        'counter', 'Tracks returned by playlist generation, by kind.'),
+    'marcify_short_results_total': (
+        'counter', 'Playlist generations that returned fewer tracks than requested, by kind.'),
+    'marcify_events_total': (
+        'counter', 'Fallback paths and other notable events, by event.'),
+    'marcify_warmup_running': (
+        'gauge', 'Worker processes currently warming the caches.'),
+    'marcify_warmup_steps': (
+        'gauge', 'Steps of the latest cache warm-up per worker, added up, by state (done, failed, total).'),
+}
+
+# Samples of exited processes are added up under this process name
+RETIRED = 'retired'
+
+
+def _series_key(name, labels):
+    # Canonical JSON of the label pairs; 'le' stays last for histogram buckets
+    return name, json.dumps(list(labels.items()) if labels else [])
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms shared by all worker processes of the app.
+
+    Each process counts in memory and a background thread writes its totals
+    to a local SQLite file every flush_interval seconds (and at exit). A
+    scrape adds up the totals of all processes, so /metrics answers the same
+    whichever worker serves it, at most flush_interval seconds behind.
+
+    Collectors are called before each flush and return (name, labels, value)
+    totals that live elsewhere in the process (e.g. in-memory cache stats),
+    counted since the process started or forked; shared collectors are
+    called on scrape for totals that are already shared between workers
+    (e.g. the SQLite cache's own counters).
+
+    Every flush also records that the process is alive. On scrape, processes
+    that exited (or have not flushed for process_ttl seconds) are retired:
+    their counters are added to one 'retired' row per series, so totals
+    never go down, and their gauges are dropped.
+    """
+
+    def __init__(self, path, flush_interval=5, collectors=(), shared_collectors=(), process_ttl=3600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.process_ttl = process_ttl
+        self.collectors = list(collectors)
+        self.shared_collectors = list(shared_collectors)
+        self._local = threading.local()
+        self._locks = {}
+        self._pid = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS samples ("
+            " process TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL,"
+            " value REAL NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (process, name, labels))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS processes ("
+            " process TEXT PRIMARY KEY, host TEXT NOT NULL, pid INTEGER NOT NULL, seen_at REAL NOT NULL)"
+        )
+        atexit.register(self._flush_at_exit)
+
+    @property
+    def _lock(self):
+        # One lock per process, created on first use: a lock some thread
+        # held at a fork would stay locked in the child
+        pid = os.getpid()
+        lock = self._locks.get(pid)
+        if lock is None:
+            lock = self._locks.setdefault(pid, threading.Lock())
+        return lock
+
+    def _connect(self):
+        return thread_connection(self._local, self.path)
+
+    def _process_state(self):
+        # Called with the lock held. Counts must not be inherited across a
+        # fork, or the parent's totals would be added twice.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            # pids are reused after restarts, so the name is made unique
+            self._process = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+            self._values = {}
+            self._dirty = set()
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _collect_process(self):
+        collected = []
+        for collector in self.collectors:
+            try:
+                collected.extend(collector())
+            except Exception as exc:
+                logger.warning("Metrics collector failed: %s", exc)
+        return collected
+
+    def _add(self, key, amount):
+        self._values[key] = self._values.get(key, 0) + amount
+        self._dirty.add(key)
+
+    def inc(self, name, labels=None, amount=1):
+        with self._lock:
+            self._process_state()
+            self._add(_series_key(name, labels), amount)
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        """Add a histogram observation."""
+        labels = dict(labels or {})
+        with self._lock:
+            self._process_state()
+            for bound in (*buckets, float('inf')):
+                if value <= bound:
+                    self._add(_series_key(f"{name}_bucket", {**labels, 'le': _format_value(bound)}), 1)
+            self._add(_series_key(f"{name}_sum", labels), value)
+            self._add(_series_key(f"{name}_count", labels), 1)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _flush_at_exit(self):
+        if self._pid == os.getpid():
+            self.flush()
+
+    def flush(self):
+        """Write this process's changed totals to the shared file."""
+        collected = self._collect_process()
+        with self._lock:
+            self._process_state()
+            for name, labels, value in collected:
+                key = _series_key(name, labels)
+                if self._values.get(key) != value:
+                    self._values[key] = value
+                    self._dirty.add(key)
+            now = time.time()
+            process = self._process
+            rows = [(process, name, labels, self._values[(name, labels)], now)
+                    for name, labels in self._dirty]
+            self._dirty = set()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO processes (process, host, pid, seen_at) VALUES (?, ?, ?, ?)",
+                (process, socket.gethostname(), os.getpid(), now)
+            )
+            if rows:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO samples (process, name, labels, value, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+        except sqlite3.Error as exc:
+            logger.warning("Metrics flush failed: %s", exc)
+            with self._lock:
+                self._dirty.update((name, labels) for _, name, labels, _, _ in rows)
+
+    def _retire(self, conn):
+        """
+        Fold the samples of processes that are gone into the 'retired' rows.
+        """
+        now = time.time()
+        host = socket.gethostname()
+        gone = [process for process, process_host, pid, seen_at
+                in conn.execute("SELECT process, host, pid, seen_at FROM processes").fetchall()
+                if now - seen_at > self.process_ttl or (process_host == host and not pid_alive(pid))]
+        if not gone:
+            return
+        marks = ','.join('?' * len(gone))
+        gauges = [name for name, (kind, _) in METRICS.items() if kind == 'gauge']
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"INSERT INTO samples (process, name, labels, value, updated_at) "
+                f"SELECT ?, name, labels, SUM(value), ? FROM samples "
+                f"WHERE process IN ({marks}) AND name NOT IN ({','.join('?' * len(gauges))}) "
+                f"GROUP BY name, labels "
+                f"ON CONFLICT (process, name, labels) DO UPDATE SET value = value + excluded.value, "
+                f"updated_at = excluded.updated_at",
+                (RETIRED, now, *gone, *gauges)
+            )
+            conn.execute(f"DELETE FROM samples WHERE process IN ({marks})", gone)
+            conn.execute(f"DELETE FROM processes WHERE process IN ({marks})", gone)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def collect(self):
+        """
+        Return {(name, labels json): value} summed over all processes.
+        """
+        self.flush()
+        try:
+            self._retire(self._connect())
+        except sqlite3.Error as exc:
+            logger.warning("Retiring metrics of exited processes failed: %s", exc)
+        try:
+            rows = self._connect().execute(
+                "SELECT name, labels, SUM(value) FROM samples GROUP BY name, labels"
+            ).fetchall()
+        except sqlite3.Error:
+            rows = []
+        samples = {(name, labels): value for name, labels, value in rows}
+        for collector in self.shared_collectors:
+            try:
+                for name, labels, value in collector():
+                    samples[_series_key(name, labels)] = value
+            except Exception as exc:
+                logger.warning("Metrics collector failed: %s", exc)
+        return samples
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        by_metric = {}
+        for (name, labels), value in self.collect().items():
+            base = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                    base = name[:-len(suffix)]
+            by_metric.setdefault(base, []).append((name, json.loads(labels), value))
+
+        def sort_key(sample):
+            name, pairs, _ = sample
+            le = [float(value) for key, value in pairs if key == 'le']
+            return [pair for pair in pairs if pair[0] != 'le'], name, le
+
+        lines = []
+        for base, (kind, description) in METRICS.items():
+            lines.append(f"# HELP {base} {description}")
+            lines.append(f"# TYPE {base} {kind}")
+            for name, pairs, value in sorted(by_metric.get(base, []), key=sort_key):
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in pairs)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if pairs
+                             else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _search_cache_samples(app):
+    def collect():
+        cache = app.extensions.get('spotify_search_cache')
+        if cache is None:
+            return []
+        stats = cache.stats()
+        return [('marcify_cache_requests_total', {'cache': 'spotify_search', 'namespace': 'search', 'result': result},
+                 stats[field]) for result, field in (('hit', 'hits'), ('miss', 'misses'), ('coalesced', 'coalesced'))]
+    return collect
+
+
+def _lastfm_cache_samples(app):
+    def collect():
+        cache = app.extensions.get('lastfm_cache')
+        if cache is None:
+            return []
+        return [('marcify_cache_requests_total', {'cache': 'lastfm', 'namespace': namespace, 'result': result},
+                 counts[field])
+                for namespace, counts in cache.stats().items()
+                for result, field in (('hit', 'hits'), ('miss', 'misses'))]
+    return collect
+
+
+def _warmup_samples(app):
+    def collect():
+        status = app.extensions.get('warmup_status')
+        if status is None:
+            return []
+        return [('marcify_warmup_running', None, int(status['state'] == 'running'))] + [
+            ('marcify_warmup_steps', {'state': state}, status[state]) for state in ('done', 'failed', 'total')]
+    return collect
+
+
+def get_metrics():
+    """
+    Return the app's metrics registry, or None if disabled or outside the app.
+    """
+    if not has_app_context() or not current_app.config.get('METRICS_ENABLED'):
+        return None
+    def create():
+        app = current_app._get_current_object()
+        return MetricsRegistry(
+            app.config['METRICS_PATH'],
+            flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 5),
+            process_ttl=app.config.get('METRICS_PROCESS_TTL', 3600),
+            collectors=[_search_cache_samples(app), _warmup_samples(app)],
+            shared_collectors=[_lastfm_cache_samples(app)]
+        )
+    return app_extension('metrics', create)
+
+
+def inc(name, labels=None, amount=1):
+    registry = get_metrics()
+    if registry is not None:
+        registry.inc(name, labels, amount)
+
+
+def observe(name, labels, value):
+    registry = get_metrics()
+    if registry is not None:
+        registry.observe(name, labels, value)
+
+
+def record_call(api, endpoint, seconds, status=None, cache=None, error=None, helper='other'):
+    """Count one outbound call (or cache hit) made by the helper function `helper`."""
+    registry = get_metrics()
+    if registry is None:
+        return
+    labels = {'api': api, 'endpoint': endpoint, 'helper': helper}
+    if cache == 'hit':
+        result = 'cache_hit'
+    else:
+        result = error or str(status)
+        registry.observe('marcify_outbound_request_duration_seconds', labels, seconds)
+    registry.inc('marcify_outbound_requests_total', {**labels, 'result': result})
+
+
+def record_request(route, method, status, seconds, apis):
+    """Record a served request and the outbound calls it made per API."""
+    registry = get_metrics()
+    if registry is None:
+        return
+    registry.observe('marcify_http_request_duration_seconds',
+                     {'route': route, 'method': method, 'status': str(status)}, seconds)
+    for api, totals in apis.items():
+        registry.inc('marcify_route_outbound_calls_total', {'route': route, 'api': api}, totals['calls'])
+        registry.inc('marcify_route_outbound_seconds_total', {'route': route, 'api': api}, totals['seconds'])
+
+
+def record_tracks(kind, requested, returned):
+    """Count tracks requested from and returned by playlist generation."""
+    registry = get_metrics()
+    if registry is None:
+        return
+    registry.inc('marcify_tracks_requested_total', {'kind': kind}, requested)
+    registry.inc('marcify_tracks_returned_total', {'kind': kind}, returned)
+    if returned < requested:
+        registry.inc('marcify_short_results_total', {'kind': kind})
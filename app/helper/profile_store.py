@@ -0,0 +1,81 @@
+from flask import current_app
+
+from app.helper.cache import MemoryCache, SQLiteCache
+from app.helper.concurrency import app_extension
+
+
+# Bump when the stored profile format changes; older entries are ignored
+PROFILE_VERSION = 1
+
+
+def top_tracks_source(time_range):
+    return f"top_tracks:{time_range}"
+
+
+def playlist_source(playlist_id):
+    return f"playlist:{playlist_id}"
+
+
+def analysis_source(source):
+    """Source under which the resumable analysis state of a source is kept."""
+    return f"analysis:{source}"
+
+
+class MemoryProfileStore:
+    """
+    In-process LRU profile store. Only visible to the worker that wrote it.
+    """
+
+    def __init__(self, ttl, max_bytes=16 * 1024 * 1024):
+        self.ttl = ttl
+        self.cache = MemoryCache(max_bytes=max_bytes, default_ttl=ttl)
+
+    def get(self, user_id, source):
+        return _unwrap(self.cache.get((user_id, source)))
+
+    def put(self, user_id, source, profile):
+        self.cache.set((user_id, source), _wrap(profile), self.ttl)
+
+
+class SQLiteProfileStore:
+    """
+    Profile store in a local SQLite file, shared by all workers and kept
+    across restarts.
+    """
+
+    def __init__(self, path, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.cache = SQLiteCache(path, max_entries=max_entries)
+
+    def get(self, user_id, source):
+        return _unwrap(self.cache.get(user_id, source))
+
+    def put(self, user_id, source, profile):
+        self.cache.set(user_id, source, _wrap(profile), self.ttl)
+
+
+def _wrap(profile):
+    return {'version': PROFILE_VERSION, 'profile': profile}
+
+
+def _unwrap(entry):
+    if not entry or entry.get('version') != PROFILE_VERSION:
+        return None
+    return entry['profile']
+
+
+def get_profile_store():
+    """
+    Return the app's profile store, selected by the PROFILE_STORE setting
+    ('sqlite' or 'memory').
+    """
+    def create():
+        ttl = current_app.config.get('PROFILE_TTL', 24 * 3600)
+        if current_app.config.get('PROFILE_STORE') == 'memory':
+            return MemoryProfileStore(ttl)
+        return SQLiteProfileStore(
+            current_app.config['PROFILE_STORE_PATH'],
+            ttl,
+            max_entries=current_app.config.get('PROFILE_STORE_MAX_ENTRIES', 10000)
+        )
+    return app_extension('profile_store', create)
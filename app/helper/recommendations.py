@@ -1,36 +1,69 @@
-import requests
 import random
 from flask import current_app
 
+from app.helper import tracing
+from app.helper.artist_graph import expand_neighborhood, get_artist_graph, personalized_pagerank
+from app.helper.concurrency import bounded_map, run_concurrently
+from app.helper.lastfm_api import lastfm_get
+from app.helper.spotify_api import search_tracks
+from app.helper.track_resolver import resolve_tracks
+
+
+def fetch_similar_artists_lastfm(artist_name):
+    """
+    Look up similar artists on Last.fm and add them to the artist graph.
+    Returns list of (artist name, match weight), best match first.
+    """
+    neighbors = []
+    try:
+        limit = current_app.config.get('ARTIST_GRAPH_FETCH_LIMIT', 30)
+        data = lastfm_get("artist.getsimilar", artist=artist_name, limit=limit)
+        if data and "similarartists" in data and "artist" in data["similarartists"]:
+            neighbors = [(artist["name"], float(artist.get("match") or 0))
+                         for artist in data["similarartists"]["artist"]]
+    except Exception:
+        return []
+
+    graph = get_artist_graph()
+    if graph is not None and neighbors:
+        graph.set_neighbors(artist_name, neighbors)
+    return neighbors
+
 
 def get_similar_artists_lastfm(artist_name, limit=10):
     """
-    Get similar artists from Last.fm API.
+    Get similar artists from the artist graph, asking Last.fm only for
+    artists that are not in the graph yet.
     Returns list of artist names.
     """
-    api_key = current_app.config.get('LASTFM_API_KEY')
-    if not api_key:
-        return []
+    graph = get_artist_graph()
+    neighbors = graph.neighbors(artist_name) if graph is not None else None
+    if neighbors is None:
+        neighbors = fetch_similar_artists_lastfm(artist_name)
+    return [name for name, weight in neighbors[:limit]]
 
-    url = "http://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "artist.getsimilar",
-        "artist": artist_name,
-        "api_key": api_key,
-        "format": "json",
-        "limit": limit
-    }
 
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "similarartists" in data and "artist" in data["similarartists"]:
-                return [artist["name"] for artist in data["similarartists"]["artist"]]
-    except Exception:
-        pass
+def get_related_artists(artist_name, limit=10, variety=5):
+    """
+    Get artists related to artist_name, best first.
 
-    return []
+    Low variety returns the direct Last.fm neighbours. Higher variety walks
+    further through the artist graph (up to 3 hops) and ranks everything it
+    reaches by personalized PageRank from the seed, so artists that many
+    similar artists point to come first. Known artists cost no API calls;
+    at most ARTIST_GRAPH_EXPAND_BUDGET unknown ones are looked up.
+    """
+    hops = 1 + (variety > 5) + (variety > 8)
+    if hops == 1 or get_artist_graph() is None:
+        return get_similar_artists_lastfm(artist_name, limit=limit)
+
+    adjacency = expand_neighborhood(
+        artist_name, hops, fetch_similar_artists_lastfm,
+        expand_budget=current_app.config.get('ARTIST_GRAPH_EXPAND_BUDGET', 5),
+        max_in_flight=current_app.config.get('LASTFM_MAX_IN_FLIGHT', 8)
+    )
+    ranked = personalized_pagerank(adjacency, artist_name)
+    return [name for name, score in ranked[:limit]]
 
 
 def get_artist_top_tracks_lastfm(artist_name, limit=5):
@@ -38,25 +71,10 @@ def get_artist_top_tracks_lastfm(artist_name, limit=5):
     Get top tracks for an artist from Last.fm API.
     Returns list of track names.
     """
-    api_key = current_app.config.get('LASTFM_API_KEY')
-    if not api_key:
-        return []
-
-    url = "http://ws.audioscrobbler.com/2.0/"
-    params = {
-        "method": "artist.gettoptracks",
-        "artist": artist_name,
-        "api_key": api_key,
-        "format": "json",
-        "limit": limit
-    }
-
     try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "toptracks" in data and "track" in data["toptracks"]:
-                return [(track["name"], artist_name) for track in data["toptracks"]["track"]]
+        data = lastfm_get("artist.gettoptracks", artist=artist_name, limit=limit)
+        if data and "toptracks" in data and "track" in data["toptracks"]:
+            return [(track["name"], artist_name) for track in data["toptracks"]["track"]]
     except Exception:
         pass
 
@@ -65,32 +83,30 @@ def get_artist_top_tracks_lastfm(artist_name, limit=5):
 
 def search_track_on_spotify(track_name, artist_name, token):
     """
-    Search for a track on Spotify and return track info if found.
+    Find a track on Spotify and return its TrackRecord if found.
+    Use resolve_tracks to resolve many tracks at once.
     """
-    query = f'track:"{track_name}" artist:"{artist_name}"'
-    url = f"https://api.spotify.com/v1/search"
-    params = {
-        "q": query,
-        "type": "track",
-        "limit": 1,
-        "market": "DE"
-    }
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
-
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if data["tracks"]["items"]:
-                return data["tracks"]["items"][0]
+        return resolve_tracks([(track_name, artist_name)], token)[0]
     except Exception:
         pass
 
     return None
 
 
+def resolve_artist_top_tracks_lastfm(artist_name, token, limit=5):
+    """
+    Get an artist's Last.fm top tracks as Spotify TrackRecords, resolved in
+    bulk. Tracks without a Spotify match are left out.
+    """
+    try:
+        return [track for track in resolve_tracks(get_artist_top_tracks_lastfm(artist_name, limit), token) if track]
+    except Exception:
+        pass
+
+    return []
+
+
 def search_artist_top_tracks_spotify(artist_name, token, limit=3):
     """
     Get top tracks for an artist via Spotify search.
@@ -100,28 +116,16 @@ def search_artist_top_tracks_spotify(artist_name, token, limit=3):
     # Enforce the new max limit of 10
     limit = min(limit, 10)
 
-    url = "https://api.spotify.com/v1/search"
-    params = {
-        "q": f'artist:"{artist_name}"',
-        "type": "track",
-        "limit": limit,
-        "market": "DE"
-    }
-    headers = {"Authorization": f"Bearer {token}"}
-
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code != 200:
+        tracks = search_tracks(f'artist:"{artist_name}"', limit, token)
+        if not tracks:
             return []
 
-        data = response.json()
-        tracks = data.get("tracks", {}).get("items", [])
-
         # Filter to only include tracks actually by this artist
         artist_lower = artist_name.lower()
         filtered = [
             t for t in tracks
-            if any(artist_lower in a["name"].lower() for a in t.get("artists", []))
+            if any(artist_lower in a.lower() for a in t.artists)
         ]
 
         # Fall back to unfiltered if strict match returns nothing
@@ -139,20 +143,9 @@ def search_by_genre_spotify(genre, token, limit=10):
     Note: max limit is 10 in Dev Mode since Feb 2026.
     """
     limit = min(limit, 10)  # Enforce new Dev Mode limit
-    url = "https://api.spotify.com/v1/search"
-    params = {
-        "q": f'genre:"{genre}"',
-        "type": "track",
-        "limit": limit,
-        "market": "DE"
-    }
-    headers = {"Authorization": f"Bearer {token}"}
-
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return data["tracks"]["items"]
+        # A new list each call, callers shuffle it
+        return search_tracks(f'genre:"{genre}"', limit, token) or []
     except Exception:
         pass
 
@@ -172,6 +165,21 @@ def gen_recommendations(payload, token, seed_artist_id):
     - discovery (formerly energy): Mix of seed artist vs similar artists (1-10)
     """
     track_count = int(payload.get('track-count', 10))
+    collected_tracks = list(iter_recommendations(payload, token))
+
+    # Shuffle to mix seed artist and similar artist tracks
+    random.shuffle(collected_tracks)
+
+    return collected_tracks[:track_count]
+
+
+def iter_recommendations(payload, token):
+    """
+    Yield recommended tracks as soon as each one is found and deduplicated
+    (see gen_recommendations for the payload). Tracks come in collection
+    order: seed artist first, then similar artists, then genre fallback.
+    """
+    track_count = int(payload.get('track-count', 10))
     variety = int(payload.get('variety', payload.get('danceability', 5)))
     discovery = int(payload.get('discovery', payload.get('energy', 5)))
     seed_genre = payload.get('seed-genre', 'rock')
@@ -192,57 +200,67 @@ def gen_recommendations(payload, token, seed_artist_id):
     seed_artist_tracks_target = max(1, int(track_count * seed_artist_track_ratio))
     similar_artist_tracks_target = track_count - seed_artist_tracks_target
 
+    # Seed artist search and similar artist lookup are independent, run them together
+    seed_tracks, similar_artists = run_concurrently(
+        lambda: search_artist_top_tracks_spotify(seed_artist_name, token, limit=seed_artist_tracks_target + 3),
+        lambda: get_related_artists(seed_artist_name, limit=num_similar_artists, variety=variety)
+    )
+
     # Get tracks from seed artist via Spotify
-    seed_tracks = search_artist_top_tracks_spotify(seed_artist_name, token, limit=seed_artist_tracks_target + 3)
     for track in seed_tracks:
-        if track and track.get('uri') not in seen_uris:
+        if track and track.uri not in seen_uris:
             collected_tracks.append(track)
-            seen_uris.add(track['uri'])
-            if len([t for t in collected_tracks if any(a['name'].lower() == seed_artist_name.lower() for a in t.get('artists', []))]) >= seed_artist_tracks_target:
+            seen_uris.add(track.uri)
+            yield track
+            if len([t for t in collected_tracks if any(a.lower() == seed_artist_name.lower() for a in t.artists)]) >= seed_artist_tracks_target:
                 break
 
-    # Get similar artists from Last.fm
-    similar_artists = get_similar_artists_lastfm(seed_artist_name, limit=num_similar_artists)
-
     # If Last.fm didn't return results, try genre-based search as fallback
     if not similar_artists:
+        tracing.count('recommendations.no_similar_artists')
         genre_tracks = search_by_genre_spotify(seed_genre, token, limit=track_count * 2)
         random.shuffle(genre_tracks)
         for track in genre_tracks:
-            if track.get('uri') not in seen_uris:
+            if track.uri not in seen_uris:
                 collected_tracks.append(track)
-                seen_uris.add(track['uri'])
+                seen_uris.add(track.uri)
+                yield track
                 if len(collected_tracks) >= track_count:
                     break
     else:
         # Get tracks from similar artists
         tracks_per_artist = max(1, similar_artist_tracks_target // len(similar_artists)) + 1
 
-        for artist in similar_artists:
-            if len(collected_tracks) >= track_count:
-                break
-
-            # Try to get top tracks from Spotify for this artist
-            artist_tracks = search_artist_top_tracks_spotify(artist, token, limit=tracks_per_artist)
-
-            for track in artist_tracks:
-                if track and track.get('uri') not in seen_uris:
-                    collected_tracks.append(track)
-                    seen_uris.add(track['uri'])
-                    if len(collected_tracks) >= track_count:
-                        break
+        # Searches run concurrently but are consumed in artist order, so the
+        # result matches the sequential version. Closing the generator once
+        # enough tracks are collected cancels searches that have not started.
+        artist_searches = bounded_map(
+            lambda artist: search_artist_top_tracks_spotify(artist, token, limit=tracks_per_artist),
+            similar_artists,
+            current_app.config.get('SPOTIFY_MAX_IN_FLIGHT', 8)
+        )
+        try:
+            for artist_tracks in artist_searches:
+                for track in artist_tracks:
+                    if track and track.uri not in seen_uris:
+                        collected_tracks.append(track)
+                        seen_uris.add(track.uri)
+                        yield track
+                        if len(collected_tracks) >= track_count:
+                            break
+                if len(collected_tracks) >= track_count:
+                    break
+        finally:
+            artist_searches.close()
 
     # If we still don't have enough tracks, fill with genre search
     if len(collected_tracks) < track_count:
+        tracing.count('recommendations.genre_fill')
         genre_tracks = search_by_genre_spotify(seed_genre, token, limit=track_count)
         for track in genre_tracks:
-            if track.get('uri') not in seen_uris:
+            if track.uri not in seen_uris:
                 collected_tracks.append(track)
-                seen_uris.add(track['uri'])
+                seen_uris.add(track.uri)
+                yield track
                 if len(collected_tracks) >= track_count:
                     break
-
-    # Shuffle to mix seed artist and similar artist tracks
-    random.shuffle(collected_tracks)
-
-    return collected_tracks[:track_count]
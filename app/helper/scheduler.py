@@ -0,0 +1,293 @@
+import bisect
+import contextvars
+import hashlib
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_priority = contextvars.ContextVar('request_priority', default=PRIORITY_INTERACTIVE)
+
+class DeadlineExceeded(requests.Timeout):
+    """A call ran out of its total time budget (waits, attempts and backoff)."""
+
+
+# Idempotent requests are retried on these statuses, any other 5xx and
+# network errors. A gateway error or a dropped connection doesn't prove a
+# write was not applied, so other methods are only retried on 429 and on
+# errors before the request was sent (see _not_sent).
+RETRY_STATUSES = {429, 502, 503, 504}
+WRITE_RETRY_STATUSES = {429}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _not_sent(exc):
+    """True if the connection failed (refused, timed out) before sending."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', exc.args[0]) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+@contextmanager
+def priority(level):
+    """
+    Run outbound calls made in this block (and in pools it starts) at a given priority.
+    """
+    reset = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(reset)
+
+
+class TokenBucket:
+    """
+    Refills `rate` tokens per second up to `burst`.
+    pause() empties the bucket until a given time, e.g. after a 429.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def idle(self, now):
+        """True if the bucket is full again, so a new one would behave the same."""
+        return now >= self.paused_until and self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now, needed=1):
+        """Seconds until `needed` tokens (at most burst) are available."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until):
+        self.paused_until = max(self.paused_until, until)
+        self.tokens = 0
+
+
+class RequestScheduler:
+    """
+    Gate for all outbound API calls of a worker process.
+
+    Every call takes a token from its API's bucket and, if it carries an
+    access token, from that token's bucket. Each bucket serves its waiting
+    callers by priority, then in arrival order; a caller only queues behind
+    others on buckets that are short of tokens. Rate limited and
+    gateway error responses are retried with jittered exponential backoff;
+    a Retry-After header pauses the whole bucket so other callers back off
+    too instead of piling more 429s on top. All of it, waits included, must
+    fit into the call's deadline (seconds), else DeadlineExceeded is raised
+    or the last response returned.
+
+    Buckets of access tokens that have refilled are dropped every
+    sweep_interval seconds, so they don't pile up with every login.
+    """
+
+    def __init__(self, api_limits, token_limit, max_retries=3, max_delay=30, deadline=20, sweep_interval=60):
+        self.api_limits = api_limits
+        self.token_limit = token_limit
+        self.max_retries = max_retries
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.sweep_interval = sweep_interval
+        self._buckets = {}
+        self._queues = {}  # bucket key -> waiting entries, best first
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._swept = time.monotonic()
+        self._metrics = Counter()
+        self._metrics_lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if key.startswith("token:"):
+                rate, burst = self.token_limit
+            else:
+                rate, burst = self.api_limits.get(key, self.api_limits.get("default", (10, 20)))
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def _sweep(self, now):
+        # Called with the condition held
+        if now - self._swept < self.sweep_interval:
+            return
+        self._swept = now
+        for key in [key for key, bucket in self._buckets.items()
+                    if key.startswith("token:") and key not in self._queues and bucket.idle(now)]:
+            del self._buckets[key]
+
+    def _wait_time(self, entry, now):
+        """
+        Seconds until entry may take a token from each of its buckets, or
+        None if it has to wait for earlier callers to go first. Callers ahead
+        of it in a bucket's queue (by priority, then arrival) only hold it
+        back while that bucket has too few tokens for them and entry, so an
+        empty access token bucket doesn't stall other users of the API.
+        """
+        wait = 0.0
+        for key in entry[2]:
+            bucket = self._bucket(key)
+            needed = bisect.bisect_left(self._queues[key], entry) + 1
+            if needed > bucket.burst:
+                return None
+            wait = max(wait, bucket.wait_time(now, needed))
+        return wait
+
+    def acquire(self, keys, level=None, deadline=None):
+        """
+        Block until a request for the given bucket keys may be sent.
+        Returns the seconds spent waiting. Raises DeadlineExceeded if no
+        token is free before the monotonic time deadline.
+        """
+        level = _priority.get() if level is None else level
+        entry = (level, next(self._seq), frozenset(keys))
+        start = time.monotonic()
+        with self._cond:
+            for key in entry[2]:
+                bisect.insort(self._queues.setdefault(key, []), entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    timeout = self._wait_time(entry, now)
+                    if timeout is not None and timeout <= 0:
+                        for key in entry[2]:
+                            self._bucket(key).take(now)
+                        break
+                    if deadline is not None:
+                        if now + (timeout or 0) >= deadline:
+                            self._count("deadline_exceeded")
+                            raise DeadlineExceeded("No rate limit token before the call's deadline")
+                        timeout = min(timeout, deadline - now) if timeout is not None else deadline - now
+                    self._cond.wait(timeout)
+            finally:
+                for key in entry[2]:
+                    queue = self._queues[key]
+                    queue.remove(entry)
+                    if not queue:
+                        del self._queues[key]
+                self._sweep(time.monotonic())
+                self._cond.notify_all()
+        waited = time.monotonic() - start
+        self._count("wait_seconds", waited)
+        return waited
+
+    def _pause(self, keys, seconds):
+        with self._cond:
+            until = time.monotonic() + seconds
+            for key in keys:
+                self._bucket(key).pause(until)
+
+    def send(self, api, method, token, func, timeout=None):
+        """
+        Send a request through the scheduler. func(timeout) performs the
+        request with a timeout of at most `timeout` seconds, cut down to
+        what is left of the deadline.
+        Returns the final response or re-raises the final network error.
+        """
+        keys = {api}
+        if token:
+            keys.add("token:" + hashlib.sha1(token.encode()).hexdigest()[:16])
+        deadline = time.monotonic() + self.deadline
+
+        for attempt in range(self.max_retries + 1):
+            self.acquire(keys, deadline=deadline)
+            remaining = deadline - time.monotonic()
+            self._count(f"{api}.requests")
+            error = response = None
+            try:
+                response = func(min(timeout, remaining) if timeout else remaining)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if method not in IDEMPOTENT_METHODS and not _not_sent(exc):
+                    raise
+                error = exc
+
+            if response is not None:
+                status = response.status_code
+                if method in IDEMPOTENT_METHODS:
+                    retryable = status in RETRY_STATUSES or status >= 500
+                else:
+                    retryable = status in WRITE_RETRY_STATUSES
+                if not retryable:
+                    return response
+                self._count(f"{api}.status_{status}")
+            else:
+                self._count(f"{api}.network_errors")
+
+            delay = min(self.max_delay, 2 ** attempt * (0.5 + random.random()))
+            retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+            if retry_after.isdigit():
+                # Other callers back off too, even if this one gives up
+                delay = min(self.max_delay, int(retry_after))
+                logger.warning("%s rate limited, pausing for %ss", api, delay)
+                self._pause(keys, delay)
+
+            # Give up if out of attempts or if the retry could not finish in time
+            if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                self._count(f"{api}.gave_up")
+                logger.warning("%s %s call failed after %d attempts", api, method, attempt + 1)
+                if error is not None:
+                    raise error
+                return response
+
+            self._count(f"{api}.retries")
+            if not retry_after.isdigit():
+                time.sleep(delay)
+
+        return response
+
+    def stats(self):
+        """
+        Return counters: requests, retries, error statuses and gave_up per API,
+        plus total seconds spent waiting for rate limit tokens.
+        """
+        with self._metrics_lock:
+            stats = dict(self._metrics)
+        with self._cond:
+            stats["queued"] = len(set().union(*self._queues.values()))
+            stats["buckets"] = len(self._buckets)
+        return stats
+
+
+def api_name(url, config):
+    """
+    Map a request URL to the API it belongs to ('spotify', 'lastfm' or the host).
+    """
+    if url.startswith(config.get('LASTFM_API_URL') or "\0"):
+        return "lastfm"
+    host = urlparse(url).hostname or ""
+    if url.startswith(config.get('SPOTIFY_API_URL') or "\0") or host.endswith("spotify.com"):
+        return "spotify"
+    return host
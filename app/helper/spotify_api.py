@@ -0,0 +1,142 @@
+import logging
+import time
+
+from flask import current_app
+
+from app.helper import http_client, tracing
+from app.helper.cache import MemoryCache
+from app.helper.concurrency import app_extension
+from app.helper.tracks import TrackRecord, get_track_id_map, get_track_store
+
+logger = logging.getLogger(__name__)
+
+
+def get_search_cache():
+    """
+    Return the app's Spotify search cache, or None if disabled.
+    """
+    if not current_app.config.get('SPOTIFY_SEARCH_CACHE_ENABLED'):
+        return None
+    return app_extension('spotify_search_cache', lambda: MemoryCache(
+        max_bytes=current_app.config.get('SPOTIFY_SEARCH_CACHE_MAX_MB', 32) * 1024 * 1024,
+        default_ttl=current_app.config.get('SPOTIFY_SEARCH_CACHE_TTL', 3600)
+    ))
+
+
+def normalize_query(query):
+    """
+    Normalize a search query so trivially different spellings share a cache entry.
+    """
+    return " ".join(query.lower().split())
+
+
+def spotify_search(query, search_type, limit, token, market=None):
+    """
+    Run a Spotify search and return the parsed JSON response (uncached).
+    Returns None if the request failed.
+    """
+    market = market or current_app.config.get('SPOTIFY_MARKET', 'DE')
+    url = f"{current_app.config['SPOTIFY_API_URL']}/search"
+    params = {
+        "q": query,
+        "type": search_type,
+        "limit": limit,
+        "market": market
+    }
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        response = http_client.get(url, params=params, headers=headers)
+        if response.status_code == 200:
+            return response.json()
+        logger.warning("Spotify search returned HTTP %s", response.status_code)
+    except Exception as exc:
+        logger.warning("Spotify search failed: %s", exc)
+    return None
+
+
+def search_tracks(query, limit, token, market=None):
+    """
+    Search Spotify for tracks and return them as TrackRecords.
+    Returns None if the request failed.
+
+    Search results are not user-specific, so they are cached by normalized
+    query, limit and market, and concurrent identical searches share one
+    request. The cache only holds track ids; the records themselves live
+    once in the shared track store.
+    """
+    market = market or current_app.config.get('SPOTIFY_MARKET', 'DE')
+    store = get_track_store()
+
+    def load():
+        data = spotify_search(query, "track", limit, token, market)
+        if not data:
+            return None
+        items = data.get("tracks", {}).get("items", [])
+        records = [store.add(TrackRecord.from_spotify(track)) for track in items if track and track.get('uri')]
+        # Every search teaches the resolver some name -> id mappings
+        id_map = get_track_id_map()
+        if id_map is not None:
+            id_map.remember(records)
+        return [record.id for record in records]
+
+    cache = get_search_cache()
+    key = (normalize_query(query), "track", limit, market)
+    loaded = []
+
+    def load_and_mark():
+        loaded.append(True)
+        return load()
+
+    start = time.perf_counter()
+    track_ids = cache.get_or_load(key, load_and_mark) if cache is not None else load()
+    if cache is not None and not loaded:
+        # Served from the search cache (or by a concurrent identical search)
+        tracing.record_call('spotify', "GET /v1/search", time.perf_counter() - start, cache='hit')
+    if track_ids is None:
+        return None
+
+    records = store.get_many(track_ids)
+    if None in records:
+        # Some records were evicted from the store since the search was cached
+        track_ids = load()
+        if track_ids is None:
+            return None
+        if cache is not None:
+            cache.set(key, track_ids)
+        records = store.get_many(track_ids)
+    return [record for record in records if record is not None]
+
+
+# Most track ids the /tracks endpoint accepts per request
+MAX_IDS_PER_REQUEST = 50
+
+
+def get_tracks(track_ids, token, market=None):
+    """
+    Look up tracks by Spotify id, MAX_IDS_PER_REQUEST ids per request.
+    Tracks already in the track store are not fetched again.
+    Returns {track id: TrackRecord} for every id that was found.
+    """
+    market = market or current_app.config.get('SPOTIFY_MARKET', 'DE')
+    store = get_track_store()
+    track_ids = list(dict.fromkeys(track_ids))
+    found = {record.id: record for record in store.get_many(track_ids) if record is not None}
+    missing = [track_id for track_id in track_ids if track_id not in found]
+
+    url = f"{current_app.config['SPOTIFY_API_URL']}/tracks"
+    headers = {"Authorization": f"Bearer {token}"}
+    for start in range(0, len(missing), MAX_IDS_PER_REQUEST):
+        chunk = missing[start:start + MAX_IDS_PER_REQUEST]
+        try:
+            response = http_client.get(url, params={"ids": ",".join(chunk), "market": market}, headers=headers)
+            if response.status_code != 200:
+                logger.warning("Spotify track lookup returned HTTP %s", response.status_code)
+                continue
+            for track in response.json().get("tracks", []):
+                # Unknown ids come back as null
+                if track and track.get('uri'):
+                    record = store.add(TrackRecord.from_spotify(track))
+                    found[record.id] = record
+        except Exception as exc:
+            logger.warning("Spotify track lookup failed: %s", exc)
+    return found
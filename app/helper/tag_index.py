@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from app.helper.artist_graph import artist_key
+from app.helper.cache import thread_connection
+from app.helper.concurrency import app_extension
+
+
+# Where a posting came from: a tag's top artists or an artist's top tags
+SOURCE_TAG = 'tag'
+SOURCE_ARTIST = 'artist'
+
+
+class TagIndex:
+    """
+    Inverted index between Last.fm tags and artists in a local SQLite file
+    shared by all workers.
+
+    Postings (tag, artist, weight) are filled from tag.gettopartists
+    (tag -> artists) and artist.gettoptags (artist -> tags) lookups, so the
+    same table answers both directions. Each tag or artist is refreshed as a
+    whole and counts as fresh for ttl seconds.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " tag TEXT NOT NULL, artist_key TEXT NOT NULL, artist TEXT NOT NULL,"
+            " weight REAL NOT NULL, source TEXT NOT NULL,"
+            " PRIMARY KEY (tag, artist_key, source))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_artist ON postings (artist_key)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS refreshed ("
+            " source TEXT NOT NULL, key TEXT NOT NULL, refreshed_at REAL NOT NULL,"
+            " PRIMARY KEY (source, key))"
+        )
+
+    def _connect(self):
+        return thread_connection(self._local, self.path)
+
+    def fresh(self, source, keys):
+        """
+        Return the subset of keys (tags or artist keys) refreshed from source
+        within the TTL.
+        """
+        keys = list(keys)
+        if not keys:
+            return set()
+        try:
+            rows = self._connect().execute(
+                f"SELECT key FROM refreshed WHERE source = ? AND key IN ({','.join('?' * len(keys))})"
+                f" AND refreshed_at > ?",
+                (source, *keys, time.time() - self.ttl)
+            )
+            return {key for key, in rows}
+        except sqlite3.Error:
+            return set()
+
+    def known(self, source, keys):
+        """
+        Return the subset of keys that were ever indexed from source, fresh
+        or not.
+        """
+        keys = list(keys)
+        if not keys:
+            return set()
+        try:
+            rows = self._connect().execute(
+                f"SELECT key FROM refreshed WHERE source = ? AND key IN ({','.join('?' * len(keys))})",
+                (source, *keys)
+            )
+            return {key for key, in rows}
+        except sqlite3.Error:
+            return set()
+
+    def _replace(self, source, key, delete_column, postings):
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(f"DELETE FROM postings WHERE source = ? AND {delete_column} = ?", (source, key))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO postings (tag, artist_key, artist, weight, source) VALUES (?, ?, ?, ?, ?)",
+                    [(tag, artist_key(artist), artist, weight, source) for tag, artist, weight in postings]
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO refreshed (source, key, refreshed_at) VALUES (?, ?, ?)",
+                    (source, key, time.time())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            pass
+
+    def set_tag_artists(self, tag, artists):
+        """Replace the top (artist, weight) list of a tag."""
+        self._replace(SOURCE_TAG, tag, 'tag', [(tag, artist, weight) for artist, weight in artists])
+
+    def set_artist_tags(self, artist, tags):
+        """Replace the top (tag, weight) list of an artist."""
+        self._replace(SOURCE_ARTIST, artist_key(artist), 'artist_key',
+                      [(tag, artist, weight) for tag, weight in tags])
+
+    def artist_tags(self, artist, limit=10):
+        """
+        Return the artist's top tags, or None if they are not fresh.
+        """
+        key = artist_key(artist)
+        if key not in self.fresh(SOURCE_ARTIST, [key]):
+            return None
+        try:
+            rows = self._connect().execute(
+                "SELECT tag FROM postings WHERE source = ? AND artist_key = ? ORDER BY weight DESC, tag LIMIT ?",
+                (SOURCE_ARTIST, key, limit)
+            )
+            return [tag for tag, in rows]
+        except sqlite3.Error:
+            return None
+
+    def artists_for_tags(self, weighted_tags, limit=25, match_all=False):
+        """
+        Score artists against (tag, weight) pairs in a single query: the sum
+        over matching tags of tag weight * posting weight (a weighted union).
+        With match_all only artists carrying every tag are returned
+        (intersection). Returns [(artist, score), ...] best first.
+
+        The two sources weigh on different scales (rank in a tag's top list,
+        Last.fm count in an artist's top tags), so posting weights are
+        scaled to [0, 1] per tag and source before they are combined.
+        """
+        weighted_tags = [(tag, weight) for tag, weight in weighted_tags if weight > 0]
+        if not weighted_tags:
+            return []
+        values = ",".join("(?, ?)" for _ in weighted_tags)
+        having = "HAVING COUNT(*) = ?" if match_all else ""
+        params = [value for pair in weighted_tags for value in pair]
+        if match_all:
+            params.append(len(weighted_tags))
+        try:
+            rows = self._connect().execute(
+                f"WITH query(tag, weight) AS (VALUES {values}), "
+                # A tag/artist pair may be known from both directions, count it once
+                f"scaled AS (SELECT tag, artist_key, artist,"
+                f" weight / NULLIF(MAX(weight) OVER (PARTITION BY tag, source), 0) AS weight"
+                f" FROM postings WHERE tag IN (SELECT tag FROM query)), "
+                f"best AS (SELECT tag, artist_key, MAX(artist) AS artist, MAX(weight) AS weight"
+                f" FROM scaled GROUP BY tag, artist_key) "
+                f"SELECT MAX(best.artist), SUM(best.weight * query.weight) AS score "
+                f"FROM best JOIN query ON query.tag = best.tag "
+                f"GROUP BY best.artist_key {having} ORDER BY score DESC, best.artist_key LIMIT ?",
+                (*params, limit)
+            )
+            return [(artist, score) for artist, score in rows]
+        except sqlite3.Error:
+            return []
+
+    def stats(self):
+        try:
+            conn = self._connect()
+            return {
+                'postings': conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0],
+                'tags': conn.execute("SELECT COUNT(DISTINCT tag) FROM postings").fetchone()[0],
+                'artists': conn.execute("SELECT COUNT(DISTINCT artist_key) FROM postings").fetchone()[0]
+            }
+        except sqlite3.Error:
+            return {}
+
+
+def get_tag_index():
+    """
+    Return the app's tag/artist index, or None if disabled.
+    """
+    if not current_app.config.get('TAG_INDEX_ENABLED'):
+        return None
+    return app_extension('tag_index', lambda: TagIndex(
+        current_app.config['TAG_INDEX_PATH'],
+        ttl=current_app.config.get('TAG_INDEX_TTL', 7 * 24 * 3600)
+    ))
@@ -0,0 +1,217 @@
+import contextvars
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+from flask import g, request
+
+from app.helper import metrics
+
+_trace = contextvars.ContextVar('request_trace', default=None)
+
+# Path segments that are ids, e.g. /playlists/<id>/items
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[A-Za-z0-9]{16,}$|^\d+$")
+# Path segments followed by an id or user name
+_ID_PARENTS = {'users', 'playlists', 'artists', 'albums', 'tracks'}
+# Modules that pass outbound calls on; calls are attributed to their caller
+_PLUMBING = {'app.helper.tracing', 'app.helper.http_client', 'app.helper.scheduler', 'app.helper.concurrency',
+             'app.helper.cache'}
+# Generic API wrappers, only named if no other app function is on the stack
+_WRAPPERS = {'app.helper.lastfm_api', 'app.helper.spotify_api'}
+
+
+class RequestTrace:
+    """
+    Outbound calls and fallback counters of one request. Calls may be
+    recorded from worker threads, since pools copy the request's context.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.calls = []
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def add_call(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def breakdown(self):
+        """
+        Return {api: {'calls', 'cached', 'errors', 'bytes', 'seconds'}}.
+        seconds is the summed call time; concurrent calls overlap, so it can
+        exceed the request's wall time.
+        """
+        with self._lock:
+            calls = list(self.calls)
+        apis = {}
+        for call in calls:
+            entry = apis.setdefault(call['api'], {'calls': 0, 'cached': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0})
+            entry['calls'] += 1
+            entry['cached'] += call['cache'] == 'hit'
+            entry['errors'] += bool(call['error']) or (call['status'] or 0) >= 400
+            entry['bytes'] += call['bytes']
+            entry['seconds'] += call['seconds']
+        return apis
+
+    def to_dict(self):
+        with self._lock:
+            calls = list(self.calls)
+            counters = dict(self.counters)
+        return {
+            'seconds': round(time.perf_counter() - self.start, 4),
+            'apis': self.breakdown(),
+            'counters': counters,
+            'calls': calls
+        }
+
+
+def current_trace():
+    return _trace.get()
+
+
+def endpoint_name(api, method, url, params=None):
+    """
+    Short endpoint label: the Last.fm method, or the URL path with ids
+    replaced, e.g. 'GET /v1/playlists/{id}/items'.
+    """
+    if api == 'lastfm' and params and params.get('method'):
+        return params['method']
+    segments = urlparse(url).path.split("/")
+    path = "/".join("{id}" if _ID_SEGMENT.match(segment) or (i and segments[i - 1] in _ID_PARENTS) else segment
+                    for i, segment in enumerate(segments))
+    return f"{method} {path}"
+
+
+def calling_helper():
+    """
+    Name of the app function that made the current outbound call, e.g.
+    'lastfm_profile.get_track_tags_lastfm'. Lambdas and comprehensions are
+    skipped; calls from pool threads are named after the pooled function.
+    """
+    wrapper = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        code = frame.f_code
+        if module.startswith('app.') and module not in _PLUMBING and not code.co_name.startswith('<'):
+            name = f"{module.rpartition('.')[2]}.{code.co_qualname.replace('.<locals>', '')}"
+            if module not in _WRAPPERS:
+                return name
+            wrapper = wrapper or name
+        frame = frame.f_back
+    return wrapper or 'other'
+
+
+def record_call(api, endpoint, seconds, status=None, size=0, cache=None, error=None):
+    """
+    Record one outbound call (or cache hit, with cache='hit') in the current
+    request's trace, if any, and in the app's metrics.
+    """
+    metrics.record_call(api, endpoint, seconds, status=status, cache=cache, error=error, helper=calling_helper())
+    trace = _trace.get()
+    if trace is None:
+        return
+    trace.add_call({
+        'api': api,
+        'endpoint': endpoint,
+        'status': status,
+        'bytes': size,
+        'seconds': round(seconds, 4),
+        'cache': cache,
+        'error': error
+    })
+
+
+def count(name, amount=1):
+    """
+    Count an event (e.g. a fallback path) for the current request and in
+    the app's metrics.
+    """
+    trace = _trace.get()
+    if trace is not None:
+        trace.count(name, amount)
+    metrics.inc('marcify_events_total', {'event': name}, amount)
+
+
+def server_timing(trace, total):
+    """Format a trace as a Server-Timing header value."""
+    parts = []
+    for api, entry in sorted(trace.breakdown().items()):
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", api)
+        parts.append(f'{name};dur={entry["seconds"] * 1000:.1f};'
+                     f'desc="{entry["calls"]} calls, {entry["cached"]} cached, {entry["errors"]} errors"')
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def current_server_timing():
+    """
+    The current request's Server-Timing value so far, or None outside a
+    traced request. Streamed responses send it in their last line, since
+    their headers go out before the work is done.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return None
+    return server_timing(trace, time.perf_counter() - trace.start)
+
+
+def init_app(app):
+    """
+    Trace every request: outbound calls are collected while it runs, then
+    summarized in a Server-Timing header and the request metrics. Streamed
+    responses get no header (it would be sent before the body does the
+    work), see current_server_timing(); the metrics cover the whole
+    response. With TRACE_DEBUG enabled, ?debug=trace adds the full trace to
+    JSON responses as a "_trace" field.
+    """
+    @app.before_request
+    def start_trace():
+        g.trace = RequestTrace()
+        g.trace_token = _trace.set(g.trace)
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.pop('trace', None)
+        token = g.pop('trace_token', None)
+        if trace is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method = request.method
+        status = response.status_code
+
+        def finish():
+            with app.app_context():
+                metrics.record_request(route, method, status, time.perf_counter() - trace.start, trace.breakdown())
+            try:
+                _trace.reset(token)
+            except ValueError:
+                # Closed from another context than the request's
+                _trace.set(None)
+
+        if not response.is_streamed:
+            response.headers['Server-Timing'] = server_timing(trace, time.perf_counter() - trace.start)
+
+        if (app.config.get('TRACE_DEBUG') and request.args.get('debug') == 'trace'
+                and response.is_json and not response.is_streamed):
+            body = response.get_json()
+            if isinstance(body, dict):
+                body['_trace'] = trace.to_dict()
+                response.set_data(json.dumps(body))
+
+        if response.is_streamed:
+            # Streamed bodies keep calling out after this hook, finish the
+            # trace when the server closes the response
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
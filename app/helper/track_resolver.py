@@ -0,0 +1,57 @@
+from flask import current_app
+
+from app.helper.concurrency import bounded_map
+from app.helper.spotify_api import get_tracks, search_tracks
+from app.helper.tracks import get_track_id_map, track_key
+
+
+# Marks a search that failed, as opposed to one that found nothing
+_FAILED = object()
+
+
+def _search_track(pair, token):
+    track_name, artist_name = pair
+    tracks = search_tracks(f'track:"{track_name}" artist:"{artist_name}"', 1, token)
+    if tracks is None:
+        return _FAILED
+    return tracks[0] if tracks else None
+
+
+def resolve_tracks(pairs, token):
+    """
+    Resolve (track name, artist name) pairs, e.g. from Last.fm, to Spotify
+    TrackRecords. Returns a list in input order, with None for pairs that
+    have no Spotify track.
+
+    Pairs with a known id in the track id map are fetched together through
+    the batched /tracks endpoint (or straight from the track store). Only the
+    remaining pairs are searched one by one, concurrently, and their ids are
+    remembered, so resolving the same tracks again takes a request or two.
+    """
+    pairs = list(pairs)
+    keys = [track_key(track_name, artist_name) for track_name, artist_name in pairs]
+    id_map = get_track_id_map()
+    known = id_map.get_many(keys) if id_map is not None else {}
+
+    records = {}
+    track_ids = [track_id for track_id in known.values() if track_id]
+    by_id = get_tracks(track_ids, token) if track_ids else {}
+    for key, track_id in known.items():
+        if track_id in by_id:
+            records[key] = by_id[track_id]
+
+    # Search for pairs that are not known yet (or whose id no longer
+    # resolves); known misses are not searched again
+    unknown = {}
+    for key, pair in zip(keys, pairs):
+        if key not in records and not (key in known and known[key] is None):
+            unknown.setdefault(key, pair)
+    if unknown:
+        max_in_flight = current_app.config.get('SPOTIFY_MAX_IN_FLIGHT', 8)
+        found = dict(zip(unknown, bounded_map(lambda pair: _search_track(pair, token), unknown.values(), max_in_flight)))
+        found = {key: record for key, record in found.items() if record is not _FAILED}
+        records.update((key, record) for key, record in found.items() if record is not None)
+        if id_map is not None:
+            id_map.set_many({key: record.id if record else None for key, record in found.items()})
+
+    return [records.get(key) for key in keys]
@@ -0,0 +1,179 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from flask import current_app
+
+from app.helper.cache import thread_connection
+from app.helper.concurrency import app_extension
+
+
+def track_key(track_name, artist_name):
+    # Normalized (artist, track) name pair used to look up Spotify ids
+    return f"{' '.join(artist_name.lower().split())}\x1f{' '.join(track_name.lower().split())}"
+
+
+@dataclass(frozen=True, slots=True)
+class TrackRecord:
+    """
+    The part of a Spotify track object the app uses. Full track objects
+    carry album artwork in several sizes, market lists and external URLs;
+    records keep one image URL and the artist names only.
+    """
+    id: str
+    uri: str
+    name: str
+    artists: tuple
+    image: str = None
+    popularity: int = None
+
+    @classmethod
+    def from_spotify(cls, track):
+        images = (track.get('album') or {}).get('images') or []
+        # Spotify lists images largest first; the smallest is enough for lists
+        image = images[-1]['url'] if images else None
+        return cls(
+            id=track.get('id') or track['uri'].rsplit(':', 1)[-1],
+            uri=track['uri'],
+            name=track.get('name', ''),
+            artists=tuple(artist['name'] for artist in track.get('artists', [])),
+            image=image,
+            popularity=track.get('popularity')
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'uri': self.uri,
+            'name': self.name,
+            'artists': list(self.artists),
+            'image': self.image,
+            'popularity': self.popularity
+        }
+
+
+class TrackStore:
+    """
+    In-process LRU store of track records keyed by track id, shared by all
+    requests (and users) of a worker. Adding a track that is already stored
+    returns the stored record, so the same track is held in memory once.
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            stored = self._records.get(record.id)
+            if stored == record:
+                self._records.move_to_end(record.id)
+                return stored
+            self._records[record.id] = record
+            self._records.move_to_end(record.id)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+            return record
+
+    def get_many(self, track_ids):
+        """
+        Return the records for track_ids, with None for unknown ids.
+        """
+        with self._lock:
+            records = [self._records.get(track_id) for track_id in track_ids]
+            for record in records:
+                if record is not None:
+                    self._records.move_to_end(record.id)
+            return records
+
+    def __len__(self):
+        return len(self._records)
+
+
+def get_track_store():
+    """
+    Return the app's track metadata store.
+    """
+    return app_extension('track_store', lambda: TrackStore(current_app.config.get('TRACK_STORE_MAX_ENTRIES', 50000)))
+
+
+class TrackIdMap:
+    """
+    Persistent (track name, artist name) -> Spotify track id map in a local
+    SQLite file shared by all workers. Pairs that Spotify has no track for
+    are remembered too (as None), for a shorter time.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600, missing_ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS track_ids ("
+            " key TEXT PRIMARY KEY, track_id TEXT, expires_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        return thread_connection(self._local, self.path)
+
+    def get_many(self, keys):
+        """
+        Return {key: track id or None} for every key that is known.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        try:
+            conn = self._connect()
+            # Stay below SQLite's host parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, track_id FROM track_ids WHERE key IN ({','.join('?' * len(chunk))})"
+                    f" AND expires_at > ?",
+                    (*chunk, time.time())
+                )
+                found.update(rows)
+        except sqlite3.Error:
+            pass
+        return found
+
+    def set_many(self, mapping):
+        """
+        Store {key: track id or None}.
+        """
+        now = time.time()
+        try:
+            self._connect().executemany(
+                "INSERT OR REPLACE INTO track_ids (key, track_id, expires_at) VALUES (?, ?, ?)",
+                [(key, track_id, now + (self.ttl if track_id else self.missing_ttl))
+                 for key, track_id in mapping.items()]
+            )
+        except sqlite3.Error:
+            pass
+
+    def remember(self, records):
+        """
+        Store the ids of track records under their name and every artist.
+        """
+        self.set_many({track_key(record.name, artist): record.id
+                       for record in records for artist in record.artists})
+
+
+def get_track_id_map():
+    """
+    Return the app's track id map, or None if disabled.
+    """
+    if not current_app.config.get('TRACK_ID_MAP_ENABLED'):
+        return None
+    return app_extension('track_id_map', lambda: TrackIdMap(
+        current_app.config['TRACK_ID_MAP_PATH'],
+        ttl=current_app.config.get('TRACK_ID_MAP_TTL', 30 * 24 * 3600)
+    ))
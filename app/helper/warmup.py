@@ -0,0 +1,152 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+
+import requests
+from flask import current_app
+
+from app.helper import http_client
+from app.helper.lastfm_profile import GENRE_KEYWORDS, TAG_CATEGORIES, get_artists_by_tag
+from app.helper.recommendations import get_related_artists, iter_recommendations, search_by_genre_spotify
+from app.helper.scheduler import PRIORITY_BACKGROUND, TokenBucket, priority
+
+logger = logging.getLogger(__name__)
+
+
+def default_tags():
+    """Genre keywords plus every mood/energy keyword, in a stable order."""
+    tags = list(GENRE_KEYWORDS)
+    for keywords in TAG_CATEGORIES.values():
+        tags.extend(keywords['high'] + keywords['low'])
+    return list(dict.fromkeys(tags))
+
+
+def get_client_token():
+    """
+    Get an app-only Spotify token (client credentials flow), enough for
+    searches. Returns None if no credentials are configured or the request
+    failed.
+    """
+    client_id = current_app.config.get('SPOTIFY_CLIENT_ID')
+    client_secret = current_app.config.get('SPOTIFY_CLIENT_SECRET')
+    if not client_id or not client_secret:
+        return None
+    try:
+        resp = http_client.post(
+            current_app.config['SPOTIFY_TOKEN_URL'],
+            data={"grant_type": "client_credentials"},
+            auth=requests.auth.HTTPBasicAuth(client_id, client_secret)
+        )
+        if 200 <= resp.status_code <= 299:
+            return resp.json().get('access_token')
+        logger.warning("Spotify client token request returned HTTP %s", resp.status_code)
+    except Exception as exc:
+        logger.warning("Spotify client token request failed: %s", exc)
+    return None
+
+
+def warmup_steps(seeds, genres, tags, token):
+    """
+    Return (label, callable) steps that fill the caches a default request
+    for each seed, genre and tag would use.
+    """
+    steps = []
+    for tag in tags:
+        # Last.fm tag -> artists (response cache and tag index)
+        steps.append((f"tag {tag}", lambda tag=tag: get_artists_by_tag(tag, limit=5)))
+    for seed in seeds:
+        # Runs a default /get-recommended-playlist request: similar artists
+        # (artist graph) and, with a token, the Spotify searches it makes
+        payload = {'seed-artist': seed, 'seed-genre': genres[0] if genres else 'rock'}
+        if token:
+            steps.append((f"seed {seed}", lambda payload=payload: list(iter_recommendations(payload, token))))
+        else:
+            steps.append((f"seed {seed}", lambda seed=seed: get_related_artists(seed, limit=10)))
+    if token:
+        for genre in genres:
+            steps.append((f"genre {genre}", lambda genre=genre: search_by_genre_spotify(genre, token, limit=10)))
+    return steps
+
+
+def warm_caches(seeds=None, genres=None, tags=None, rate=None, progress=None):
+    """
+    Fill the response caches for popular seeds, genres and tags (defaults
+    from the WARMUP_* settings). Must run inside an app context.
+
+    Steps run one at a time at background priority, so user requests are
+    served first, and at most `rate` steps start per second. Spotify
+    searches need client credentials and are skipped without them. After
+    each step progress(done, total, label) is called and the app's
+    'warmup_status' is updated. Returns the final status.
+    """
+    config = current_app.config
+    seeds = config.get('WARMUP_SEEDS', []) if seeds is None else seeds
+    genres = config.get('WARMUP_GENRES', []) if genres is None else genres
+    tags = (config.get('WARMUP_TAGS') or default_tags()) if tags is None else tags
+    rate = rate or config.get('WARMUP_RATE', 2)
+
+    with priority(PRIORITY_BACKGROUND):
+        token = get_client_token()
+        if not token:
+            logger.info("No Spotify client credentials, warming Last.fm caches only")
+        steps = warmup_steps(seeds, genres, tags, token)
+
+        status = {'state': 'running', 'done': 0, 'failed': 0, 'total': len(steps),
+                  'current': None, 'started': time.time(), 'finished': None}
+        current_app.extensions['warmup_status'] = status
+
+        bucket = TokenBucket(rate, 1)
+        for label, step in steps:
+            delay = bucket.wait_time(time.monotonic())
+            if delay:
+                time.sleep(delay)
+            bucket.take(time.monotonic())
+
+            status['current'] = label
+            try:
+                step()
+            except Exception as exc:
+                status['failed'] += 1
+                logger.warning("Warm-up step %s failed: %s", label, exc)
+            status['done'] += 1
+            if progress:
+                progress(status['done'], status['total'], label)
+
+    status.update(state='done', current=None, finished=time.time())
+    logger.info("Cache warm-up finished: %s/%s steps, %s failed",
+                status['done'], status['total'], status['failed'])
+    return status
+
+
+def start_background_warmup(app):
+    """
+    Warm the caches in a daemon thread of this worker, then again every
+    WARMUP_INTERVAL seconds (if set). Workers take turns via a lock file, so
+    later workers find the shared Last.fm caches already filled and only
+    warm their own in-process Spotify search cache.
+    """
+    def run():
+        while True:
+            lock_path = os.path.join(app.config['DATA_DIR'], 'warmup.lock')
+            os.makedirs(app.config['DATA_DIR'], exist_ok=True)
+            with open(lock_path, 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    with app.app_context():
+                        warm_caches(progress=lambda done, total, label: logger.info(
+                            "Cache warm-up %s/%s: %s", done, total, label))
+                except Exception:
+                    logger.exception("Cache warm-up failed")
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+            interval = app.config.get('WARMUP_INTERVAL', 0)
+            if not interval:
+                return
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
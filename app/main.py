@@ -1,8 +1,12 @@
 import json
 import requests
+from itertools import islice
 
-from flask import Flask, render_template, redirect, url_for, jsonify, session, request
-from app.helper import recommendations, create_playlist, lastfm_profile
+from flask import Flask, Response, render_template, redirect, url_for, jsonify, session, request, stream_with_context
+from app.helper import recommendations, create_playlist, lastfm_profile, http_client, batch_profile, metrics, tracing, warmup
+from app.helper.jobs import JOB_DONE, JOB_FAILED, JobLimitError, get_job_queue
+from app.helper.profile_store import (PROFILE_VERSION, analysis_source, get_profile_store, playlist_source,
+                                      top_tracks_source)
 import time
 from app.config import Config
 
@@ -14,6 +18,18 @@ app.config['SESSION_COOKIE_SECURE'] = app.config.get('REDIRECT_URL', '').startsw
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+tracing.init_app(app)
+
+# Save a running top tracks analysis after this many newly tagged tracks
+PROFILE_CHECKPOINT_EVERY = 5
+
+
+@app.cli.command('warm-cache')
+def warm_cache_command():
+    """Fill the shared caches for popular seeds, genres and tags."""
+    status = warmup.warm_caches(progress=lambda done, total, label: print(f"[{done}/{total}] {label}", flush=True))
+    print(f"Warm-up done: {status['done']}/{status['total']} steps, {status['failed']} failed")
+
 
 def clear_auth_session():
     """Discard all stored auth state so the next request triggers a fresh sign-in."""
@@ -23,6 +39,253 @@ def clear_auth_session():
     session.pop('spotify_username', None)
 
 
+def save_profile(session_key, source, profile, user_id=None):
+    """
+    Store a profile server-side and keep only a reference to it in the session
+    (under session_key, unless it is None). Background jobs pass user_id
+    explicitly since they have no session.
+    """
+    user_id = user_id or session.get('spotify_username')
+    if not user_id:
+        return
+    get_profile_store().put(user_id, source, profile)
+    if session_key:
+        session[session_key] = {'source': source, 'version': PROFILE_VERSION}
+
+
+def load_profile(source, user_id=None):
+    """
+    Load the current user's (or user_id's) stored profile for a source, or None.
+    """
+    user_id = user_id or session.get('spotify_username')
+    if not user_id:
+        return None
+    return get_profile_store().get(user_id, source)
+
+
+def load_session_profile(session_key):
+    """
+    Load the profile the session references under session_key, or None.
+    """
+    ref = session.get(session_key)
+    if not ref or ref.get('version') != PROFILE_VERSION:
+        return None
+    return load_profile(ref['source'])
+
+
+def compact_profile(profile, top_tags=10):
+    """The part of a profile that is stored for playlist generation."""
+    return {
+        'scores': profile['scores'],
+        'top_tags': profile['top_tags'][:top_tags],
+        'genres': profile['genres']
+    }
+
+
+def top_tracks_profile_updates(sess_access_token, time_range):
+    """
+    Start (or resume) the analysis of the user's top tracks for a time range.
+    Returns (aggregator, updates), where updates yields the analysis of each
+    newly tagged track. Progress is saved along the way, so a repeat request
+    from any endpoint continues where the last one stopped, and a finished
+    analysis is reused as is. Returns (None, None) if the top tracks could
+    not be fetched.
+    """
+    source = top_tracks_source(time_range)
+    aggregator = lastfm_profile.ProfileAggregator(load_profile(analysis_source(source)))
+    if aggregator.complete:
+        return aggregator, iter(())
+
+    top_tracks = lastfm_profile.get_user_top_tracks(sess_access_token, limit=30, time_range=time_range)
+    if not top_tracks:
+        return None, None
+
+    def updates():
+        for count, (_, analysis) in enumerate(lastfm_profile.iter_profile_updates(top_tracks, aggregator), 1):
+            if count % PROFILE_CHECKPOINT_EVERY == 0:
+                save_profile(None, analysis_source(source), aggregator.state())
+            yield analysis
+
+        # Store the finished analysis and the profile used for playlist generation
+        save_profile(None, analysis_source(source), aggregator.state())
+        save_profile(None, source, compact_profile(aggregator.profile()))
+
+    return aggregator, updates()
+
+
+def get_top_tracks_profile(sess_access_token, time_range):
+    """
+    Return the complete profile of the user's top tracks for a time range,
+    or None if the top tracks could not be fetched.
+    """
+    aggregator, updates = top_tracks_profile_updates(sess_access_token, time_range)
+    if aggregator is None:
+        return None
+    for _ in updates:
+        pass
+    return aggregator.profile()
+
+
+def get_taste_profile(sess_access_token):
+    """
+    Return the user's stored taste profile, analyzing their top tracks if
+    there is none yet. Returns None if no profile could be created.
+    """
+    taste_profile = load_session_profile('taste_profile_ref') or load_profile(top_tracks_source('medium_term'))
+    if not taste_profile:
+        profile = get_top_tracks_profile(sess_access_token, 'medium_term')
+        if profile:
+            taste_profile = compact_profile(profile)
+            session['taste_profile_ref'] = {'source': top_tracks_source('medium_term'), 'version': PROFILE_VERSION}
+    return taste_profile
+
+
+def get_playlist_profile(sess_access_token, playlist_id, user_id=None):
+    """
+    Return the stored profile of a playlist (or the last analyzed one if no
+    id is given), analyzing the playlist if needed. Returns None on failure.
+    With an explicit user_id (background jobs) the session is not used.
+    """
+    if playlist_id:
+        playlist_profile = load_profile(playlist_source(playlist_id), user_id)
+    else:
+        playlist_profile = load_session_profile('playlist_profile_ref')
+
+    # If no stored profile for this playlist, analyze it
+    if not playlist_profile:
+        if playlist_id:
+            tracks = lastfm_profile.get_playlist_tracks(
+                sess_access_token, playlist_id,
+                limit=app.config['PLAYLIST_SAMPLE_SIZE'],
+                sample=app.config['PLAYLIST_SAMPLE_STRATEGY']
+            )
+            if tracks:
+                profile = lastfm_profile.analyze_tracks_profile(tracks)
+                playlist_profile = {'playlist_id': playlist_id, **compact_profile(profile)}
+                save_profile(None if user_id else 'playlist_profile_ref',
+                             playlist_source(playlist_id), playlist_profile, user_id)
+    return playlist_profile
+
+
+def recommended_playlist(sess_access_token, data):
+    """
+    Fetch recommended tracks using Last.fm + Spotify search.
+    Returns the /get-recommended-playlist response.
+    """
+    tracks = recommendations.gen_recommendations(data, sess_access_token, None)
+    metrics.record_tracks('recommendations', int(data.get('track-count', 10)), len(tracks))
+    uris = [t.uri for t in tracks]
+    return {
+        "songs": [t.to_dict() for t in tracks if t],
+        "uris": json.dumps(uris)
+    }
+
+
+def playlist_generation_settings(data):
+    """Read the /generate-from-playlist request settings."""
+    return {
+        'playlist_id': data.get('playlist_id'),
+        'seed_artist': data.get('seed_artist', '').strip(),
+        'variety': int(data.get('variety', 5)),
+        'discovery': int(data.get('discovery', 5)),
+        'track_count': int(data.get('track_count', 15)),
+        'random_seed': data.get('random_seed')
+    }
+
+
+def playlist_generation(sess_access_token, playlist_profile, settings):
+    """
+    Generate tracks from a playlist profile and a seed artist.
+    Returns the /generate-from-playlist response.
+    """
+    tracks = lastfm_profile.generate_playlist_from_profile_and_artist(
+        playlist_profile,
+        settings['seed_artist'],
+        sess_access_token,
+        variety=settings['variety'],
+        discovery=settings['discovery'],
+        limit=settings['track_count'],
+        random_seed=settings['random_seed']
+    )
+    metrics.record_tracks('playlist', settings['track_count'], len(tracks))
+
+    uris = [t.uri for t in tracks if t]
+    return {
+        "songs": [t.to_dict() for t in tracks if t],
+        "uris": json.dumps(uris),
+        "profile_tags": playlist_profile['top_tags'][:5],
+        "seed_artist": settings['seed_artist']
+    }
+
+
+def playlists_analysis(sess_access_token, playlist_ids, user_id=None):
+    """
+    Analyze many playlists and store their profiles.
+    Returns the /api/playlists/analyze response.
+    """
+    result = batch_profile.analyze_playlists_batch(
+        sess_access_token, playlist_ids,
+        tracks_per_playlist=app.config['PLAYLIST_SAMPLE_SIZE'],
+        sample=app.config['PLAYLIST_SAMPLE_STRATEGY']
+    )
+
+    # Empty playlists get no profile; their neutral scores would look alike,
+    # so they are left out of the ids and the similarity matrix too
+    keep = [i for i, profile in enumerate(result['profiles']) if profile['track_count']]
+
+    profiles = []
+    for i in keep:
+        profile = result['profiles'][i]
+        # Store server-side so /generate-from-playlist can reuse them
+        save_profile(None, playlist_source(profile['playlist_id']),
+                     {'playlist_id': profile['playlist_id'], **compact_profile(profile)}, user_id)
+        profiles.append({'playlist_id': profile['playlist_id'], **profile_summary(profile)})
+
+    return {
+        'profiles': profiles,
+        'playlist_ids': [playlist_ids[i] for i in keep],
+        'similarity': [[result['similarity'][i][j] for j in keep] for i in keep]
+    }
+
+
+def stream_tracks(kind, tracks, limit, summary):
+    """
+    Stream tracks as NDJSON: one {"type": "track"} line as soon as each track
+    is found, then a {"type": "done"} line with the URIs, the extra summary
+    fields and the request's Server-Timing value. The URIs keep the order
+    the tracks were streamed (and shown) in, so a saved playlist matches
+    the page; unlike the JSON endpoints, they are not shuffled. kind labels
+    the track counts in the metrics.
+    """
+    def generate():
+        collected = []
+        for track in islice(tracks, limit):
+            collected.append(track)
+            yield json.dumps({"type": "track", "track": track.to_dict()}) + "\n"
+        metrics.record_tracks(kind, limit, len(collected))
+        uris = [t.uri for t in collected if t]
+        done = {"type": "done", "uris": json.dumps(uris), "count": len(uris), **summary}
+        timing = tracing.current_server_timing()
+        if timing:
+            done["server_timing"] = timing
+        yield json.dumps(done) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Ask reverse proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def profile_summary(profile):
+    """The profile fields returned by the JSON API."""
+    return {
+        'scores': profile['scores'],
+        'top_tags': profile['top_tags'][:15],
+        'genres': profile['genres'],
+        'track_count': profile['track_count']
+    }
+
+
 def refresh_token_if_needed():
     """
     Check if the access token is expired and refresh it if needed.
@@ -43,26 +306,27 @@ def refresh_token_if_needed():
 
     # Check if token is expired (older than ~58 minutes)
     if (time.time() - sess_token_create_time) > 3500:
-        token_url = "https://accounts.spotify.com/api/token"
+        token_url = app.config['SPOTIFY_TOKEN_URL']
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         payload = {"grant_type": "refresh_token", "refresh_token": sess_refresh_token}
 
         try:
-            resp = requests.post(
+            resp = http_client.post(
                 token_url,
                 headers=headers,
                 data=payload,
                 auth=requests.auth.HTTPBasicAuth(
                     app.config['SPOTIFY_CLIENT_ID'],
                     app.config['SPOTIFY_CLIENT_SECRET']
-                ),
-                timeout=10
+                )
             )
         except requests.RequestException:
             # Transient network error: keep the token, let the user retry later.
+            metrics.inc('marcify_token_refresh_total', {'result': 'transient'})
             return None
 
         if 200 <= resp.status_code <= 299:
+            metrics.inc('marcify_token_refresh_total', {'result': 'success'})
             parsed_resp = resp.json()
             session['access_token'] = parsed_resp['access_token']
             session['token_create'] = time.time()  # Update the token creation time
@@ -81,7 +345,10 @@ def refresh_token_if_needed():
         if error == 'invalid_grant':
             # Refresh token expired or revoked -> discard it (do NOT retry) and
             # force a fresh sign-in on the next request.
+            metrics.inc('marcify_token_refresh_total', {'result': 'invalid_grant'})
             clear_auth_session()
+        else:
+            metrics.inc('marcify_token_refresh_total', {'result': 'transient'})
 
         return None
 
@@ -92,6 +359,17 @@ def refresh_token_if_needed():
 def landing():
     return render_template('landing.html')
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus metrics of all workers (request latency per route, outbound
+    calls, cache hit counts, token refreshes and generated track counts).
+    """
+    registry = metrics.get_metrics()
+    if registry is None:
+        return "Metrics are disabled", 404
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/generator', methods=['GET'])
 def index():
     url = f"https://accounts.spotify.com/authorize?response_type=code&client_id={app.config['SPOTIFY_CLIENT_ID']}&scope={app.config['SCOPE']}&redirect_uri={app.config['REDIRECT_URL']}"
@@ -123,13 +401,23 @@ def get_rec_playlist():
     data = request.get_json()
 
     # Fetch recommended tracks using Last.fm + Spotify search
-    tracks = recommendations.gen_recommendations(data, sess_access_token, None)
-    uris = [i['uri'] for i in tracks]
-    resp_dict = {
-        "songs": tracks,
-        "uris": json.dumps(uris)
-    }
-    return jsonify(resp_dict) 
+    return jsonify(recommended_playlist(sess_access_token, data))
+
+@app.route("/get-recommended-playlist/stream", methods=["POST"])
+def get_rec_playlist_stream():
+    """
+    Streaming variant of /get-recommended-playlist (NDJSON, see stream_tracks).
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    data = request.get_json()
+    track_count = int(data.get('track-count', 10))
+
+    tracks = recommendations.iter_recommendations(data, sess_access_token)
+    return stream_tracks('recommendations', tracks, track_count, {})
 
 @app.route('/save-private-playlist', methods=['POST'])
 def create_private_playlist():
@@ -146,10 +434,15 @@ def create_private_playlist():
     # Get json data from request
     data = request.get_json()
 
-    status = create_playlist.create_playlist(sess_username, sess_access_token, data)
+    saved = {"added": 0, "total": 0}
+
+    def on_progress(added, total):
+        saved.update(added=added, total=total)
+
+    status = create_playlist.create_playlist(sess_username, sess_access_token, data, progress=on_progress)
 
     if not status:
-        return jsonify({"error": "Error creating playlist"}), 400
+        return jsonify({"error": "Error creating playlist", **saved}), 400
     else:
         return jsonify({"success": True}), 200
 
@@ -161,14 +454,14 @@ def spotify_oauth2callback():
         return redirect(url_for('login')) 
 
     #get the access token and refresh token for this user 
-    url = "https://accounts.spotify.com/api/token"
+    url = app.config['SPOTIFY_TOKEN_URL']
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
     payload = {
         "grant_type":"authorization_code",
         "code":code,
         "redirect_uri":app.config['REDIRECT_URL']
     }
-    resp = requests.post(url, headers=headers, data=payload, auth=requests.auth.HTTPBasicAuth(app.config['SPOTIFY_CLIENT_ID'], app.config['SPOTIFY_CLIENT_SECRET']))
+    resp = http_client.post(url, headers=headers, data=payload, auth=requests.auth.HTTPBasicAuth(app.config['SPOTIFY_CLIENT_ID'], app.config['SPOTIFY_CLIENT_SECRET']))
     if 200 <= resp.status_code <= 299:
         parsed_resp = resp.json()
         #save the access and refresh tokens to session
@@ -179,7 +472,7 @@ def spotify_oauth2callback():
         #get the user id to be used in playlist creation 
         profile_endpoint = "https://api.spotify.com/v1/me"
         headers = {"Authorization": f"Bearer {parsed_resp['access_token']}"}
-        resp = requests.get(profile_endpoint, headers=headers) 
+        resp = http_client.get(profile_endpoint, headers=headers)
         json_resp = resp.json()
         session['spotify_username'] = json_resp['id']
         session.permanent = True
@@ -199,22 +492,15 @@ def music_profile():
     if not sess_access_token:
         return redirect(url_for('index'))
 
-    # Get user's top tracks from Spotify
+    # Analyze the user's top tracks with Last.fm tags (or reuse an earlier analysis)
     time_range = request.args.get('time_range', 'medium_term')
-    top_tracks = lastfm_profile.get_user_top_tracks(sess_access_token, limit=30, time_range=time_range)
+    profile = get_top_tracks_profile(sess_access_token, time_range)
 
-    if not top_tracks:
+    if not profile:
         return "Could not fetch your top tracks", 400
 
-    # Analyze tracks with Last.fm tags
-    profile = lastfm_profile.analyze_tracks_profile(top_tracks)
-
-    # Store profile in session for playlist generation
-    session['taste_profile'] = {
-        'scores': profile['scores'],
-        'top_tags': profile['top_tags'][:10],
-        'genres': profile['genres']
-    }
+    # The profile itself is stored server-side for playlist generation
+    session['taste_profile_ref'] = {'source': top_tracks_source(time_range), 'version': PROFILE_VERSION}
 
     return render_template("profile.html",
                           profile=profile,
@@ -232,19 +518,51 @@ def get_profile_api():
         return jsonify({"error": "Token expired, please re-login"}), 401
 
     time_range = request.args.get('time_range', 'medium_term')
-    top_tracks = lastfm_profile.get_user_top_tracks(sess_access_token, limit=30, time_range=time_range)
+    profile = get_top_tracks_profile(sess_access_token, time_range)
 
-    if not top_tracks:
+    if not profile:
         return jsonify({"error": "Could not fetch top tracks"}), 400
 
-    profile = lastfm_profile.analyze_tracks_profile(top_tracks)
+    return jsonify(profile_summary(profile))
 
-    return jsonify({
-        'scores': profile['scores'],
-        'top_tags': profile['top_tags'][:15],
-        'genres': profile['genres'],
-        'track_count': profile['track_count']
-    })
+
+@app.route('/api/profile/stream', methods=['GET'])
+def stream_profile_api():
+    """
+    Stream the user's taste profile as NDJSON while it is being built: a
+    {"type": "profile"} line with the profile so far, one {"type": "track"}
+    line with the updated profile for every newly tagged track, and a final
+    {"type": "done"} line with the Server-Timing value. An analysis interrupted earlier is resumed.
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    time_range = request.args.get('time_range', 'medium_term')
+    aggregator, updates = top_tracks_profile_updates(sess_access_token, time_range)
+
+    if aggregator is None:
+        return jsonify({"error": "Could not fetch top tracks"}), 400
+
+    # Set before streaming, the session cookie cannot change afterwards
+    session['taste_profile_ref'] = {'source': top_tracks_source(time_range), 'version': PROFILE_VERSION}
+
+    def generate():
+        yield json.dumps({"type": "profile", "profile": profile_summary(aggregator.profile())}) + "\n"
+        for analysis in updates:
+            yield json.dumps({"type": "track", "track": analysis,
+                              "profile": profile_summary(aggregator.profile())}) + "\n"
+        done = {"type": "done", "profile": profile_summary(aggregator.profile())}
+        timing = tracing.current_server_timing()
+        if timing:
+            done["server_timing"] = timing
+        yield json.dumps(done) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Ask reverse proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @app.route('/generate-from-profile', methods=['POST'])
@@ -261,17 +579,7 @@ def generate_from_profile():
     track_count = int(data.get('track-count', 15))
 
     # Get stored profile or create new one
-    taste_profile = session.get('taste_profile')
-    if not taste_profile:
-        top_tracks = lastfm_profile.get_user_top_tracks(sess_access_token, limit=30)
-        if top_tracks:
-            profile = lastfm_profile.analyze_tracks_profile(top_tracks)
-            taste_profile = {
-                'scores': profile['scores'],
-                'top_tags': profile['top_tags'][:10],
-                'genres': profile['genres']
-            }
-
+    taste_profile = get_taste_profile(sess_access_token)
     if not taste_profile:
         return jsonify({"error": "Could not create taste profile"}), 400
 
@@ -281,15 +589,41 @@ def generate_from_profile():
         sess_access_token,
         limit=track_count
     )
+    metrics.record_tracks('profile', track_count, len(tracks))
 
-    uris = [t['uri'] for t in tracks if t]
+    uris = [t.uri for t in tracks if t]
     return jsonify({
-        "songs": tracks,
+        "songs": [t.to_dict() for t in tracks if t],
         "uris": json.dumps(uris),
         "profile_tags": taste_profile['top_tags'][:5]
     })
 
 
+@app.route('/generate-from-profile/stream', methods=['POST'])
+def generate_from_profile_stream():
+    """
+    Streaming variant of /generate-from-profile (NDJSON, see stream_tracks).
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    data = request.get_json()
+    track_count = int(data.get('track-count', 15))
+
+    taste_profile = get_taste_profile(sess_access_token)
+    if not taste_profile:
+        return jsonify({"error": "Could not create taste profile"}), 400
+
+    tracks = lastfm_profile.iter_similar_tracks_by_profile(
+        {'top_tags': taste_profile['top_tags'], 'scores': taste_profile['scores']},
+        sess_access_token,
+        limit=track_count
+    )
+    return stream_tracks('profile', tracks, track_count, {"profile_tags": taste_profile['top_tags'][:5]})
+
+
 @app.route('/analyzer')
 def playlist_analyzer():
     """Redirect old analyzer route to new profile page."""
@@ -331,8 +665,12 @@ def analyze_playlist(playlist_id):
     if not sess_access_token:
         return jsonify({"error": "Token expired, please re-login"}), 401
 
-    # Get tracks from playlist
-    tracks = lastfm_profile.get_playlist_tracks(sess_access_token, playlist_id, limit=30)
+    # Sample tracks from the playlist (pages are streamed, not loaded at once)
+    strategy = request.args.get('sample', app.config['PLAYLIST_SAMPLE_STRATEGY'])
+    if strategy not in lastfm_profile.SAMPLE_STRATEGIES:
+        return jsonify({"error": "Unknown sampling strategy"}), 400
+    size = min(request.args.get('size', app.config['PLAYLIST_SAMPLE_SIZE'], type=int), app.config['PLAYLIST_SAMPLE_MAX'])
+    tracks = lastfm_profile.get_playlist_tracks(sess_access_token, playlist_id, limit=size, sample=strategy)
 
     if not tracks:
         return jsonify({"error": "Could not fetch playlist tracks"}), 400
@@ -340,20 +678,31 @@ def analyze_playlist(playlist_id):
     # Analyze tracks
     profile = lastfm_profile.analyze_tracks_profile(tracks)
 
-    # Store in session for later use
-    session['playlist_profile'] = {
-        'playlist_id': playlist_id,
-        'scores': profile['scores'],
-        'top_tags': profile['top_tags'][:10],
-        'genres': profile['genres']
-    }
+    # Store server-side for later use
+    save_profile('playlist_profile_ref', playlist_source(playlist_id),
+                 {'playlist_id': playlist_id, **compact_profile(profile)})
 
-    return jsonify({
-        'scores': profile['scores'],
-        'top_tags': profile['top_tags'][:15],
-        'genres': profile['genres'],
-        'track_count': profile['track_count']
-    })
+    return jsonify(profile_summary(profile))
+
+
+@app.route('/api/playlists/analyze', methods=['POST'])
+def analyze_playlists_batch():
+    """
+    Analyze many playlists at once and return all mood profiles plus a
+    pairwise similarity matrix.
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    data = request.get_json() or {}
+    playlist_ids = list(dict.fromkeys(data.get('playlist_ids') or []))[:50]
+
+    if not playlist_ids:
+        return jsonify({"error": "No playlist ids given"}), 400
+
+    return jsonify(playlists_analysis(sess_access_token, playlist_ids))
 
 
 @app.route('/generate-from-playlist', methods=['POST'])
@@ -369,47 +718,157 @@ def generate_from_playlist():
     if not sess_access_token:
         return jsonify({"error": "Token expired, please re-login"}), 401
 
-    data = request.get_json()
-    playlist_id = data.get('playlist_id')
-    seed_artist = data.get('seed_artist', '').strip()
-    variety = int(data.get('variety', 5))
-    discovery = int(data.get('discovery', 5))
-    track_count = int(data.get('track_count', 15))
+    settings = playlist_generation_settings(request.get_json())
 
     # Get or create profile from playlist
-    playlist_profile = session.get('playlist_profile')
+    playlist_profile = get_playlist_profile(sess_access_token, settings['playlist_id'])
+    if not playlist_profile:
+        return jsonify({"error": "No playlist profile available"}), 400
 
-    # If no profile or different playlist, analyze it
-    if not playlist_profile or playlist_profile.get('playlist_id') != playlist_id:
-        if playlist_id:
-            tracks = lastfm_profile.get_playlist_tracks(sess_access_token, playlist_id, limit=30)
-            if tracks:
-                profile = lastfm_profile.analyze_tracks_profile(tracks)
-                playlist_profile = {
-                    'playlist_id': playlist_id,
-                    'scores': profile['scores'],
-                    'top_tags': profile['top_tags'][:10],
-                    'genres': profile['genres']
-                }
-                session['playlist_profile'] = playlist_profile
+    # Generate tracks
+    return jsonify(playlist_generation(sess_access_token, playlist_profile, settings))
 
+
+@app.route('/generate-from-playlist/stream', methods=['POST'])
+def generate_from_playlist_stream():
+    """
+    Streaming variant of /generate-from-playlist (NDJSON, see stream_tracks).
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    settings = playlist_generation_settings(request.get_json())
+
+    playlist_profile = get_playlist_profile(sess_access_token, settings['playlist_id'])
     if not playlist_profile:
         return jsonify({"error": "No playlist profile available"}), 400
 
-    # Generate tracks
-    tracks = lastfm_profile.generate_playlist_from_profile_and_artist(
+    tracks = lastfm_profile.iter_playlist_from_profile_and_artist(
         playlist_profile,
-        seed_artist,
+        settings['seed_artist'],
         sess_access_token,
-        variety=variety,
-        discovery=discovery,
-        limit=track_count
+        variety=settings['variety'],
+        discovery=settings['discovery'],
+        limit=settings['track_count']
     )
-
-    uris = [t['uri'] for t in tracks if t]
-    return jsonify({
-        "songs": tracks,
-        "uris": json.dumps(uris),
+    return stream_tracks('playlist', tracks, settings['track_count'], {
         "profile_tags": playlist_profile['top_tags'][:5],
-        "seed_artist": seed_artist
+        "seed_artist": settings['seed_artist']
     })
+
+
+def playlist_generation_job(sess_access_token, user_id, settings, playlist_profile):
+    """
+    Background job for /api/jobs/generate-from-playlist. Analyzes the
+    playlist first if it has no stored profile yet.
+    """
+    if not playlist_profile:
+        playlist_profile = get_playlist_profile(sess_access_token, settings['playlist_id'], user_id=user_id)
+        if not playlist_profile:
+            raise ValueError("No playlist profile available")
+    return playlist_generation(sess_access_token, playlist_profile, settings)
+
+
+def job_status(job):
+    """The job fields returned by the jobs API."""
+    status = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'status_url': url_for('get_job', job_id=job['id'])
+    }
+    if job['status'] == JOB_DONE:
+        status['result'] = job['result']
+    elif job['status'] == JOB_FAILED:
+        status['error'] = job['error']
+    return status
+
+
+def submit_job(kind, params, func, *args):
+    """
+    Queue func(*args) as a background job for the current user. Returns the
+    202 response with the job id, or 429 if the user has too many jobs.
+    """
+    try:
+        job = get_job_queue().submit(session.get('spotify_username', ''), kind, params, func, *args)
+    except JobLimitError as exc:
+        return jsonify({"error": str(exc)}), 429
+    return jsonify(job_status(job)), 202
+
+
+@app.route('/api/jobs/recommendations', methods=['POST'])
+def recommendations_job():
+    """
+    Background variant of /get-recommended-playlist. Returns a job id to poll.
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    data = request.get_json() or {}
+    return submit_job('recommendations', data, recommended_playlist, sess_access_token, data)
+
+
+@app.route('/api/jobs/generate-from-playlist', methods=['POST'])
+def generate_from_playlist_job():
+    """
+    Background variant of /generate-from-playlist. Returns a job id to poll.
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    settings = playlist_generation_settings(request.get_json() or {})
+
+    # Without a playlist id the last analyzed playlist is used, as in the sync endpoint
+    if settings['playlist_id']:
+        playlist_profile = load_profile(playlist_source(settings['playlist_id']))
+    else:
+        playlist_profile = load_session_profile('playlist_profile_ref')
+        if not playlist_profile:
+            return jsonify({"error": "No playlist profile available"}), 400
+        settings['playlist_id'] = playlist_profile.get('playlist_id')
+
+    return submit_job('generate-from-playlist', settings, playlist_generation_job,
+                      sess_access_token, session.get('spotify_username'), settings, playlist_profile)
+
+
+@app.route('/api/jobs/playlists-analyze', methods=['POST'])
+def analyze_playlists_job():
+    """
+    Background variant of /api/playlists/analyze. Returns a job id to poll.
+    """
+    # Refresh token if needed
+    sess_access_token = refresh_token_if_needed()
+    if not sess_access_token:
+        return jsonify({"error": "Token expired, please re-login"}), 401
+
+    data = request.get_json() or {}
+    playlist_ids = list(dict.fromkeys(data.get('playlist_ids') or []))[:50]
+
+    if not playlist_ids:
+        return jsonify({"error": "No playlist ids given"}), 400
+
+    return submit_job('playlists-analyze', playlist_ids, playlists_analysis,
+                      sess_access_token, playlist_ids, session.get('spotify_username'))
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Return the status of a background job, and its result once it is done.
+    With ?wait=N the request waits up to N seconds (max 5) for the job to
+    finish before answering; clients should poll again while it is active,
+    rather than hold a worker thread for the whole job.
+    """
+    wait = min(max(request.args.get('wait', 0, type=float), 0), 5)
+    queue = get_job_queue()
+    job = queue.wait(job_id, wait) if wait else queue.get(job_id)
+
+    if not job or job['user_id'] != session.get('spotify_username', ''):
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_status(job))
\ No newline at end of file
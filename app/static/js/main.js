@@ -20,10 +20,7 @@ $(document).on("click","#generate-spotify-recs", function(){
             // console.log(res);
             for (x of res['songs']){
                 content = `<div><h5><p><strong>`+x['name'] + `<small> by `
-                for (i of x['artists']){
-                    content += i['name'] + ","
-                }
-                content = content.slice(0,-1);
+                content += x['artists'].join(",");
                 content += `</small></strong></p></h5></div>`
                 $('#song-container').append(content);
             }
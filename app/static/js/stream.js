@@ -0,0 +1,44 @@
+// POST a JSON payload and read the NDJSON response line by line.
+// onEvent is called with every parsed line as soon as it arrives.
+function streamNdjson(url, payload, onEvent) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        credentials: 'same-origin',
+        body: JSON.stringify(payload)
+    }).then(function(response) {
+        if (!response.ok) {
+            var error = new Error('HTTP ' + response.status);
+            error.status = response.status;
+            throw error;
+        }
+
+        var reader = response.body.getReader();
+        var decoder = new TextDecoder();
+        var buffer = '';
+
+        function emit(lines) {
+            lines.forEach(function(line) {
+                if (line.trim()) {
+                    onEvent(JSON.parse(line));
+                }
+            });
+        }
+
+        function pump() {
+            return reader.read().then(function(result) {
+                if (result.done) {
+                    emit([buffer]);
+                    return;
+                }
+                buffer += decoder.decode(result.value, {stream: true});
+                var lines = buffer.split('\n');
+                buffer = lines.pop();
+                emit(lines);
+                return pump();
+            });
+        }
+
+        return pump();
+    });
+}
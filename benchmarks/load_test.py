@@ -0,0 +1,259 @@
+"""
+Load test: starts the app under gunicorn against the local API stub and
+simulates concurrent users, each sending generation requests back to back.
+Reports throughput and latency per worker model and concurrency level, and
+the highest level each model sustains. Run from the repository root:
+
+    python -m benchmarks.load_test [--worker-class sync gthread gevent]
+                                   [--users 25 50 100 200 400] [--duration 20]
+                                   [--latency 0.1] [--slo 5]
+
+A level counts as sustained if fewer than 1% of requests fail and the p95
+latency stays below --slo seconds. While a level runs, TCP connects to the
+stub are timed; if they stall (p95 above --stub-connect-limit), the stub,
+not the app, is the bottleneck and the level is not counted. Seed artists are drawn from a large
+pool, so most requests miss the caches like fresh traffic would. The
+app's API rate limits are raised so the worker model, not the per-worker
+rate limits, is measured; pass --app-rate-limits to keep them.
+
+To test a running container instead, start it against the stub (its URLs
+are printed with --stub-only) and pass --url.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('REDIRECT_URL', 'http://localhost:5000/spotify-oauth2callback')
+
+from app.main import app  # noqa: E402
+from benchmarks.stub_server import StubServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = 'load-test'
+
+
+def session_cookie():
+    """A signed session cookie of a signed-in user, as the app expects it."""
+    app.secret_key = SECRET_KEY
+    serializer = app.session_interface.get_signing_serializer(app)
+    value = serializer.dumps({'access_token': 'load-test', 'refresh_token': 'load-test',
+                              'token_create': time.time() + 24 * 3600, 'spotify_username': 'load-test'})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)] if ordered else 0
+
+
+def start_server(worker_class, args, stub, port, data_dir):
+    env = dict(os.environ,
+               GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_THREADS=str(args.threads),
+               GUNICORN_WORKER_CONNECTIONS=str(args.worker_connections),
+               GUNICORN_BIND=f"127.0.0.1:{port}",
+               SECRET_KEY=SECRET_KEY,
+               DATA_DIR=data_dir,
+               WARMUP_ON_START='false',
+               **{key: str(value) for key, value in stub.app_config().items()})
+    if not args.app_rate_limits:
+        for name in ('SPOTIFY', 'LASTFM', 'TOKEN'):
+            env.setdefault(f"{name}_RATE_LIMIT", '10000')
+            env.setdefault(f"{name}_RATE_BURST", '10000')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    # Wait until the app answers
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn ({worker_class}) exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not start")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def probe_connects(address, deadline, interval=0.2):
+    """
+    Time TCP connects to `address` until `deadline`. Connects to a
+    saturated listener wait for SYN retransmits (about 1 s and up).
+    """
+    times = []
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            socket.create_connection(address, timeout=10).close()
+            times.append(time.perf_counter() - start)
+        except OSError:
+            times.append(10)
+        time.sleep(interval)
+    return times
+
+
+def run_level(url, users, duration, cookie, track_count, timeout, stub_address=None):
+    """
+    Run `users` concurrent users for `duration` seconds.
+    Returns (latencies of successful requests, failed request count,
+    stub connect times).
+    """
+    target = urlparse(url)
+    latencies = []
+    failures = [0]
+    connects = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    start_barrier = threading.Barrier(users)
+
+    def user(index):
+        rng = random.Random(index)
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=timeout)
+        start_barrier.wait()
+        while time.monotonic() < deadline:
+            body = json.dumps({'seed-artist': f"Load Artist {rng.randrange(100000)}", 'seed-genre': 'rock',
+                               'track-count': track_count})
+            start = time.perf_counter()
+            try:
+                conn.request('POST', '/get-recommended-playlist', body=body,
+                             headers={'Content-Type': 'application/json', 'Cookie': cookie})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=timeout)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    failures[0] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(users)]
+    if stub_address:
+        threads.append(threading.Thread(target=lambda: connects.extend(probe_connects(stub_address, deadline)),
+                                        daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures[0], connects
+
+
+def run_model(label, url, args, cookie, stub_address=None):
+    print(f"\n{label}")
+    print(f"  {'users':>6} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'failed':>7} {'stub connect p95 ms':>20}")
+    sustained = 0
+    for users in args.users:
+        latencies, failed, connects = run_level(url, users, args.duration, cookie, args.track_count,
+                                                args.timeout, stub_address)
+        total = len(latencies) + failed
+        p95 = percentile(latencies, 95)
+        failed_share = failed / total if total else 1
+        connect_p95 = percentile(connects, 95)
+        stub_bound = connect_p95 > args.stub_connect_limit
+        print(f"  {users:>6} {len(latencies) / args.duration:8.1f} {percentile(latencies, 50):7.2f} "
+              f"{p95:7.2f} {failed_share:7.1%} {connect_p95 * 1000:20.1f}"
+              + ("  stub saturated, not counted" if stub_bound else ""))
+        if failed_share < 0.01 and latencies and p95 < args.slo and not stub_bound:
+            sustained = users
+    print(f"  sustains {sustained} concurrent generations (p95 < {args.slo:g}s, < 1% failed)")
+    return sustained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker-class', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=16, help='threads per gthread worker')
+    parser.add_argument('--worker-connections', type=int, default=1000, help='connections per gevent worker')
+    parser.add_argument('--users', type=int, nargs='+', default=[25, 50, 100, 200, 400])
+    parser.add_argument('--duration', type=float, default=20, help='seconds per concurrency level')
+    parser.add_argument('--latency', type=float, default=0.1, help='stub latency per upstream call in seconds')
+    parser.add_argument('--track-count', type=int, default=10)
+    parser.add_argument('--slo', type=float, default=5, help='p95 latency limit in seconds')
+    parser.add_argument('--timeout', type=float, default=60, help='client timeout per request')
+    parser.add_argument('--stub-connect-limit', type=float, default=0.5,
+                        help='p95 stub connect time (seconds) above which a level is not counted')
+    parser.add_argument('--app-rate-limits', action='store_true', help="keep the app's API rate limits")
+    parser.add_argument('--url', help='test an already running app instead of starting gunicorn')
+    parser.add_argument('--stub-port', type=int, default=0)
+    parser.add_argument('--stub-only', action='store_true', help='only run the stub (for --url targets)')
+    args = parser.parse_args()
+
+    cookie = session_cookie()
+    if args.url:
+        run_model(args.url, args.url, args, cookie)
+        return
+
+    with StubServer(latency=args.latency, port=args.stub_port) as stub:
+        print(f"Stub API at {stub.base_url}, {args.latency * 1000:.0f} ms per upstream call")
+        if args.stub_only:
+            for key, value in stub.app_config().items():
+                print(f"  {key}={value}")
+            print(f"  SECRET_KEY={SECRET_KEY}")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return
+
+        results = {}
+        for worker_class in args.worker_class:
+            if worker_class == 'gevent':
+                try:
+                    import gevent  # noqa: F401
+                except ImportError:
+                    print("\ngevent: not installed (pip install -r requirements-gevent.txt), skipped")
+                    continue
+            port = 5100 + len(results)
+            with tempfile.TemporaryDirectory(prefix='marcify-load-') as data_dir:
+                process = start_server(worker_class, args, stub, port, data_dir)
+                try:
+                    label = f"{worker_class}: {args.workers} workers"
+                    if worker_class == 'gthread':
+                        label += f" x {args.threads} threads"
+                    elif worker_class == 'gevent':
+                        label += f" x {args.worker_connections} connections"
+                    results[worker_class] = run_model(label, f"http://127.0.0.1:{port}", args, cookie,
+                                                      stub.httpd.server_address)
+                finally:
+                    stop_server(process)
+
+        print("\nConcurrent generations sustained per container:")
+        for worker_class, sustained in results.items():
+            print(f"  {worker_class:<8} {sustained}")
+
+
+if __name__ == '__main__':
+    main()
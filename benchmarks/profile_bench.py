@@ -0,0 +1,59 @@
+"""
+Benchmark /profile wall time against the local stub server.
+
+Compares the sequential tag fetch (LASTFM_MAX_IN_FLIGHT=1) with the
+bounded concurrent fetch. Run from the repository root:
+
+    python -m benchmarks.profile_bench [--latency 0.05] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('REDIRECT_URL', 'http://localhost:5000/spotify-oauth2callback')
+
+from app.main import app  # noqa: E402
+from benchmarks.stub_server import StubServer  # noqa: E402
+
+
+def time_profile(client, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        resp = client.get('/profile')
+        durations.append(time.perf_counter() - start)
+        assert resp.status_code == 200, resp.status_code
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per call in seconds')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as stub:
+        app.config.update(stub.app_config(), SECRET_KEY='bench', TESTING=True, LASTFM_CACHE_ENABLED=False,
+                          LASTFM_RATE_LIMIT=1000, LASTFM_RATE_BURST=1000)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['access_token'] = 'bench'
+            sess['refresh_token'] = 'bench'
+            sess['token_create'] = time.time()
+
+        print(f"/profile, 30 tracks, {args.latency * 1000:.0f} ms per upstream call")
+        baseline = None
+        for in_flight in args.in_flight:
+            app.config['LASTFM_MAX_IN_FLIGHT'] = in_flight
+            wall = time_profile(client, args.runs)
+            baseline = baseline or wall
+            label = 'sequential' if in_flight == 1 else f'{in_flight} in flight'
+            print(f"  {label:<14} {wall * 1000:8.1f} ms  ({baseline / wall:4.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Worker boot benchmark: time to import wsgi.py and the resident memory
+afterwards, measured in fresh interpreters (as a gunicorn worker would
+load the app). Also lists which heavy analytics modules were loaded.
+Run from the repository root:
+
+    python -m benchmarks.startup_bench [--runs 10] [--preload numpy pandas]
+
+--preload imports the given modules first, to compare against an eager
+import of the analytics stack.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['numpy', 'pandas', 'pygal', 'plotly', 'spotipy']
+
+# Runs in the child interpreter; prints one JSON line
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+for name in {preload!r}:
+    __import__(name)
+import wsgi
+seconds = time.perf_counter() - start
+rss_kib = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kib = int(line.split()[1])
+print(json.dumps({{'seconds': seconds, 'rss_mib': rss_kib / 1024, 'modules': len(sys.modules),
+                  'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(preload):
+    env = dict(os.environ, WARMUP_ON_START='false')
+    env.setdefault('REDIRECT_URL', 'http://localhost:5000/spotify-oauth2callback')
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(preload=preload, heavy=HEAVY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--preload', nargs='*', default=[], help='modules to import before wsgi')
+    args = parser.parse_args()
+
+    # The first run fills the bytecode cache and is not counted
+    measure(args.preload)
+    results = [measure(args.preload) for _ in range(args.runs)]
+
+    label = f"import wsgi (after {', '.join(args.preload)})" if args.preload else "import wsgi"
+    print(f"{label}, {args.runs} fresh interpreters")
+    print(f"  import time  median {statistics.median(r['seconds'] for r in results) * 1000:7.1f} ms"
+          f"   max {max(r['seconds'] for r in results) * 1000:7.1f} ms")
+    print(f"  RSS          median {statistics.median(r['rss_mib'] for r in results):7.1f} MiB")
+    print(f"  modules      {results[-1]['modules']}")
+    print(f"  heavy loaded {', '.join(results[-1]['heavy']) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Local stub for the Last.fm and Spotify web APIs.
+
+Serves synthetic but well-formed responses so the app can be benchmarked
+without network access. Point the app at it with
+
+    LASTFM_API_URL=http://127.0.0.1:<port>/2.0/
+    SPOTIFY_API_URL=http://127.0.0.1:<port>/v1
+
+With a fixture directory, recorded responses are replayed instead where one
+exists for the request. In record mode, requests without a fixture are
+forwarded to the real APIs and their responses saved (this needs network
+access, a real LASTFM_API_KEY and a Spotify user token).
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+
+UPSTREAM_URLS = {
+    "lastfm": "https://ws.audioscrobbler.com/2.0/",
+    "spotify": "https://api.spotify.com/v1",
+}
+
+# Query parameters that do not change a response (and must not be recorded)
+_IGNORED_PARAMS = {"api_key", "format"}
+
+
+TAGS = ['rock', 'alternative', 'energetic', 'heavy', 'indie', 'chill',
+        'melancholic', 'dance', 'acoustic', 'electronic', 'happy', 'dark']
+
+# Number of tracks in every stub playlist
+PLAYLIST_SIZE = 2000
+
+
+def _tags_for(name):
+    offset = sum(map(ord, name)) % len(TAGS)
+    return [{"name": TAGS[(offset + i) % len(TAGS)], "count": 100 - i * 10} for i in range(5)]
+
+
+def _track(artist, i):
+    track_id = f"{abs(hash((artist, i))) % 10 ** 12:012d}"
+    return {
+        "id": track_id,
+        "uri": f"spotify:track:{track_id}",
+        "name": f"{artist} Song {i}",
+        "popularity": 50,
+        "artists": [{"name": artist}],
+        "album": {"images": [{"url": "http://img/640"}, {"url": "http://img/300"}, {"url": "http://img/64"}]},
+    }
+
+
+def lastfm_response(params):
+    method = params.get("method", "")
+    limit = int(params.get("limit", 10))
+    if method in ("track.gettoptags", "artist.gettoptags"):
+        key = params.get("track", "") + params.get("artist", "")
+        return {"toptags": {"tag": _tags_for(key)}}
+    if method == "artist.getsimilar":
+        artist = params.get("artist", "")
+        return {"similarartists": {"artist": [
+            {"name": f"{artist} Similar {i}", "match": str(1 - i / (limit + 1))} for i in range(limit)]}}
+    if method == "artist.gettoptracks":
+        artist = params.get("artist", "")
+        return {"toptracks": {"track": [{"name": f"{artist} Song {i}"} for i in range(limit)]}}
+    if method == "tag.gettopartists":
+        tag = params.get("tag", "")
+        return {"topartists": {"artist": [{"name": f"{tag.title()} Artist {i}"} for i in range(limit)]}}
+    return {"error": 3, "message": "Invalid Method"}
+
+
+def spotify_response(path, params):
+    limit = int(params.get("limit", 10))
+    if path == "/v1/search":
+        query = params.get("q", "")
+        name = query.split('"')[1] if '"' in query else query
+        return {"tracks": {"items": [_track(name, i) for i in range(limit)]}}
+    if path == "/v1/tracks":
+        return {"tracks": [{"id": track_id, "uri": f"spotify:track:{track_id}", "name": f"Track {track_id}",
+                            "popularity": 50, "artists": [{"name": "Stub Artist"}]}
+                           for track_id in params.get("ids", "").split(",")]}
+    if path == "/v1/me/top/tracks":
+        return {"items": [_track(f"Top Artist {i}", i) for i in range(limit)]}
+    if path == "/v1/me/playlists":
+        return {"items": [{"id": f"pl{i}", "name": f"Playlist {i}", "tracks": {"total": 50}} for i in range(limit)]}
+    if path.startswith("/v1/playlists/") and path.endswith("/items"):
+        offset = int(params.get("offset", 0))
+        positions = range(offset, min(offset + limit, PLAYLIST_SIZE))
+        return {"total": PLAYLIST_SIZE, "items": [{"track": _track(f"Playlist Artist {i % 97}", i)} for i in positions]}
+    return None
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops SYNs when many clients connect
+    # at once; their ~1 s retransmit would show up as app latency
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class FixtureStore:
+    """
+    Recorded responses, one JSON file per request in a directory. Requests
+    are keyed by API, path and query parameters (without the API key).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(api, path, params):
+        query = urlencode(sorted((k, v) for k, v in params.items() if k not in _IGNORED_PARAMS))
+        return f"{api} {path}?{query}"
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest()[:20] + ".json")
+
+    def get(self, key):
+        """Return (status, payload) recorded for key, or None."""
+        try:
+            with open(self._file(key)) as f:
+                fixture = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return fixture["status"], fixture["body"]
+
+    def save(self, key, status, payload):
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._file(key), "w") as f:
+                json.dump({"key": key, "status": status, "body": payload}, f)
+
+    def __len__(self):
+        try:
+            return sum(1 for name in os.listdir(self.path) if name.endswith(".json"))
+        except OSError:
+            return 0
+
+
+class StubServer:
+    """
+    Threaded stub server with a per-request latency (plus up to jitter
+    seconds at random) and an injected error rate: that share of requests
+    is answered with error_status. Counts requests per Last.fm method /
+    Spotify path, and injected errors in errors.
+
+    fixtures is an optional FixtureStore to replay (or with record=True,
+    record) real responses; requests without a fixture get synthetic ones.
+    """
+
+    def __init__(self, latency=0.05, port=0, jitter=0, error_rate=0, error_status=503,
+                 fixtures=None, record=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fixtures = fixtures
+        self.record = record
+        self.calls = Counter()
+        self.errors = Counter()
+        self.replayed = 0
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                with stub._random_lock:
+                    delay = stub.latency + stub._random.uniform(0, stub.jitter)
+                    failed = stub._random.random() < stub.error_rate
+                time.sleep(delay)
+                if parsed.path == "/2.0/":
+                    name = params.get("method", "")
+                elif body is not None:
+                    name = f"POST {parsed.path}"
+                else:
+                    name = parsed.path
+                stub.calls[name] += 1
+
+                if failed:
+                    stub.errors[name] += 1
+                    status, payload = stub.error_status, {"error": {"status": stub.error_status, "message": "injected"}}
+                elif body is None and stub.fixtures is not None:
+                    status, payload = stub.fixture_response(parsed.path, params, self.headers)
+                else:
+                    status, payload = 200, body
+                if payload is None:
+                    if parsed.path == "/2.0/":
+                        payload = lastfm_response(params)
+                    else:
+                        payload = spotify_response(parsed.path, params)
+                    status = 200 if payload is not None else 404
+                data = json.dumps(payload or {}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._reply(None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                if urlparse(self.path).path == "/api/token":
+                    self._reply({"access_token": "stub-client-token", "token_type": "Bearer", "expires_in": 3600})
+                else:
+                    self._reply({"id": "stub-playlist", "snapshot_id": "stub"})
+
+        self.httpd = _Server(("127.0.0.1", port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def fixture_response(self, path, params, headers):
+        """
+        Return (status, payload) from the fixtures, recording it first in
+        record mode, or (None, None) if there is none.
+        """
+        api = "lastfm" if path == "/2.0/" else "spotify"
+        key = FixtureStore.key(api, path, params)
+        fixture = self.fixtures.get(key)
+        if fixture is not None:
+            self.replayed += 1
+            return fixture
+        if not self.record:
+            return None, None
+
+        if api == "lastfm":
+            url = UPSTREAM_URLS["lastfm"]
+        else:
+            url = UPSTREAM_URLS["spotify"] + path[len("/v1"):]
+        response = requests.get(url, params=params, timeout=30,
+                                headers={"Authorization": headers.get("Authorization", "")})
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        # Transient failures are not worth replaying
+        if response.status_code < 500 and response.status_code != 429:
+            self.fixtures.save(key, response.status_code, payload)
+        return response.status_code, payload
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def app_config(self):
+        return {
+            "LASTFM_API_URL": f"{self.base_url}/2.0/",
+            "SPOTIFY_API_URL": f"{self.base_url}/v1",
+            "LASTFM_API_KEY": "stub",
+            "SPOTIFY_TOKEN_URL": f"{self.base_url}/api/token",
+        }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,248 @@
+"""
+Offline benchmark suite: drives the generation, profile and save endpoints
+through the Flask test client against the local API stub and reports
+p50/p95 latency, outbound calls per run and peak memory per scenario.
+Run from the repository root:
+
+    python -m benchmarks.suite [--runs 10] [--latency 0.05] [--jitter 0.02]
+                               [--error-rate 0.02] [--scenario recommendations ...]
+                               [--fixtures benchmarks/fixtures] [--json results.json]
+
+Every scenario runs cold (fresh caches, stores and session before each run)
+and warm (caches filled by an untimed first run). Rate limits are raised so
+the stub latency, not the token buckets, sets the pace; retries keep the
+app's settings. Peak memory is measured with tracemalloc in one extra run,
+so it does not slow the timed runs down.
+
+With --fixtures, recorded responses in that directory are replayed where
+they exist. --record fills it from the real APIs (needs network access,
+LASTFM_API_KEY and a Spotify user token via --token).
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('REDIRECT_URL', 'http://localhost:5000/spotify-oauth2callback')
+
+from app.main import app  # noqa: E402
+from benchmarks.stub_server import FixtureStore, StubServer  # noqa: E402
+
+# name: (function under test, method, path, JSON body)
+SCENARIOS = {
+    'recommendations': (
+        'gen_recommendations', 'POST', '/get-recommended-playlist',
+        {'seed-artist': 'Radiohead', 'seed-genre': 'rock', 'track-count': 20, 'variety': 7, 'discovery': 5}),
+    'profile': (
+        'analyze_tracks_profile', 'GET', '/api/profile', None),
+    'similar-by-profile': (
+        'get_similar_tracks_by_profile', 'POST', '/generate-from-profile', {'track-count': 20}),
+    'playlist': (
+        'generate_playlist_from_profile_and_artist', 'POST', '/generate-from-playlist',
+        {'playlist_id': 'pl1', 'seed_artist': 'Radiohead', 'variety': 5, 'discovery': 5,
+         'track_count': 20, 'random_seed': 1}),
+    'save-playlist': (
+        'create_playlist', 'POST', '/save-private-playlist',
+        {'name': 'Benchmark', 'uris': [f"spotify:track:{i:012d}" for i in range(250)]}),
+}
+
+# app.extensions entries holding caches and stores that a cold run resets
+STATE_EXTENSIONS = ('lastfm_cache', 'spotify_search_cache', 'track_store', 'track_id_map', 'profile_store',
+                    'artist_graph', 'tag_index', 'request_scheduler')
+STATE_PATHS = ('LASTFM_CACHE_PATH', 'TRACK_ID_MAP_PATH', 'PROFILE_STORE_PATH', 'ARTIST_GRAPH_PATH',
+               'TAG_INDEX_PATH', 'JOB_STORE_PATH')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def api_of(call):
+    # Stub call names are Last.fm methods, Spotify paths or "POST <path>"
+    return 'spotify' if '/' in call else 'lastfm'
+
+
+class Bench:
+    """Runs scenarios against one stub server with fresh state on demand."""
+
+    def __init__(self, stub, token):
+        self.stub = stub
+        self.token = token
+        self.data_dir = None
+        self.client = None
+
+    def reset(self):
+        """Start from empty caches and stores and a new session."""
+        if self.data_dir:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+        self.data_dir = tempfile.mkdtemp(prefix='marcify-bench-')
+        for name in STATE_PATHS:
+            app.config[name] = os.path.join(self.data_dir, f"{name.lower()}.sqlite")
+        for name in STATE_EXTENSIONS:
+            app.extensions.pop(name, None)
+
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = self.token
+            sess['refresh_token'] = 'bench'
+            sess['token_create'] = time.time()
+            sess['spotify_username'] = 'bench'
+
+    def settle(self, quiet=0.2):
+        """
+        Wait until the stub has seen no calls for `quiet` seconds, so calls
+        still running in the background from an earlier request (e.g.
+        searches cancelled once enough tracks were found) are not counted
+        for the next one.
+        """
+        deadline = time.monotonic() + 10
+        seen = sum(self.stub.calls.values())
+        while time.monotonic() < deadline:
+            time.sleep(quiet + self.stub.latency)
+            now = sum(self.stub.calls.values())
+            if now == seen:
+                return
+            seen = now
+
+    def request(self, method, path, body):
+        """Send one request. Returns (seconds, status, calls by stub endpoint)."""
+        self.settle()
+        before = self.stub.calls.copy()
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        response.close()
+        return time.perf_counter() - start, response.status_code, self.stub.calls - before
+
+    def run(self, name, runs, cold):
+        _, method, path, body = SCENARIOS[name]
+        self.reset()
+        if not cold:
+            # Untimed first run fills the caches
+            self.request(method, path, body)
+
+        durations = []
+        failures = 0
+        calls = Counter()
+        errors_before = sum(self.stub.errors.values())
+        for _ in range(runs):
+            if cold:
+                self.reset()
+            seconds, status, run_calls = self.request(method, path, body)
+            durations.append(seconds)
+            failures += not 200 <= status <= 299
+            calls += run_calls
+
+        if cold:
+            self.reset()
+        tracemalloc.start()
+        self.request(method, path, body)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        by_api = Counter()
+        for call, count in calls.items():
+            by_api[api_of(call)] += count
+        return {
+            'scenario': name,
+            'function': SCENARIOS[name][0],
+            'mode': 'cold' if cold else 'warm',
+            'runs': runs,
+            'p50_ms': percentile(durations, 50) * 1000,
+            'p95_ms': percentile(durations, 95) * 1000,
+            'failed_responses': failures,
+            'injected_errors': sum(self.stub.errors.values()) - errors_before,
+            'calls_per_run': {api: count / runs for api, count in by_api.items()},
+            'calls': dict(calls),
+            'peak_memory_mib': peak / 1024 / 1024
+        }
+
+    def close(self):
+        if self.data_dir:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+def print_header():
+    print(f"{'scenario':<20} {'mode':<5} {'p50 ms':>9} {'p95 ms':>9} {'Last.fm':>8} {'Spotify':>8} "
+          f"{'failed':>7} {'peak MiB':>9}")
+
+
+def print_result(result):
+    # Calls are per run, failed counts non-2xx responses
+    calls = result['calls_per_run']
+    print(f"{result['scenario']:<20} {result['mode']:<5} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} "
+          f"{calls.get('lastfm', 0):8.1f} {calls.get('spotify', 0):8.1f} "
+          f"{result['failed_responses']:>7} {result['peak_memory_mib']:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--mode', choices=['cold', 'warm', 'both'], default='both')
+    parser.add_argument('--runs', type=int, default=10, help='timed runs per scenario and mode')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub latency per call in seconds')
+    parser.add_argument('--jitter', type=float, default=0, help='extra random latency per call, up to this')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of stub calls that fail')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of injected errors')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for jitter and errors')
+    parser.add_argument('--fixtures', help='directory of recorded responses to replay')
+    parser.add_argument('--record', action='store_true', help='record missing fixtures from the real APIs')
+    parser.add_argument('--token', default='bench', help='Spotify user token (only used when recording)')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--verbose', action='store_true', help='show app log output')
+    args = parser.parse_args()
+
+    if args.record and not args.fixtures:
+        parser.error('--record needs --fixtures')
+    if not args.verbose:
+        # Injected errors would flood the report with retry warnings
+        logging.disable(logging.WARNING)
+
+    fixtures = FixtureStore(args.fixtures) if args.fixtures else None
+    stub = StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      error_status=args.error_status, fixtures=fixtures, record=args.record, seed=args.seed)
+    with stub:
+        app.config.update(stub.app_config(), SECRET_KEY='bench', TESTING=True, WARMUP_ON_START=False,
+                          SPOTIFY_RATE_LIMIT=1000, SPOTIFY_RATE_BURST=1000,
+                          LASTFM_RATE_LIMIT=1000, LASTFM_RATE_BURST=1000,
+                          TOKEN_RATE_LIMIT=1000, TOKEN_RATE_BURST=1000)
+        if args.record:
+            app.config['LASTFM_API_KEY'] = os.environ.get('LASTFM_API_KEY', '')
+        metrics_dir = tempfile.mkdtemp(prefix='marcify-bench-metrics-')
+        app.config['METRICS_PATH'] = os.path.join(metrics_dir, 'metrics.sqlite')
+
+        print(f"{args.latency * 1000:.0f} ms (+0-{args.jitter * 1000:.0f} ms) per upstream call, "
+              f"{args.error_rate:.0%} errors, {args.runs} runs"
+              + (f", {len(fixtures)} fixtures" if fixtures else ""))
+        modes = [True, False] if args.mode == 'both' else [args.mode == 'cold']
+        bench = Bench(stub, args.token)
+        results = []
+        print_header()
+        try:
+            for name in args.scenario:
+                for cold in modes:
+                    results.append(bench.run(name, args.runs, cold))
+                    print_result(results[-1])
+        finally:
+            bench.close()
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    if fixtures:
+        print(f"{stub.replayed} responses replayed from fixtures")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
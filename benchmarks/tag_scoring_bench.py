@@ -0,0 +1,81 @@
+"""
+Micro-benchmark for tag scoring: the original nested substring scan vs the
+precompiled, memoized matcher in lastfm_profile. Run from the repository root:
+
+    python -m benchmarks.tag_scoring_bench [--tags 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.helper.lastfm_profile import (  # noqa: E402
+    GENRE_KEYWORDS, TAG_CATEGORIES, calculate_tag_scores, classify_tag, is_genre_tag
+)
+
+VOCABULARY = [
+    'rock', 'alternative rock', 'indie', 'energetic', 'heavy metal', 'chill', 'chillout',
+    'melancholic', 'dance', 'electronic', 'acoustic', 'singer-songwriter', 'happy',
+    'dark ambient', 'hip hop', 'seen live', 'female vocalists', '90s', 'post-rock',
+    'shoegaze', 'funky', 'synthpop', 'folk', 'mellow', 'experimental', 'party',
+    'industrial', 'punk', 'beautiful', 'love', 'british', 'german', 'classic rock',
+]
+
+
+def legacy_tag_scores(tags):
+    # Original implementation, kept here as the baseline
+    scores = {}
+    for category, keywords in TAG_CATEGORIES.items():
+        high_count = sum(1 for tag in tags if any(kw in tag for kw in keywords['high']))
+        low_count = sum(1 for tag in tags if any(kw in tag for kw in keywords['low']))
+        total = high_count + low_count
+        scores[category] = high_count / total if total > 0 else 0.5
+    return scores
+
+
+def make_tags(count, rng):
+    # Mix of common tags and a long tail of distinct ones, like real Last.fm data
+    tags = []
+    for i in range(count):
+        tag = rng.choice(VOCABULARY)
+        if rng.random() < 0.3:
+            tag = f"{tag} {i}"
+        tags.append(tag)
+    return tags
+
+
+def run(label, func, tracks):
+    start = time.perf_counter()
+    results = [func(tags) for tags in tracks]
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed * 1000:8.1f} ms")
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tags', type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    tags = make_tags(args.tags, rng)
+    # Score in chunks of 10 tags per track, as analyze_tracks_profile does
+    tracks = [tags[i:i + 10] for i in range(0, len(tags), 10)]
+
+    print(f"Scoring {len(tags)} tags ({len(set(tags))} distinct) in {len(tracks)} tracks")
+    expected, legacy = run('nested substring scan', legacy_tag_scores, tracks)
+    classify_tag.cache_clear()
+    actual, cold = run('compiled, cold memo', calculate_tag_scores, tracks)
+    _, warm = run('compiled, warm memo', calculate_tag_scores, tracks)
+    assert actual == expected, "compiled matcher disagrees with the original scan"
+    print(f"  speedup: {legacy / cold:.1f}x cold, {legacy / warm:.1f}x warm")
+
+    legacy_genres = [tag for tag in tags if any(g in tag for g in GENRE_KEYWORDS)]
+    assert legacy_genres == [tag for tag in tags if is_genre_tag(tag)]
+
+
+if __name__ == '__main__':
+    main()
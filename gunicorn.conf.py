@@ -0,0 +1,37 @@
+"""
+Gunicorn settings. Every request spends most of its time waiting on
+Spotify and Last.fm, so the default worker model serves many requests per
+process: threaded workers (gthread), or gevent workers if gevent is
+installed (see requirements-gevent.txt).
+
+Environment variables:
+    GUNICORN_WORKER_CLASS        sync, gthread (default) or gevent
+    GUNICORN_WORKERS             worker processes (default: 2)
+    GUNICORN_THREADS             threads per gthread worker (default: 16)
+    GUNICORN_WORKER_CONNECTIONS  concurrent connections per gevent worker (default: 1000)
+    GUNICORN_TIMEOUT             seconds before a silent worker is restarted (default: 120)
+    GUNICORN_KEEPALIVE           seconds to keep idle client connections open (default: 5)
+    GUNICORN_BIND                listen address (default: 0.0.0.0:$PORT, PORT defaults to 5000)
+"""
+import os
+import sys
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class == "gevent":
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        print("gevent is not installed (pip install -r requirements-gevent.txt), using gthread workers",
+              file=sys.stderr)
+        worker_class = "gthread"
+
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# Generations take seconds, longer than the default 30s on slow upstreams
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
@@ -0,0 +1,16 @@
+import pytest
+from flask import Flask
+
+
+@pytest.fixture
+def app(tmp_path):
+    """A bare Flask app with the settings the helpers read."""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SPOTIFY_API_URL='https://api.spotify.test/v1',
+        LASTFM_API_URL='https://lastfm.test/2.0/',
+        DATA_DIR=str(tmp_path),
+    )
+    with app.app_context():
+        yield app
@@ -0,0 +1,34 @@
+import pytest
+
+from app.helper.artist_graph import personalized_pagerank
+
+
+def test_pagerank_ranks_artists_many_paths_reach_first():
+    adjacency = {
+        'Seed': [('A', 1.0), ('B', 1.0), ('C', 1.0)],
+        'A': [('Shared', 1.0)],
+        'B': [('Shared', 1.0)],
+        'C': [('Leaf', 1.0)],
+    }
+    ranked = personalized_pagerank(adjacency, 'Seed')
+    names = [name for name, _ in ranked]
+    assert 'Seed' not in names
+    assert names.index('Shared') < names.index('Leaf')
+
+
+def test_pagerank_follows_edge_weights():
+    ranked = dict(personalized_pagerank({'Seed': [('Close', 0.9), ('Far', 0.1)]}, 'Seed'))
+    assert ranked['Close'] == pytest.approx(9 * ranked['Far'])
+
+
+def test_pagerank_scores_are_a_distribution():
+    adjacency = {'Seed': [('A', 1.0), ('B', 0.5)], 'A': [('B', 1.0), ('Seed', 0.2)], 'B': [('C', 1.0)]}
+    ranked = personalized_pagerank(adjacency, 'Seed', iterations=100)
+    # The seed's own share is left out
+    assert 0 < sum(score for _, score in ranked) < 1
+    assert all(score > 0 for _, score in ranked)
+
+
+def test_pagerank_matches_names_case_insensitively():
+    ranked = personalized_pagerank({'seed': [('A', 1.0)], 'a': [('B', 1.0)]}, 'Seed')
+    assert [name for name, _ in ranked] == ['A', 'B']
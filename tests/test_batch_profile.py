@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from app.helper import batch_profile
+from app.helper.batch_profile import CATEGORIES, score_matrix
+from app.helper.lastfm_profile import calculate_tag_scores
+
+TAG_LISTS = [
+    [],
+    ['rock', 'indie'],
+    ['chill', 'relaxing', 'energetic', 'sad'],
+    ['happy', 'upbeat', 'dance', 'acoustic', 'dark', 'melancholy', 'party'],
+    ['unknown tag', 'seen live'],
+]
+
+
+def test_score_matrix_matches_calculate_tag_scores():
+    matrix = score_matrix(TAG_LISTS)
+    assert matrix.shape == (len(TAG_LISTS), len(CATEGORIES))
+    for row, tags in zip(matrix, TAG_LISTS):
+        expected = calculate_tag_scores(tags)
+        assert dict(zip(CATEGORIES, row.tolist())) == pytest.approx(expected)
+
+
+def test_score_matrix_is_neutral_without_matches():
+    assert score_matrix([['no category here']]).tolist() == [[0.5] * len(CATEGORIES)]
+
+
+def test_empty_playlists_are_left_out_of_the_analysis(monkeypatch):
+    os.environ.setdefault('REDIRECT_URL', 'http://localhost:5000/spotify-oauth2callback')
+    from app import main
+
+    tracks = {
+        'rock': [{'name': 'Song', 'artists': [{'name': 'Band'}]}],
+        'empty': [],
+        'chill': [{'name': 'Calm', 'artists': [{'name': 'Ambient'}]}],
+        'empty too': [],
+    }
+    tags = {('Song', 'Band'): ['rock', 'energetic'], ('Calm', 'Ambient'): ['chill', 'relaxing']}
+    monkeypatch.setattr(batch_profile, 'get_playlist_tracks', lambda token, playlist_id, **kwargs: tracks[playlist_id])
+    monkeypatch.setattr(batch_profile, 'fetch_tags_deduplicated', lambda keys: {key: tags[key] for key in keys})
+    monkeypatch.setattr(main, 'save_profile', lambda *args: None)
+
+    with main.app.app_context():
+        result = main.playlists_analysis('token', list(tracks))
+
+    assert result['playlist_ids'] == ['rock', 'chill']
+    assert [profile['playlist_id'] for profile in result['profiles']] == ['rock', 'chill']
+    assert len(result['similarity']) == 2 and all(len(row) == 2 for row in result['similarity'])
+    assert result['similarity'][0][0] == 1 and result['similarity'][0][1] < 1
@@ -0,0 +1,61 @@
+import time
+
+from app.helper.cache import MemoryCache, SQLiteCache
+
+
+def test_sqlite_cache_entries_expire(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite'))
+    cache.set('tags', 'a', {'tags': ['rock']}, ttl=60)
+    cache.set('tags', 'b', ['old'], ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get('tags', 'a') == {'tags': ['rock']}
+    assert cache.get('tags', 'b') is None
+    assert cache.get('other', 'a') is None
+
+
+def test_sqlite_cache_counts_hits_and_misses(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite'))
+    cache.set('tags', 'a', 1, ttl=60)
+    cache.get('tags', 'a')
+    cache.get('tags', 'missing')
+    cache.flush_stats()
+    assert cache.stats() == {'tags': {'hits': 1, 'misses': 1}}
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite'), max_entries=10, touch_interval=0, evict_every=1)
+    for i in range(10):
+        cache.set('n', str(i), i, ttl=60)
+        time.sleep(0.002)
+    # Touch the oldest entry so it survives
+    assert cache.get('n', '0') == 0
+    cache.set('n', '10', 10, ttl=60)
+
+    kept = [str(i) for i in range(11) if cache.get('n', str(i)) is not None]
+    # Evicted down to 90% of max_entries
+    assert len(kept) == 9
+    assert '0' in kept and '10' in kept
+    assert '1' not in kept and '2' not in kept
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    SQLiteCache(path).set('tags', 'a', [1], ttl=60)
+    assert SQLiteCache(path).get('tags', 'a') == [1]
+
+
+def test_memory_cache_bounded_by_size():
+    cache = MemoryCache(max_bytes=20)
+    cache.set('a', 'x' * 9)
+    cache.set('b', 'y' * 9)
+    assert cache.get('a') is None
+    assert cache.get('b') == 'y' * 9
+
+
+def test_memory_cache_coalesces_loads():
+    cache = MemoryCache()
+    loads = []
+    assert cache.get_or_load('k', lambda: loads.append(1) or 'v') == 'v'
+    assert cache.get_or_load('k', lambda: loads.append(1) or 'w') == 'v'
+    assert len(loads) == 1
+    assert cache.stats()['hits'] == 1
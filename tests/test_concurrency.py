@@ -0,0 +1,37 @@
+import threading
+import time
+
+from app.helper.concurrency import app_extension
+from app.helper.http_client import get_scheduler, per_worker_limit
+
+
+def test_concurrent_first_use_creates_one_extension(app):
+    created = []
+
+    def create():
+        time.sleep(0.05)
+        created.append(object())
+        return created[-1]
+
+    results = []
+
+    def use():
+        with app.app_context():
+            results.append(app_extension('thing', create))
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert results == created * 8
+
+
+def test_rate_limits_are_split_between_workers(app):
+    app.config.update(RATE_LIMIT_WORKERS=4, LASTFM_RATE_LIMIT=5, LASTFM_RATE_BURST=60)
+    assert per_worker_limit(5, 60) == (1.25, 15)
+    assert get_scheduler().api_limits['lastfm'] == (1.25, 15)
+    app.config['RATE_LIMIT_WORKERS'] = 100
+    assert per_worker_limit(5, 60) == (0.05, 1)
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from app.helper import create_playlist as module
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+
+    def json(self):
+        return self.body
+
+
+class Posts(list):
+    """Records the POSTs; the request with index fail_at (if set) fails."""
+    fail_at = None
+
+    def __call__(self, url, token, body):
+        self.append((url, body))
+        if url.endswith('/me/playlists'):
+            return FakeResponse(201, {'id': 'pl1'})
+        if len(self) - 1 == self.fail_at:
+            return FakeResponse(500)
+        return FakeResponse(201)
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    posts = Posts()
+    monkeypatch.setattr(module, 'post_json', posts)
+    return posts
+
+
+def uris(count):
+    return [f"spotify:track:{i}" for i in range(count)]
+
+
+def test_tracks_are_added_in_ordered_chunks(app, posts):
+    progress = []
+    assert module.create_playlist('user', 'token', {'uris': uris(250)},
+                                  lambda added, total: progress.append((added, total)))
+
+    adds = [body for url, body in posts if url.endswith('/playlists/pl1/items')]
+    assert [len(body['uris']) for body in adds] == [100, 100, 50]
+    assert [body['position'] for body in adds] == [0, 100, 200]
+    assert [uri for body in adds for uri in body['uris']] == uris(250)
+    assert progress == [(100, 250), (200, 250), (250, 250)]
+
+
+def test_stops_at_the_first_failed_chunk(app, posts):
+    posts.fail_at = 2
+    assert not module.create_playlist('user', 'token', {'uris': uris(250)})
+    # Playlist, first chunk, failed second chunk; the third is not sent
+    assert len(posts) == 3
+
+
+def test_accepts_uris_as_json_string(app, posts):
+    assert module.create_playlist('user', 'token', {'uris': json.dumps(uris(3)), 'name': 'Mix'})
+    assert posts[0][1]['name'] == 'Mix'
+
+
+def test_no_playlist_without_tracks(app, posts):
+    assert not module.create_playlist('user', 'token', {'uris': []})
+    assert posts == []
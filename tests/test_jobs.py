@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from app.helper.jobs import JOB_DONE, JOB_FAILED, JobLimitError, JobQueue
+from app.helper.scheduler import PRIORITY_BACKGROUND, _priority
+
+
+@pytest.fixture
+def queue(app, tmp_path):
+    return JobQueue(app, str(tmp_path / 'jobs.sqlite'), max_workers=2, per_user_limit=2)
+
+
+def test_job_runs_in_the_background(queue):
+    job = queue.submit('alice', 'generate', {'seed': 'a'}, lambda: {'tracks': 3})
+    assert queue.wait(job['id'], timeout=5)['result'] == {'tracks': 3}
+    assert queue.get(job['id'])['status'] == JOB_DONE
+
+
+def test_jobs_run_at_background_priority(queue):
+    job = queue.submit('alice', 'generate', {}, _priority.get)
+    assert queue.wait(job['id'], timeout=5)['result'] == PRIORITY_BACKGROUND
+
+
+def test_identical_active_jobs_are_deduplicated(queue):
+    release = threading.Event()
+    first = queue.submit('alice', 'generate', {'seed': 'a'}, release.wait, 5)
+    again = queue.submit('alice', 'generate', {'seed': 'a'}, release.wait, 5)
+    other_user = queue.submit('bob', 'generate', {'seed': 'a'}, release.wait, 5)
+    release.set()
+    assert again['id'] == first['id']
+    assert other_user['id'] != first['id']
+
+    # A finished job is not reused, the same request runs again
+    queue.wait(first['id'], timeout=5)
+    assert queue.submit('alice', 'generate', {'seed': 'a'}, release.wait, 5)['id'] != first['id']
+    assert queue.get(first['id'])['status'] == JOB_DONE
+
+
+def test_failed_jobs_are_not_reused(queue):
+    def fail():
+        raise ValueError("boom")
+
+    failed = queue.submit('alice', 'generate', {'seed': 'a'}, fail)
+    job = queue.wait(failed['id'], timeout=5)
+    assert job['status'] == JOB_FAILED and job['error'] == 'boom'
+    assert queue.submit('alice', 'generate', {'seed': 'a'}, lambda: 1)['id'] != failed['id']
+
+
+def test_active_jobs_per_user_are_limited_across_queues(app, queue, tmp_path):
+    release = threading.Event()
+    queue.submit('alice', 'generate', {'seed': 'a'}, release.wait, 5)
+    # A second queue on the same file stands in for another worker process
+    other = JobQueue(app, str(tmp_path / 'jobs.sqlite'), max_workers=2, per_user_limit=2)
+    second = other.submit('alice', 'generate', {'seed': 'b'}, release.wait, 5)
+    with pytest.raises(JobLimitError):
+        queue.submit('alice', 'generate', {'seed': 'c'}, release.wait, 5)
+    queue.submit('bob', 'generate', {'seed': 'c'}, release.wait, 5)
+
+    release.set()
+    other.wait(second['id'], timeout=5)
+    queue.submit('alice', 'generate', {'seed': 'c'}, lambda: 1)
+
+
+def test_jobs_of_exited_owners_are_failed(queue):
+    job = queue.submit('alice', 'generate', {}, lambda: 1)
+    queue.wait(job['id'], timeout=5)
+    # A running job owned by a process that no longer exists
+    queue._connect().execute(
+        "UPDATE jobs SET status = 'running', owner = ? WHERE id = ?",
+        (f"{queue.owner.rpartition(':')[0]}:{2 ** 22 + 1}", job['id'])
+    )
+    assert queue.get(job['id'])['status'] == JOB_FAILED
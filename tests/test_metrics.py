@@ -0,0 +1,75 @@
+import os
+import threading
+
+from app.helper.metrics import RETIRED, MetricsRegistry
+from app.helper.tracing import calling_helper
+
+
+def in_child(func):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            func()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def test_totals_are_added_up_across_processes(tmp_path):
+    registry = MetricsRegistry(str(tmp_path / 'metrics.sqlite'))
+    registry.inc('marcify_events_total', {'event': 'fallback'})
+
+    def child():
+        registry.inc('marcify_events_total', {'event': 'fallback'}, 2)
+        registry.flush()
+    in_child(child)
+
+    assert registry.collect()[('marcify_events_total', '[["event", "fallback"]]')] == 3
+
+
+def test_exited_processes_are_retired(tmp_path):
+    path = str(tmp_path / 'metrics.sqlite')
+    registry = MetricsRegistry(path)
+    registry.inc('marcify_events_total')
+
+    def child():
+        registry.inc('marcify_events_total', amount=2)
+        registry.inc('marcify_warmup_running')
+        registry.flush()
+    for _ in range(3):
+        in_child(child)
+
+    samples = registry.collect()
+    assert samples[('marcify_events_total', '[]')] == 7
+    # Gauges of exited processes are dropped
+    assert ('marcify_warmup_running', '[]') not in samples
+    processes = {row[0] for row in registry._connect().execute("SELECT DISTINCT process FROM samples")}
+    assert processes == {registry._process, RETIRED}
+
+
+def test_fork_while_the_lock_is_held(tmp_path):
+    registry = MetricsRegistry(str(tmp_path / 'metrics.sqlite'),
+                               collectors=[lambda: [('marcify_events_total', {'event': 'collected'}, 1)]])
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with registry._lock:
+            held.set()
+            release.wait()
+    threading.Thread(target=hold, daemon=True).start()
+    held.wait()
+
+    def child():
+        registry.inc('marcify_events_total')
+        registry.flush()
+    in_child(child)
+    release.set()
+
+    assert registry.collect()[('marcify_events_total', '[]')] == 1
+
+
+def test_calls_are_attributed_to_the_calling_helper():
+    namespace = {'__name__': 'app.helper.example', 'calling_helper': calling_helper}
+    exec("def fetch_tags():\n    return (lambda: calling_helper())()\n", namespace)
+    assert namespace['fetch_tags']() == 'example.fetch_tags'
+    assert calling_helper() == 'other'
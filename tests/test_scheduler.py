@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from app.helper.scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, DeadlineExceeded, RequestScheduler
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def scheduler(**kwargs):
+    kwargs.setdefault('max_delay', 0.01)
+    return RequestScheduler({'default': (1000, 1000)}, (1000, 1000), **kwargs)
+
+
+def replies(*items):
+    """func(timeout) for send() that returns or raises the given items in turn."""
+    calls = []
+
+    def func(timeout):
+        calls.append(timeout)
+        item = items[len(calls) - 1]
+        if isinstance(item, Exception):
+            raise item
+        return item
+    return func, calls
+
+
+def test_retries_gateway_errors_until_success():
+    func, calls = replies(FakeResponse(503), FakeResponse(502), FakeResponse(200))
+    response = scheduler().send('spotify', 'GET', 'token', func)
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_returns_last_response_after_max_retries():
+    func, calls = replies(*[FakeResponse(503)] * 3)
+    s = scheduler(max_retries=2)
+    assert s.send('spotify', 'GET', None, func).status_code == 503
+    assert len(calls) == 3
+    assert s.stats()['spotify.gave_up'] == 1
+
+
+@pytest.mark.parametrize('status', [500, 502, 503, 504])
+def test_does_not_retry_server_errors_of_writes(status):
+    func, calls = replies(FakeResponse(status), FakeResponse(200))
+    assert scheduler().send('spotify', 'POST', None, func).status_code == status
+    assert len(calls) == 1
+
+
+def test_retries_rate_limited_writes():
+    func, calls = replies(FakeResponse(429), FakeResponse(201))
+    assert scheduler().send('spotify', 'POST', None, func).status_code == 201
+
+
+def test_retries_writes_that_were_not_sent():
+    refused = requests.ConnectionError(MaxRetryError(None, '/', NewConnectionError(None, 'refused')))
+    func, calls = replies(refused, requests.ConnectTimeout('slow'), FakeResponse(201))
+    assert scheduler().send('spotify', 'POST', None, func).status_code == 201
+    assert len(calls) == 3
+
+
+def test_does_not_retry_writes_that_may_have_been_sent():
+    func, calls = replies(requests.ConnectionError('connection reset'), FakeResponse(201))
+    with pytest.raises(requests.ConnectionError):
+        scheduler().send('spotify', 'POST', None, func)
+    assert len(calls) == 1
+
+
+def test_reraises_final_network_error():
+    func, calls = replies(*[requests.ConnectionError('down')] * 2)
+    with pytest.raises(requests.ConnectionError):
+        scheduler(max_retries=1).send('lastfm', 'GET', None, func)
+    assert len(calls) == 2
+
+
+def test_retry_after_pauses_the_bucket():
+    func, calls = replies(FakeResponse(429, {'Retry-After': '1'}), FakeResponse(200))
+    s = scheduler(max_delay=0.2)
+    start = time.monotonic()
+    assert s.send('spotify', 'GET', None, func).status_code == 200
+    assert time.monotonic() - start >= 0.2
+
+
+def test_gives_up_when_the_retry_would_pass_the_deadline():
+    s = scheduler(max_delay=5, deadline=0.5)
+    func, calls = replies(FakeResponse(429, {'Retry-After': '5'}), FakeResponse(200))
+    assert s.send('spotify', 'GET', None, func).status_code == 429
+    assert len(calls) == 1
+
+
+def test_attempt_timeout_is_cut_to_the_deadline():
+    func, calls = replies(FakeResponse(200))
+    scheduler(deadline=2).send('spotify', 'GET', None, func, timeout=10)
+    assert calls[0] <= 2
+
+
+def test_acquire_raises_when_no_token_before_deadline():
+    s = RequestScheduler({'default': (1, 1)}, (1, 1))
+    s.acquire({'spotify'})
+    with pytest.raises(DeadlineExceeded):
+        s.acquire({'spotify'}, deadline=time.monotonic() + 0.1)
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    # One token per 50 ms, the first acquire empties the bucket
+    s = RequestScheduler({'default': (20, 1)}, (20, 1))
+    s.acquire({'spotify'})
+    order = []
+
+    def wait(name, level):
+        s.acquire({'spotify'}, level=level)
+        order.append(name)
+
+    threads = []
+    for name, level in (('background 1', PRIORITY_BACKGROUND), ('background 2', PRIORITY_BACKGROUND),
+                        ('interactive', PRIORITY_INTERACTIVE)):
+        thread = threading.Thread(target=wait, args=(name, level))
+        thread.start()
+        threads.append(thread)
+        # Let each caller queue up before the next arrives
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert order == ['interactive', 'background 1', 'background 2']
+
+
+def test_other_buckets_are_not_held_up():
+    s = RequestScheduler({'spotify': (1, 1), 'lastfm': (1000, 1000)}, (1000, 1000))
+    s.acquire({'spotify'})
+    waiting = threading.Thread(target=s.acquire, args=({'spotify'},), daemon=True)
+    waiting.start()
+    time.sleep(0.01)
+    assert s.acquire({'lastfm'}) < 0.1
+    waiting.join()
+
+
+def test_idle_token_buckets_are_swept():
+    s = RequestScheduler({'default': (1000, 1000)}, (1000, 1000), sweep_interval=0)
+    s.send('spotify', 'GET', 'token', lambda timeout: FakeResponse(200))
+    time.sleep(0.01)
+    s.acquire({'spotify'})
+    assert s.stats()['buckets'] == 1
+
+
+def test_an_empty_token_bucket_does_not_hold_up_other_tokens():
+    # Plenty of API tokens, but each access token may send 2 calls per second
+    s = RequestScheduler({'default': (1000, 1000)}, (2, 1))
+    first = {'spotify', 'token:a'}
+    s.acquire(first)
+    queued = [threading.Thread(target=s.acquire, args=(first,), daemon=True) for _ in range(3)]
+    for thread in queued:
+        thread.start()
+    time.sleep(0.05)
+
+    assert s.acquire({'spotify', 'token:b'}) < 0.1
+    for thread in queued:
+        thread.join()
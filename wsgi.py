@@ -1,3 +1,9 @@
 from app.main import app
+from app.helper.warmup import start_background_warmup
+
+# Warm the caches in the background of every worker (see WARMUP_ON_START)
+if app.config.get('WARMUP_ON_START'):
+  start_background_warmup(app)
+
 if __name__ == "__main__":
-  app.run()
\ No newline at end of file
+  app.run()